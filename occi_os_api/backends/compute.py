@@ -22,13 +22,30 @@ The compute resource backend for OpenStack.
 
 #pylint: disable=W0232,R0201
 
+import collections
+import time
+
+import eventlet
+from eventlet import event
+from oslo.config import cfg
+
+from occi_os_api import versions
+from occi_os_api.backends import task
 from occi_os_api.extensions import os_mixins
 from occi_os_api.extensions import os_addon
 from occi_os_api.nova_glue import vm
 
+from occi import core_model
+from occi import exceptions
 from occi.backend import KindBackend, ActionBackend
 from occi.extensions import infrastructure
 
+CONF = cfg.CONF
+
+# (user id, idempotency key) -> (time, event sent the ids of the created VMs)
+# of recent create requests - oldest first.
+_REQUESTS = collections.OrderedDict()
+
 
 class ComputeBackend(KindBackend, ActionBackend):
     """
@@ -47,51 +64,88 @@ class ComputeBackend(KindBackend, ActionBackend):
             raise AttributeError('There are unsupported attributes in the '
                                  'request.')
 
-        # create the VM
+        # a retried request returns the VM(s) of the original one.
+        token = extras.get('idempotency_key')
+        if token and 'registry' in extras:
+            key = (extras['nova_ctx'].user_id, token)
+            while key in _REQUESTS:
+                original = _REQUESTS[key]
+                uids = original[1].wait()
+                if uids is not None:
+                    originals = _get_originals(uids, extras)
+                    entity.identifier = originals[0].identifier
+                    extras['created'].extend(originals[1:])
+                    return
+                # original request failed.
+                if _REQUESTS.get(key) is original:
+                    _REQUESTS.pop(key)
+
+            _expire_requests()
+            done = event.Event()
+            _REQUESTS[key] = (time.time(), done)
+            uids = None
+            try:
+                uids = self._create(entity, extras)
+            finally:
+                done.send(uids)
+                if uids is None:
+                    _REQUESTS.pop(key, None)
+        else:
+            self._create(entity, extras)
+
+    def _create(self, entity, extras):
+        """
+        Create the VM(s) - returns the ids of the VMs.
+        """
         context = extras['nova_ctx']
-        instance = vm.create_vm(entity, context)
-        uid = instance['uuid']
-        entity.identifier = '/compute/' + uid
-
-        # set some attributes
-        entity.attributes['occi.compute.hostname'] = instance['hostname']
-        entity.attributes['occi.compute.architecture'] = 'x86'
-        entity.attributes['occi.compute.cores'] = str(instance['vcpus'])
-        entity.attributes['occi.compute.speed'] = str(0.0)  # N/A in instance
-        value = str(float(instance['memory_mb']) / 1024)
-        entity.attributes['occi.compute.memory'] = value
-        entity.attributes['occi.compute.state'] = 'inactive'
-
-        # set valid actions
-        entity.actions = [infrastructure.STOP,
-                          infrastructure.SUSPEND,
-                          infrastructure.RESTART]
+        instances = vm.create_vm(entity, context)
+        entity.attributes.pop('org.openstack.compute.count', None)
 
         # Tell the world that is is an VM in OpenStack...
         entity.mixins.append(os_addon.OS_VM)
+        _set_created_attributes(entity, instances[0])
+
+        # all others VMs share the mixins with the requested one.
+        for instance in instances[1:]:
+            other = core_model.Resource(infrastructure.COMPUTE.location +
+                                        instance['uuid'],
+                                        infrastructure.COMPUTE,
+                                        entity.mixins[:])
+            other.attributes = entity.attributes.copy()
+            _set_created_attributes(other, instance)
+            if 'registry' in extras:
+                extras['registry'].add_resource(other.identifier, other,
+                                                extras)
+                extras['created'].append(other)
+        return [item['uuid'] for item in instances]
 
     def retrieve(self, entity, extras):
         """
         Retrieve a VM.
         """
         uid = entity.attributes['occi.core.id']
-        context = extras['nova_ctx']
-        instance = vm.get_vm(uid, context)
+        instance = get_instance(uid, extras)
+        if os_addon.OS_VM in entity.mixins:
+            # fetch console while the others are busy.
+            get_console(uid, extras, wait=False)
 
-        # set state and applicable actions!
+        # set state and applicable actions - keep those of the mixins!
         # TODO: map to OCCI state!
-        state, actions = vm.get_vm_state(uid, context)
-        entity.attributes['occi.compute.state'] = state
-        entity.actions = actions
+        state, actions = vm.get_instance_state(uid, instance)
+        versions.set_actions(entity, actions +
+                             [item for item in entity.actions
+                              if item not in infrastructure.COMPUTE.actions])
 
         # set up to date attributes
-        entity.attributes['occi.compute.hostname'] = instance['hostname']
-        # TODO: check to get arch from OS!
-        entity.attributes['occi.compute.architecture'] = 'x86'
-        entity.attributes['occi.compute.cores'] = str(instance['vcpus'])
-        entity.attributes['occi.compute.speed'] = str(0.0)  # N/A in instance
-        value = str(float(instance['memory_mb']) / 1024)
-        entity.attributes['occi.compute.memory'] = value
+        versions.set_attributes(entity, {
+            'occi.compute.state': state,
+            'occi.compute.hostname': instance['hostname'],
+            # TODO: check to get arch from OS!
+            'occi.compute.architecture': 'x86',
+            'occi.compute.cores': str(instance['vcpus']),
+            'occi.compute.speed': str(0.0),  # N/A in instance
+            'occi.compute.memory': str(float(instance['memory_mb']) / 1024)
+        })
 
     def update(self, old, new, extras):
         """
@@ -108,19 +162,23 @@ class ComputeBackend(KindBackend, ActionBackend):
         mixin = new.mixins[0]
         if isinstance(mixin, os_mixins.ResourceTemplate):
             flavor_id = mixin.res_id
-            vm.resize_vm(uid, flavor_id, context)
+            # only a task may wait for the confirmation.
+            task.submit(old, 'resize', extras, vm.resize_vm, uid, flavor_id,
+                        context, task.is_tracked(extras))
             old.attributes['occi.compute.state'] = 'inactive'
             # now update the mixin info
             old.mixins.append(mixin)
         elif isinstance(mixin, os_mixins.OsTemplate):
             image_href = mixin.os_id
-            vm.rebuild_vm(uid, image_href, context)
+            task.submit(old, 'rebuild', extras, vm.rebuild_vm, uid,
+                        image_href, context)
             old.attributes['occi.compute.state'] = 'inactive'
             # now update the mixin info
             old.mixins.append(mixin)
         else:
             msg = 'Unrecognized mixin. %s' % str(mixin)
             raise AttributeError(msg)
+        versions.touch(old)
 
     def replace(self, old, new, extras):
         """
@@ -149,20 +207,139 @@ class ComputeBackend(KindBackend, ActionBackend):
 
         # set state and applicable actions - so even if the user hasn't done
         # a GET het can still the most applicable action now...
-        state, actions = vm.get_vm_state(uid, context)
-        entity.attributes['occi.compute.state'] = state
-        entity.actions = actions
+        instance = vm.get_vm(uid, context)
+        state, actions = vm.get_instance_state(uid, instance)
+        versions.set_attributes(entity, {'occi.compute.state': state})
+        versions.set_actions(entity, actions)
 
         if action not in entity.actions:
             raise AttributeError("This action is currently not applicable.")
-        elif action == infrastructure.START:
-            vm.start_vm(uid, context)
-        elif action == infrastructure.STOP:
-            vm.stop_vm(uid, context)
-        elif action == infrastructure.RESTART:
-            if not 'method' in attributes:
-                raise AttributeError('Please provide a method!')
-            method = attributes['method']
-            vm.restart_vm(uid, method, context)
-        elif action == infrastructure.SUSPEND:
-            vm.suspend_vm(uid, context)
+        run_action(uid, action, attributes, context, instance=instance)
+
+
+def run_action(uid, action, attributes, context, **kwargs):
+    """
+    Map an OCCI action on a VM to the nova call.
+
+    uid -- Id of the VM.
+    action -- The OCCI action.
+    attributes -- The attributes of the action.
+    context -- The os context.
+    kwargs -- Passed on to the vm glue (e.g. the already retrieved
+              instance).
+    """
+    if action == infrastructure.START:
+        vm.start_vm(uid, context, **kwargs)
+    elif action == infrastructure.STOP:
+        vm.stop_vm(uid, context, **kwargs)
+    elif action == infrastructure.RESTART:
+        if not 'method' in attributes:
+            raise AttributeError('Please provide a method!')
+        method = attributes['method']
+        vm.restart_vm(uid, method, context, **kwargs)
+    elif action == infrastructure.SUSPEND:
+        vm.suspend_vm(uid, context, **kwargs)
+
+
+def get_instance(uid, extras):
+    """
+    Retrieve a VM only once per request.
+
+    The registry, the kind and the mixin backends share this snapshot of
+    the instance instead of each fetching it again.
+
+    uid -- Id of the VM.
+    extras -- The extras of the request.
+    """
+    instances = extras.setdefault('instances', {})
+    if uid not in instances:
+        instances[uid] = vm.get_vm(uid, extras['nova_ctx'])
+    return instances[uid]
+
+
+def set_instances(instances, extras):
+    """
+    Use the VMs of a listing as snapshots for this request.
+
+    instances -- The instances as listed by nova.
+    extras -- The extras of the request.
+    """
+    snapshots = extras.setdefault('instances', {})
+    for instance in instances:
+        snapshots[instance['uuid']] = instance
+
+
+def get_console(uid, extras, wait=True):
+    """
+    Retrieve the VNC console of a VM only once per request.
+
+    The console is fetched in a green thread so it can be requested early
+    and collected when needed.
+
+    uid -- Id of the VM.
+    extras -- The extras of the request.
+    wait -- If False only the fetching is started.
+    """
+    consoles = extras.setdefault('consoles', {})
+    if uid not in consoles:
+        consoles[uid] = eventlet.spawn(vm.get_vnc, uid, extras['nova_ctx'],
+                                       get_instance(uid, extras))
+    if wait:
+        return consoles[uid].wait()
+
+
+def _get_originals(uids, extras):
+    """
+    Return the cached resources of the VM(s) created by an earlier request
+    with the same idempotency key. They are left in the registry as they
+    are - a conflict is raised if they are gone.
+
+    uids -- The ids of the VMs created by the original request.
+    extras -- The extras of the request.
+    """
+    user_id = extras['nova_ctx'].user_id
+    originals = [extras['registry'].cache.get(
+        (infrastructure.COMPUTE.location + uid, user_id)) for uid in uids]
+    if None in originals:
+        raise exceptions.HTTPError(409, 'The VMs created with this '
+                                        'idempotency key are gone.')
+    return originals
+
+
+def _expire_requests():
+    """
+    Forget the oldest idempotency keys - keeps the store bounded.
+    """
+    deadline = time.time() - CONF.occi_idempotency_key_ttl
+    while len(_REQUESTS) > 0:
+        created, _ = _REQUESTS.itervalues().next()
+        if len(_REQUESTS) < CONF.occi_idempotency_keys and \
+                created > deadline:
+            break
+        _REQUESTS.popitem(last=False)
+
+
+def _set_created_attributes(entity, instance):
+    """
+    Set identifier, attributes and actions of a newly created VM.
+
+    entity -- The OCCI compute resource.
+    instance -- The instance as returned by nova.
+    """
+    uid = instance['uuid']
+    entity.identifier = infrastructure.COMPUTE.location + uid
+
+    # set some attributes
+    entity.attributes['occi.core.id'] = uid
+    entity.attributes['occi.compute.hostname'] = instance['hostname']
+    entity.attributes['occi.compute.architecture'] = 'x86'
+    entity.attributes['occi.compute.cores'] = str(instance['vcpus'])
+    entity.attributes['occi.compute.speed'] = str(0.0)  # N/A in instance
+    value = str(float(instance['memory_mb']) / 1024)
+    entity.attributes['occi.compute.memory'] = value
+    entity.attributes['occi.compute.state'] = 'inactive'
+
+    # set valid actions
+    entity.actions = [infrastructure.STOP,
+                      infrastructure.SUSPEND,
+                      infrastructure.RESTART]
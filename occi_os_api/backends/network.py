@@ -89,16 +89,23 @@ class NetworkInterfaceBackend(backend.KindBackend):
                 pool = link.attributes['org.openstack.network.floating.pool']
             else:
                 pool = None
-            address = net.add_floating_ip(link.source.attributes['occi.'
-                                                                 'core.id'],
-                                          pool,
-                                          extras['nova_ctx'])
-            link.attributes['occi.networkinterface.interface'] = 'eth0'
-            link.attributes['occi.networkinterface.mac'] = 'aa:bb:cc:dd:ee:ff'
-            link.attributes['occi.networkinterface.state'] = 'active'
+            uid = link.source.attributes['occi.core.id']
+            address = net.add_floating_ip(uid, pool, extras['nova_ctx'])
+            for item in net.get_network_details(uid, extras['nova_ctx']):
+                if item['network'] is None and item['address'] == address:
+                    break
+            else:
+                raise AttributeError('Floating ip ' + address + ' is not '
+                                     'associated with the VM.')
+            link.attributes['occi.networkinterface.interface'] = \
+                item['interface']
+            link.attributes['occi.networkinterface.mac'] = item['mac']
+            link.attributes['occi.networkinterface.state'] = item['state']
             link.attributes['occi.networkinterface.address'] = address
-            link.attributes['occi.networkinterface.gateway'] = '0.0.0.0'
-            link.attributes['occi.networkinterface.allocation'] = 'static'
+            link.attributes['occi.networkinterface.gateway'] = \
+                item['gateway']
+            link.attributes['occi.networkinterface.allocation'] = \
+                item['allocation']
         else:
             raise AttributeError('Currently not supported.')
 
@@ -25,6 +25,9 @@ import random
 from occi import backend
 from occi import exceptions
 
+from occi_os_api import versions
+from occi_os_api.backends import compute
+from occi_os_api.backends import task
 from occi_os_api.extensions import os_addon
 from occi_os_api.nova_glue import vm
 from occi_os_api.nova_glue import security
@@ -40,49 +43,73 @@ class OsComputeBackend(backend.MixinBackend, backend.ActionBackend):
         Add OpenStack related actions.
         """
         uid = entity.attributes['occi.core.id']
-        context = extras['nova_ctx']
+        instance = compute.get_instance(uid, extras)
 
-        # set additional actions
-        if 'occi.compute.state' in entity.attributes and entity.attributes[
-                'occi.compute.state'] == 'active':
-            entity.actions.append(os_addon.OS_CREATE_IMAGE)
-            entity.actions.append(os_addon.OS_CHG_PWD)
+        # set additional actions - independent of the order the backends
+        # are called in.
+        state, _ = vm.get_instance_state(uid, instance)
+        actions = [item for item in entity.actions
+                   if item not in os_addon.OS_VM.actions]
+        versions.set_actions(entity, actions + get_os_actions(state))
 
         # add VNC link if available
-        console = vm.get_vnc(uid, context)
-        if console:
-            entity.attributes['org.openstack.compute.console.vnc'] =\
-                console['url']
-        else:
-            entity.attributes['org.openstack.compute.console.vnc'] = 'N/A'
-
-        # also expose the exact openstack state
-        entity.attributes['org.openstack.compute.state'] = \
-            vm.get_vm(uid, context)['vm_state']
+        console = compute.get_console(uid, extras)
+        versions.set_attributes(entity, {
+            'org.openstack.compute.console.vnc':
+            console['url'] if console else 'N/A',
+            # also expose the exact openstack state
+            'org.openstack.compute.state': instance['vm_state'],
+            'org.openstack.compute.task':
+            vm.get_vm_task(uid, instance) or 'N/A'
+        })
 
     def action(self, entity, action, attributes, extras):
         """
         This is called by pyssf when an action request is issued.
         """
-        context = extras['nova_ctx']
-        uid = entity.attributes['occi.core.id']
+        run_os_action(entity.attributes['occi.core.id'], action, attributes,
+                      extras, entity)
+
+
+def get_os_actions(state):
+    """
+    Return the OpenStack actions applicable to a VM in the given state.
 
-        if action == os_addon.OS_CHG_PWD:
-            if 'org.openstack.credentials.admin_pwd' not in attributes:
-                msg = 'org.openstack.credentials.admin_pwd was not supplied'\
-                      ' in the request.'
-                raise AttributeError(msg)
+    state -- The OCCI state of the VM.
+    """
+    if state == 'active':
+        return [os_addon.OS_CREATE_IMAGE, os_addon.OS_CHG_PWD]
+    return []
 
-            new_password = attributes['org.openstack.credentials.admin_pwd']
-            vm.set_password_for_vm(uid, new_password, context)
-        elif action == os_addon.OS_CREATE_IMAGE:
-            if 'org.openstack.snapshot.image_name' not in attributes:
-                raise AttributeError('Missing image name')
 
-            image_name = attributes['org.openstack.snapshot.image_name']
-            vm.snapshot_vm(uid, image_name, context)
-        else:
-            raise AttributeError('Not an applicable action.')
+def run_os_action(uid, action, attributes, extras, target=None):
+    """
+    Map an OpenStack action on a VM to the nova call.
+
+    uid -- Id of the VM.
+    action -- The OpenStack action.
+    attributes -- The attributes of the action.
+    extras -- The extras of the request.
+    target -- The compute resource - needed if the action is run as task.
+    """
+    context = extras['nova_ctx']
+    if action == os_addon.OS_CHG_PWD:
+        if 'org.openstack.credentials.admin_pwd' not in attributes:
+            msg = 'org.openstack.credentials.admin_pwd was not supplied'\
+                  ' in the request.'
+            raise AttributeError(msg)
+
+        new_password = attributes['org.openstack.credentials.admin_pwd']
+        vm.set_password_for_vm(uid, new_password, context)
+    elif action == os_addon.OS_CREATE_IMAGE:
+        if 'org.openstack.snapshot.image_name' not in attributes:
+            raise AttributeError('Missing image name')
+
+        image_name = attributes['org.openstack.snapshot.image_name']
+        task.submit(target, 'create_image', extras, vm.snapshot_vm, uid,
+                    image_name, context, True)
+    else:
+        raise AttributeError('Not an applicable action.')
 
 
 class OsNetLinkBackend(backend.MixinBackend, backend.ActionBackend):
@@ -120,8 +147,7 @@ class SecurityGroupBackend(backend.UserDefinedMixinBackend):
         Deletes the specified security group.
         """
         context = extras['nova_ctx']
-        security_group = security.retrieve_group_by_name(category.term,
-                                                         extras['nova_ctx'])
+        security_group = security.retrieve_group(category.term, context)
         security.remove_group(security_group, context)
 
 
@@ -136,21 +162,48 @@ class SecurityRuleBackend(backend.KindBackend):
         The group to add the rule to must exist.
         In OCCI-speak this means the mixin must be supplied with the request
         """
-        sec_mixin = get_sec_mixin(entity)
-        context = extras['nova_ctx']
-        security_group = security.retrieve_group_by_name(sec_mixin.term,
-                                                         context)
-        sg_rule = make_sec_rule(entity, security_group['id'])
-
-        if security_group_rule_exists(security_group, sg_rule):
+        if len(self.create_many([entity], extras)) == 0:
             #This rule already exists in group
-            msg = 'This rule already exists in group. %s' %\
-                  str(security_group)
-            raise AttributeError(msg)
+            raise AttributeError('This rule already exists in group %s.' %
+                                 get_sec_mixin(entity).term)
 
-        rule = security.create_rule(sec_mixin.term, security_group['id'],
-                                    [sg_rule], context)
-        entity.attributes['occi.core.id'] = str(rule['id'])
+    def create_many(self, entities, extras):
+        """
+        Creates a set of security rules for the same group with one call.
+        Rules which already exist in the group - or are given more than
+        once - are created only once.
+
+        Returns the entities of the created rules.
+        """
+        if len(entities) == 0:
+            raise AttributeError('Please provide at least one rule.')
+        sec_mixin = get_sec_mixin(entities[0])
+        for entity in entities[1:]:
+            if get_sec_mixin(entity) != sec_mixin:
+                raise AttributeError('All rules need to be in the same '
+                                     'security group.')
+        context = extras['nova_ctx']
+        security_group = security.retrieve_group(sec_mixin.term, context)
+
+        todo = []
+        keys = set()
+        for entity in entities:
+            sg_rule = make_sec_rule(entity, security_group['id'])
+            key = security.rule_key(sg_rule)
+            if key in keys or \
+                    security.rule_exists(security_group, sg_rule, context):
+                continue
+            keys.add(key)
+            todo.append((entity, sg_rule))
+        if len(todo) == 0:
+            return []
+
+        rules = security.create_rules(security_group['name'],
+                                      security_group['id'],
+                                      [item[1] for item in todo], context)
+        for (entity, _), rule in zip(todo, rules):
+            entity.attributes['occi.core.id'] = str(rule['id'])
+        return [item[0] for item in todo]
 
     def delete(self, entity, extras):
         """
@@ -180,15 +233,21 @@ def make_sec_rule(entity, sec_grp_id):
         sg_rule['protocol'] = prot
     else:
         raise AttributeError('Invalid protocol defined:' + prot)
-    from_p = entity.attributes['occi.network.security.to'].strip()
-    from_p = int(from_p)
-    if (type(from_p) is int) and 0 < from_p <= 65535:
+    # a single port if only the upper end is given.
+    from_p = entity.attributes.get('occi.network.security.from',
+                                   entity.attributes['occi.network.security.'
+                                                     'to']).strip()
+    to_p = entity.attributes['occi.network.security.to'].strip()
+    try:
+        from_p = int(from_p)
+        to_p = int(to_p)
+    except ValueError:
+        raise AttributeError('No valid from/to port defined.')
+    if 0 < from_p <= 65535:
         sg_rule['from_port'] = from_p
     else:
         raise AttributeError('No valid from port defined.')
-    to_p = entity.attributes['occi.network.security.to'].strip()
-    to_p = int(to_p)
-    if (type(to_p) is int) and 0 < to_p <= 65535:
+    if 0 < to_p <= 65535:
         sg_rule['to_port'] = to_p
     else:
         raise AttributeError('No valid to port defined.')
@@ -226,21 +285,3 @@ def get_sec_mixin(entity):
 
     return sec_mixin
 
-
-def security_group_rule_exists(security_group, values):
-    """
-    Indicates whether the specified rule values are already
-    defined in the given security group.
-    """
-    # Taken directly from security_groups.py as that method is not
-    # directly import-able.
-    for rule in security_group['rules']:
-        is_duplicate = True
-        keys = ('group_id', 'cidr', 'from_port', 'to_port', 'protocol')
-        for key in keys:
-            if rule.get(key) != values.get(key):
-                is_duplicate = False
-                break
-        if is_duplicate:
-            return True
-    return False
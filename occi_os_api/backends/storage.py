@@ -29,6 +29,8 @@ from occi import backend
 from occi import exceptions
 from occi.extensions import infrastructure
 
+from occi_os_api import versions
+from occi_os_api.backends import task
 from occi_os_api.nova_glue import storage
 from occi_os_api.nova_glue import vm
 
@@ -56,20 +58,18 @@ class StorageBackend(backend.KindBackend, backend.ActionBackend):
         new_volume = storage.create_storage(size, name, context)
         vol_id = new_volume['id']
 
-        # Work around problem that instance is lazy-loaded...
-        new_volume = storage.get_storage(vol_id, context)
-
         if new_volume['status'] == 'error':
             raise exceptions.HTTPError(500, 'There was an error creating the '
                                        'volume')
         entity.attributes['occi.core.id'] = str(vol_id)
         entity.identifier = infrastructure.STORAGE.location + vol_id
+        _set_state(entity, new_volume)
 
-        if new_volume['status'] == 'available':
-            entity.attributes['occi.storage.state'] = 'active'
-
-        entity.actions = [infrastructure.OFFLINE, infrastructure.BACKUP,
-                          infrastructure.SNAPSHOT, infrastructure.RESIZE]
+        # the cached entity is updated once the volume is ready.
+        if new_volume['status'] == 'creating':
+            storage.wait_for_storage(vol_id, context,
+                                     lambda volume: volume and
+                                     _set_state(entity, volume))
 
     def retrieve(self, entity, extras):
         """
@@ -78,20 +78,13 @@ class StorageBackend(backend.KindBackend, backend.ActionBackend):
         """
         v_id = entity.attributes['occi.core.id']
 
-        volume = storage.get_storage(v_id, extras['nova_ctx'])
+        volume = get_volume(v_id, extras)
 
-        entity.attributes['occi.core.title'] = str(volume['display_name'])
-        entity.attributes['occi.storage.size'] = str(float(volume['size']))
-
-        # OS volume states:
-        #       available, creating, deleting, in-use, error, error_deleting
-        if volume['status'] == 'available' or volume['status'] == 'in-use':
-            entity.attributes['occi.storage.state'] = 'online'
-            entity.actions = [infrastructure.OFFLINE, infrastructure.BACKUP,
-                              infrastructure.SNAPSHOT, infrastructure.RESIZE]
-        else:
-            entity.attributes['occi.storage.state'] = 'offline'
-            entity.actions = [infrastructure.ONLINE]
+        versions.set_attributes(entity, {
+            'occi.core.title': str(volume['display_name']),
+            'occi.storage.size': str(float(volume['size']))
+        })
+        _set_state(entity, volume)
 
     def update(self, old, new, extras):
         """
@@ -109,6 +102,7 @@ class StorageBackend(backend.KindBackend, backend.ActionBackend):
                len(new.attributes['occi.core.summary']) > 0:
                 old.attributes['occi.core.summary'] = \
                     new.attributes['occi.core.summary']
+            versions.touch(old)
 
     def delete(self, entity, extras):
         """
@@ -137,8 +131,58 @@ class StorageBackend(backend.KindBackend, backend.ActionBackend):
                 description = entity.attributes['occi.core.summary']
             else:
                 description = 'N/A'
-            storage.snapshot_storage_instance(volume_id, name, description,
-                                              extras['nova_ctx'])
+            task.submit(entity, 'snapshot', extras,
+                        storage.snapshot_storage_instance, volume_id, name,
+                        description, extras['nova_ctx'], True)
+
+
+def get_volume(uid, extras):
+    """
+    Retrieve a volume - from the listing the registry already did in this
+    request if there is one.
+
+    uid -- Id of the volume.
+    extras -- The extras of the request.
+    """
+    volumes = extras.get('volumes', {})
+    if uid in volumes:
+        return volumes[uid]
+    return storage.get_storage(uid, extras['nova_ctx'])
+
+
+def set_volumes(volumes, extras):
+    """
+    Use the volumes of a listing for this request.
+
+    volumes -- The volumes as listed by nova.
+    extras -- The extras of the request.
+    """
+    snapshots = extras.setdefault('volumes', {})
+    for volume in volumes:
+        snapshots[volume['id']] = volume
+
+
+def _set_state(entity, volume):
+    """
+    Set state and applicable actions of a storage resource.
+
+    entity -- The OCCI storage resource.
+    volume -- The volume as retrieved from nova.
+    """
+    # OS volume states:
+    #       available, creating, deleting, in-use, error, error_deleting
+    if volume['status'] == 'available' or volume['status'] == 'in-use':
+        state = 'online'
+        actions = [infrastructure.OFFLINE, infrastructure.BACKUP,
+                   infrastructure.SNAPSHOT, infrastructure.RESIZE]
+    elif volume['status'] == 'creating':
+        state = 'creating'
+        actions = []
+    else:
+        state = 'offline'
+        actions = [infrastructure.ONLINE]
+    versions.set_attributes(entity, {'occi.storage.state': state})
+    versions.set_actions(entity, actions)
 
 
 class StorageLinkBackend(backend.KindBackend):
@@ -157,6 +201,7 @@ class StorageLinkBackend(backend.KindBackend):
         mount_point = link.attributes['occi.storagelink.deviceid']
 
         vm.attach_volume(instance_id, volume_id, mount_point, context)
+        storage.refresh_storage(volume_id, context)
 
         link.attributes['occi.core.id'] = str(uuid.uuid4())
         link.attributes['occi.storagelink.deviceid'] = \
@@ -173,3 +218,4 @@ class StorageLinkBackend(backend.KindBackend):
 
         volume = storage.get_storage(volume_id, extras['nova_ctx'])
         vm.detach_volume(instance_id, volume, extras['nova_ctx'])
+        storage.refresh_storage(volume_id, extras['nova_ctx'])
@@ -0,0 +1,158 @@
+# coding=utf-8
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#
+#    Copyright (c) 2012, Intel Performance Learning Solutions Ltd.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Backend for tasks - long running operations which are run in the background.
+"""
+
+#pylint: disable=W0232,R0201,W0613,W0703,W0603
+
+import collections
+import time
+import uuid
+
+import eventlet
+from oslo.config import cfg
+
+from nova.openstack.common import log
+
+from occi import backend
+from occi import core_model
+
+from occi_os_api import versions
+from occi_os_api.extensions import os_addon
+
+CONF = cfg.CONF
+
+LOG = log.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_POOL = None
+# (time finished, identifier, extras) of tasks which are done.
+_FINISHED = collections.deque()
+
+
+def is_tracked(extras):
+    """
+    Tell if operations submitted with these extras are run as tasks - and
+    may therefore take their time.
+
+    extras -- The extras of the request.
+    """
+    return 'registry' in extras and 'tasks' in extras
+
+
+def submit(target, action, extras, func, *args):
+    """
+    Run a long running operation as a task.
+
+    When the request was issued through the OCCI application a task
+    resource is created, the operation is handed to the worker pool and the
+    request is answered with 202 Accepted pointing to the task. Otherwise
+    the operation is run right away.
+
+    target -- The entity the operation is performed on.
+    action -- Name of the operation.
+    extras -- The extras of the request.
+    func -- The operation.
+    args -- Arguments for the operation.
+    """
+    if not is_tracked(extras):
+        func(*args)
+        return None
+
+    registry = extras['registry']
+    prune(registry)
+
+    iden = str(uuid.uuid4())
+    task = core_model.Resource(os_addon.TASK.location + iden, os_addon.TASK,
+                               [])
+    task.attributes = {'occi.core.id': iden,
+                       'org.openstack.task.action': action,
+                       'org.openstack.task.target': target.identifier,
+                       'org.openstack.task.state': QUEUED,
+                       'org.openstack.task.error': 'N/A'}
+    registry.add_resource(task.identifier, task, extras)
+    extras['tasks'].append(task)
+
+    # blocks only if all workers are busy.
+    _get_pool().spawn_n(_run, task, registry, extras, func, args)
+    return task
+
+
+def _run(task, registry, extras, func, args):
+    """
+    Run the operation of a task and record the outcome.
+    """
+    versions.set_attributes(task, {'org.openstack.task.state': RUNNING})
+    try:
+        func(*args)
+    except Exception as error:
+        LOG.error('Task %s failed: %s' % (task.identifier, error))
+        versions.set_attributes(task, {'org.openstack.task.state': FAILED,
+                                       'org.openstack.task.error':
+                                       str(error)})
+    else:
+        versions.set_attributes(task, {'org.openstack.task.state': DONE})
+    _FINISHED.append((time.time(), task.identifier, extras))
+
+
+def prune(registry):
+    """
+    Remove the tasks which are done for a while.
+
+    registry -- The registry holding the tasks.
+    """
+    deadline = time.time() - CONF.occi_task_keep
+    while len(_FINISHED) > 0 and _FINISHED[0][0] < deadline:
+        _, identifier, extras = _FINISHED.popleft()
+        registry.delete_resource(identifier, extras)
+
+
+def _get_pool():
+    """
+    Return the worker pool for the tasks.
+    """
+    global _POOL
+    if _POOL is None:
+        _POOL = eventlet.GreenPool(CONF.occi_task_pool_size)
+    return _POOL
+
+
+class TaskBackend(backend.KindBackend):
+    """
+    Backend for the task resources.
+    """
+
+    def create(self, entity, extras):
+        """
+        Tasks are created by the service only.
+        """
+        raise AttributeError('Tasks cannot be created.')
+
+    def delete(self, entity, extras):
+        """
+        Forget a task - only possible when it is finished.
+        """
+        if entity.attributes['org.openstack.task.state'] in [QUEUED,
+                                                             RUNNING]:
+            raise AttributeError('Task is still running.')
@@ -61,7 +61,9 @@ OS_CREATE_IMAGE = core_model.Action(
 
 # A Mixin for OpenStack VMs
 _OS_VM_ATTRIBUTES = {'org.openstack.compute.console.vnc': 'immutable',
-                     'org.openstack.compute.state': 'immutable'}
+                     'org.openstack.compute.state': 'immutable',
+                     'org.openstack.compute.task': 'immutable',
+                     'org.openstack.compute.count': ''}
 OS_VM = core_model.Mixin(
     'http://schemas.openstack.org/compute/instance#',
     'os_vms', actions=[OS_CHG_PWD, OS_CREATE_IMAGE],
@@ -85,3 +87,17 @@ _OS_USER_DATA_ATTRIBUTES = {'org.openstack.compute.user_data': ''}
 OS_USER_DATA_EXT = core_model.Mixin(
     'http://schemas.openstack.org/compute/instance#',
     'user_data', attributes=_OS_USER_DATA_ATTRIBUTES)
+
+# Task kind to track long running operations
+_TASK_ATTRIBUTES = {'org.openstack.task.action': 'immutable',
+                    'org.openstack.task.target': 'immutable',
+                    'org.openstack.task.state': 'immutable',
+                    'org.openstack.task.error': 'immutable'}
+TASK = core_model.Kind(
+    'http://schemas.openstack.org/occi/infrastructure#',
+    'task',
+    [core_model.Resource.kind],
+    None,
+    'Long running task kind',
+    _TASK_ATTRIBUTES,
+    '/task/')
@@ -0,0 +1,686 @@
+# coding=utf-8
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#
+#    Copyright (c) 2012, Intel Performance Learning Solutions Ltd.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Handlers for bulk requests which pyssf would deal with one entity at a time.
+"""
+
+#pylint: disable=W0703,R0201,W0613,W0212
+
+import uuid
+
+import eventlet
+from oslo.config import cfg
+
+from occi import core_model
+from occi import handlers
+from occi.exceptions import HTTPError
+from occi.extensions import infrastructure
+from occi.protocol import occi_parser
+
+from occi_os_api import versions
+from occi_os_api.backends import compute
+from occi_os_api.backends import openstack
+from occi_os_api.backends import storage as storage_backend
+from occi_os_api.extensions import os_addon
+from occi_os_api.nova_glue import net
+from occi_os_api.nova_glue import storage
+from occi_os_api.nova_glue import vm
+
+CONF = cfg.CONF
+
+
+def run_concurrently(func, items):
+    """
+    Call func for every item on a bounded pool of green threads.
+
+    Returns a list of (item, error) tuples in the order of the items - the
+    error is None if the call succeeded.
+
+    func -- The function to call with every item.
+    items -- The items.
+    """
+    def call(item):
+        """
+        Catch the error so one failure does not stop the others.
+        """
+        try:
+            func(item)
+        except HTTPError as error:
+            return item, error.message
+        except Exception as error:
+            return item, str(error)
+        return item, None
+
+    pool = eventlet.GreenPool(CONF.occi_bulk_pool_size)
+    return list(pool.imap(call, items))
+
+
+def render_outcomes(outcomes, hostname):
+    """
+    Render the per entity outcomes of a bulk request - one line per entity.
+
+    outcomes -- List of (identifier, error) tuples - paths are prefixed
+                with the hostname.
+    hostname -- The hostname of the service.
+    """
+    lines = []
+    for identifier, error in outcomes:
+        if identifier.startswith('/'):
+            identifier = hostname + identifier
+        if error is None:
+            lines.append('%s: OK' % identifier)
+        else:
+            lines.append('%s: %s' % (identifier, error))
+    return '\n'.join(lines)
+
+
+class ComputeActionHandler(handlers.BaseHandler):
+    """
+    Triggers an action (an OCCI or an OpenStack one) on a collection of
+    compute resources.
+
+    The state of all VMs is looked up with one listing and the nova calls
+    are dispatched concurrently. The VMs can be limited by X-OCCI-Location
+    or by the mixins (e.g. a template or security group) they have.
+    """
+
+    def post(self, key):
+        """
+        Do a HTTP POST with an action on the compute collection.
+
+        key -- The path of the collection.
+        """
+        try:
+            action, attributes = self.parse_action()
+            categories, _ = self.parse_filter()
+            uids = self._parse_uids()
+        except AttributeError as attr:
+            raise HTTPError(400, str(attr))
+        if action not in infrastructure.COMPUTE.actions + \
+                os_addon.OS_VM.actions:
+            raise HTTPError(400, 'Not an action of the compute collection.')
+        mixins = [item for item in categories if item != action]
+
+        context = self.extras['nova_ctx']
+        listing = vm.get_vms(context)
+        instances = dict([(item['uuid'], item) for item in listing])
+        states = vm.get_instances_states(listing)
+        if uids is None:
+            uids = instances.keys()
+
+        outcomes = []
+        todo = []
+        for uid in uids:
+            identifier = infrastructure.COMPUTE.location + uid
+            if uid not in instances:
+                outcomes.append((identifier, 'Resource not found.'))
+                continue
+            if len(mixins) > 0:
+                # the mixins are only known for VMs in the registry.
+                cached = self.registry.cache.get((identifier,
+                                                  context.user_id))
+                if cached is None:
+                    try:
+                        cached = self.registry.get_resource(identifier,
+                                                            self.extras)
+                    except KeyError:
+                        outcomes.append((identifier, 'Resource not found.'))
+                        continue
+                if not set(mixins) <= set(cached.mixins):
+                    continue
+            state, actions = states[uid]
+            if action not in actions + openstack.get_os_actions(state):
+                outcomes.append((identifier,
+                                 'This action is currently not applicable.'))
+                continue
+            todo.append(uid)
+
+        def perform(uid):
+            """
+            Run the action - reusing the instance from the listing.
+            """
+            if action in os_addon.OS_VM.actions:
+                openstack.run_os_action(uid, action, attributes, self.extras)
+            else:
+                compute.run_action(uid, action, attributes, context,
+                                   instance=instances[uid])
+
+        for uid, error in run_concurrently(perform, todo):
+            outcomes.append((infrastructure.COMPUTE.location + uid, error))
+
+        body = render_outcomes(outcomes, self.registry.get_hostname())
+        return self.response(200, body=body)
+
+    def _parse_uids(self):
+        """
+        Return the ids of the VMs listed in the request or None.
+        """
+        return parse_uids(self, infrastructure.COMPUTE)
+
+
+class StorageBulkHandler(handlers.BaseHandler):
+    """
+    Creates or deletes a set of volumes with one request.
+
+    The volume API calls are done concurrently and the outcome is reported
+    per volume.
+    """
+
+    def post(self, key):
+        """
+        Create volumes - occi.storage.size (and occi.core.title) are given
+        once per volume.
+
+        key -- The path of the collection.
+        """
+        try:
+            specs = _parse_specs(parse_attributes(self))
+        except AttributeError as attr:
+            raise HTTPError(400, str(attr))
+
+        backend = storage_backend.StorageBackend()
+        entities = []
+        for size, title in specs:
+            item = core_model.Resource('', infrastructure.STORAGE, [])
+            item.attributes = {'occi.storage.size': size,
+                               'occi.core.title': title}
+            entities.append(item)
+
+        def create(item):
+            """
+            Create one volume.
+            """
+            backend.create(item, self.extras)
+
+        outcomes = []
+        for item, error in run_concurrently(create, entities):
+            if error is None:
+                self.registry.add_resource(item.identifier, item,
+                                           self.extras)
+                outcomes.append((item.identifier, None))
+            else:
+                outcomes.append((item.attributes['occi.core.title'], error))
+
+        body = render_outcomes(outcomes, self.registry.get_hostname())
+        return self.response(200, body=body)
+
+    def delete(self, key):
+        """
+        Delete the volumes listed with X-OCCI-Location.
+
+        key -- The path of the collection.
+        """
+        try:
+            uids = parse_uids(self, infrastructure.STORAGE)
+        except AttributeError as attr:
+            raise HTTPError(400, str(attr))
+        if uids is None:
+            raise HTTPError(400, 'Please provide the volumes to delete.')
+
+        context = self.extras['nova_ctx']
+        known = [item['id'] for item in storage.get_storage_volumes(context)]
+
+        outcomes = []
+        todo = []
+        for uid in uids:
+            if uid in known:
+                todo.append(uid)
+            else:
+                outcomes.append((infrastructure.STORAGE.location + uid,
+                                 'Resource not found.'))
+
+        def delete(uid):
+            """
+            Delete one volume.
+            """
+            storage.delete_storage_instance(uid, context)
+
+        for uid, error in run_concurrently(delete, todo):
+            identifier = infrastructure.STORAGE.location + uid
+            if error is None:
+                self.registry.delete_resource(identifier, self.extras)
+            outcomes.append((identifier, error))
+
+        body = render_outcomes(outcomes, self.registry.get_hostname())
+        return self.response(200, body=body)
+
+
+class StorageLinkBulkHandler(handlers.BaseHandler):
+    """
+    Attaches or detaches a set of volumes with one request.
+
+    VMs and volumes are looked up with one listing each. Attachments to VMs
+    on different hypervisors are done concurrently - those on the same
+    hypervisor one after the other.
+    """
+
+    def post(self, key):
+        """
+        Attach volumes - occi.core.source, occi.core.target and
+        occi.storagelink.deviceid are given once per link. A single source
+        is used for all targets.
+
+        key -- The path of the collection.
+        """
+        try:
+            specs = self._parse_specs(parse_attributes(self))
+        except AttributeError as attr:
+            raise HTTPError(400, str(attr))
+
+        context = self.extras['nova_ctx']
+        instances = dict([(item['uuid'], item)
+                          for item in vm.get_vms(context)])
+        volumes = dict([(item['id'], item)
+                        for item in storage.get_storage_volumes(context)])
+
+        outcomes = []
+        todo = []
+        for source, target, device in specs:
+            if source not in instances:
+                outcomes.append((infrastructure.COMPUTE.location + source,
+                                 'Resource not found.'))
+            elif target not in volumes:
+                outcomes.append((infrastructure.STORAGE.location + target,
+                                 'Resource not found.'))
+            else:
+                todo.append((source, target, device))
+
+        def attach(item):
+            """
+            Attach one volume.
+            """
+            source, target, device = item
+            vm.attach_volume(source, target, device, context,
+                             instance=instances[source])
+
+        user_id = context.user_id
+        outcome = run_per_host(attach, todo, instances)
+        storage.invalidate_volumes(context.project_id)
+        for item, error in outcome:
+            source, target, device = item
+            if error is not None:
+                outcomes.append((infrastructure.STORAGE.location + target,
+                                 error))
+                continue
+            # add the link if both ends are known - w/o rebuilding them.
+            identifier = None
+            compute_entity = self.registry.cache.get(
+                (infrastructure.COMPUTE.location + source, user_id))
+            storage_entity = self.registry.cache.get(
+                (infrastructure.STORAGE.location + target, user_id))
+            if compute_entity is not None and storage_entity is not None:
+                link = self.registry._construct_storage_link(compute_entity,
+                                                             storage_entity,
+                                                             self.extras)
+                versions.set_attributes(link, {
+                    'occi.core.id': link.identifier[
+                        len(infrastructure.STORAGELINK.location):],
+                    'occi.storagelink.deviceid': device,
+                    'occi.storagelink.mountpoint': '',
+                    'occi.storagelink.state': 'active'
+                })
+                identifier = link.identifier
+            outcomes.append((identifier or
+                             infrastructure.STORAGE.location + target, None))
+
+        body = render_outcomes(outcomes, self.registry.get_hostname())
+        return self.response(200, body=body)
+
+    def delete(self, key):
+        """
+        Detach the volumes of the storage links listed with X-OCCI-Location.
+
+        key -- The path of the collection.
+        """
+        try:
+            uids = parse_uids(self, infrastructure.STORAGELINK)
+        except AttributeError as attr:
+            raise HTTPError(400, str(attr))
+        if uids is None:
+            raise HTTPError(400, 'Please provide the links to delete.')
+
+        context = self.extras['nova_ctx']
+        instances = dict([(item['uuid'], item)
+                          for item in vm.get_vms(context)])
+        volumes = dict([(item['id'], item)
+                        for item in storage.get_storage_volumes(context)])
+
+        outcomes = []
+        todo = []
+        for uid in uids:
+            identifier = infrastructure.STORAGELINK.location + uid
+            link = self.registry.cache.get((identifier, context.user_id))
+            if link is None or link.kind != infrastructure.STORAGELINK:
+                outcomes.append((identifier, 'Resource not found.'))
+                continue
+            source = link.source.attributes['occi.core.id']
+            target = link.target.attributes['occi.core.id']
+            if source not in instances or target not in volumes:
+                outcomes.append((identifier, 'Resource not found.'))
+                continue
+            todo.append((source, link))
+
+        def detach(item):
+            """
+            Detach one volume.
+            """
+            source, link = item
+            vm.detach_volume(source,
+                             volumes[link.target.attributes['occi.core.id']],
+                             context, instance=instances[source])
+
+        outcome = run_per_host(detach, todo, instances)
+        storage.invalidate_volumes(context.project_id)
+        for item, error in outcome:
+            if error is None:
+                self.registry._remove_link(item[1], self.extras)
+            outcomes.append((item[1].identifier, error))
+
+        body = render_outcomes(outcomes, self.registry.get_hostname())
+        return self.response(200, body=body)
+
+    def _parse_specs(self, attributes):
+        """
+        Return (VM id, volume id, device id) tuples of the links to create.
+
+        attributes -- The attributes of the request - see parse_attributes.
+        """
+        for name in ['occi.core.source', 'occi.core.target',
+                     'occi.storagelink.deviceid']:
+            if name not in attributes:
+                raise AttributeError('Missing attribute: ' + name)
+
+        hostname = self.registry.get_hostname()
+        sources = _strip_locations(attributes['occi.core.source'],
+                                   hostname, infrastructure.COMPUTE)
+        targets = _strip_locations(attributes['occi.core.target'],
+                                   hostname, infrastructure.STORAGE)
+        devices = attributes['occi.storagelink.deviceid']
+        if len(sources) == 1:
+            sources = sources * len(targets)
+        if not len(sources) == len(targets) == len(devices):
+            raise AttributeError('Please provide a source and device id per '
+                                 'target.')
+        return zip(sources, targets, devices)
+
+
+class NetworkLinkBulkHandler(handlers.BaseHandler):
+    """
+    Adds floating ips to a set of VMs with one request.
+
+    The VMs and their fixed ips are looked up with one listing and the
+    floating ips are allocated and associated concurrently.
+    """
+
+    def post(self, key):
+        """
+        Link VMs to the public network - occi.core.source is given once
+        per VM. The pool can be given with
+        org.openstack.network.floating.pool.
+
+        key -- The path of the collection.
+        """
+        try:
+            attributes = parse_attributes(self)
+            sources = self._parse_sources(attributes)
+        except AttributeError as attr:
+            raise HTTPError(400, str(attr))
+        pool = attributes.get('org.openstack.network.floating.pool',
+                              [None])[0]
+
+        context = self.extras['nova_ctx']
+        listing = vm.get_vms(context)
+        instances = dict([(item['uuid'], item) for item in listing])
+        net.set_nw_info(listing)
+
+        outcomes = []
+        todo = []
+        for uid in sources:
+            if uid in instances:
+                todo.append(uid)
+            else:
+                outcomes.append((infrastructure.COMPUTE.location + uid,
+                                 'Resource not found.'))
+
+        addresses = {}
+
+        def associate(uid):
+            """
+            Add a floating ip to one VM.
+            """
+            addresses[uid] = net.add_floating_ip(uid, pool, context,
+                                                 instance=instances[uid])
+
+        for uid, error in run_concurrently(associate, todo):
+            identifier = infrastructure.COMPUTE.location + uid
+            if error is not None:
+                outcomes.append((identifier, error))
+                continue
+            # add the link if the VM is known - w/o rebuilding it.
+            compute_entity = self.registry.cache.get((identifier,
+                                                      context.user_id))
+            if compute_entity is not None:
+                for item in net.get_network_details(uid, context,
+                                                    instances[uid]):
+                    if item['network'] is None and \
+                            item['address'] == addresses[uid]:
+                        link = self.registry._construct_network_link(
+                            item, compute_entity, self.registry.pub_net,
+                            self.extras)
+                        identifier = link.identifier
+                        break
+            outcomes.append((identifier, None))
+
+        body = render_outcomes(outcomes, self.registry.get_hostname())
+        return self.response(200, body=body)
+
+    def _parse_sources(self, attributes):
+        """
+        Return the ids of the VMs to add a floating ip to.
+
+        attributes -- The attributes of the request - see parse_attributes.
+        """
+        for name in ['occi.core.source', 'occi.core.target']:
+            if name not in attributes:
+                raise AttributeError('Missing attribute: ' + name)
+
+        hostname = self.registry.get_hostname()
+        for target in attributes['occi.core.target']:
+            if target.strip().replace(hostname, '') != \
+                    self.registry.pub_net.identifier:
+                raise AttributeError('Only links to the public network can '
+                                     'be created.')
+        return _strip_locations(attributes['occi.core.source'], hostname,
+                                infrastructure.COMPUTE)
+
+
+class SecurityRuleBulkHandler(handlers.BaseHandler):
+    """
+    Creates a set of security rules in one security group with one request.
+
+    The rules are validated and deduplicated before all of them are added to
+    the group with a single call.
+    """
+
+    rule_attributes = ['occi.network.security.protocol',
+                       'occi.network.security.from',
+                       'occi.network.security.to',
+                       'occi.network.security.range']
+
+    def post(self, key):
+        """
+        Create rules - the occi.network.security attributes are given once
+        per rule. The security group is given by it's mixin.
+
+        key -- The path of the collection.
+        """
+        try:
+            entity = self.parse_entity(def_kind=os_addon.SEC_RULE)
+            entities = self._parse_rules(entity.mixins,
+                                         parse_attributes(self))
+            created = openstack.SecurityRuleBackend().create_many(
+                entities, self.extras)
+        except AttributeError as attr:
+            raise HTTPError(400, str(attr))
+
+        outcomes = []
+        for item in entities:
+            if item in created:
+                self.registry.add_resource(item.identifier, item,
+                                           self.extras)
+                outcomes.append((item.identifier, None))
+            else:
+                description = ' '.join([item.attributes[name]
+                                        for name in self.rule_attributes])
+                outcomes.append((description,
+                                 'This rule already exists in group.'))
+
+        body = render_outcomes(outcomes, self.registry.get_hostname())
+        return self.response(200, body=body)
+
+    def _parse_rules(self, mixins, attributes):
+        """
+        Return one entity per rule.
+
+        mixins -- The mixins given in the request.
+        attributes -- The attributes of the request - see parse_attributes.
+        """
+        columns = []
+        for name in self.rule_attributes:
+            if name not in attributes:
+                raise AttributeError('Missing attribute: ' + name)
+            columns.append(attributes[name])
+        if len(set([len(item) for item in columns])) != 1:
+            raise AttributeError('Please provide all attributes per rule.')
+
+        result = []
+        for values in zip(*columns):
+            item = core_model.Resource(os_addon.SEC_RULE.location +
+                                       str(uuid.uuid4()), os_addon.SEC_RULE,
+                                       mixins)
+            item.attributes = dict(zip(self.rule_attributes, values))
+            result.append(item)
+        return result
+
+
+def run_per_host(func, items, instances):
+    """
+    Call func for every item - concurrently for items whose VMs are on
+    different hypervisors, one after the other for those on the same.
+
+    Returns a list of (item, error) tuples.
+
+    func -- The function to call with every item.
+    items -- The items - the first entry of each is the id of the VM.
+    instances -- The VMs by id.
+    """
+    groups = {}
+    for item in items:
+        groups.setdefault(instances[item[0]]['host'], []).append(item)
+
+    outcomes = []
+
+    def call(group):
+        """
+        Deal with the items for one hypervisor.
+        """
+        for item in group:
+            try:
+                func(item)
+            except HTTPError as error:
+                outcomes.append((item, error.message))
+            except Exception as error:
+                outcomes.append((item, str(error)))
+            else:
+                outcomes.append((item, None))
+
+    run_concurrently(call, groups.values())
+    return outcomes
+
+
+def parse_uids(handler, kind):
+    """
+    Return the ids of the resources listed in the request or None.
+
+    handler -- The handler of the request.
+    kind -- The kind all resources need to be of.
+    """
+    rendering = handler.get_renderer(handlers.CONTENT_TYPE)
+    if not hasattr(rendering, 'get_data'):
+        return None
+    locations = rendering.get_data(handler.headers, handler.body).locations
+    if len(locations) == 0:
+        return None
+
+    return _strip_locations(locations, handler.registry.get_hostname(), kind)
+
+
+def parse_attributes(handler):
+    """
+    Return the attributes of the request as name -> list of values. Bulk
+    requests give the attributes once per entity - in the order of the
+    entities.
+
+    handler -- The handler of the request.
+    """
+    rendering = handler.get_renderer(handlers.CONTENT_TYPE)
+    if not hasattr(rendering, 'get_data'):
+        raise AttributeError('Bulk requests need to be rendered as '
+                             'text/occi or text/plain.')
+
+    result = {}
+    for item in rendering.get_data(handler.headers, handler.body).attributes:
+        name, value = occi_parser.get_attributes(item)
+        result.setdefault(name, []).append(value)
+    return result
+
+
+def _strip_locations(locations, hostname, kind):
+    """
+    Return the ids of the resources for a list of locations.
+
+    locations -- The locations.
+    hostname -- The hostname of the service.
+    kind -- The kind all resources need to be of.
+    """
+    result = []
+    for item in locations:
+        item = item.strip().replace(hostname, '')
+        if not item.startswith(kind.location):
+            raise AttributeError('Not a %s resource: %s' % (kind.term, item))
+        result.append(item[len(kind.location):])
+    return result
+
+
+def _parse_specs(attributes):
+    """
+    Return (size, title) tuples of the volumes to create.
+
+    attributes -- The attributes of the request - see parse_attributes.
+    """
+    if 'occi.storage.size' not in attributes:
+        raise AttributeError('size attribute not found!')
+    sizes = attributes['occi.storage.size']
+    if 'occi.core.title' in attributes:
+        titles = attributes['occi.core.title']
+    else:
+        titles = [str(uuid.uuid4()) for _ in sizes]
+    if len(titles) != len(sizes):
+        raise AttributeError('Please provide one title per volume.')
+    return zip(sizes, titles)
@@ -0,0 +1,94 @@
+# coding=utf-8
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#
+#    Copyright (c) 2012, Intel Performance Learning Solutions Ltd.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Caching of information retrieved from nova.
+"""
+
+import time
+
+# number of entries after which expired entries are purged.
+PURGE_SIZE = 1024
+
+
+class TTLCache(object):
+    """
+    Simple cache whose entries expire after a given number of seconds.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._purge_at = PURGE_SIZE
+
+    def get(self, key):
+        """
+        Return the cached value or None if not present or expired.
+
+        key -- The key of the entry.
+        """
+        if key not in self._data:
+            return None
+        expires, value = self._data[key]
+        if expires < time.time():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key, value, ttl):
+        """
+        Cache a value.
+
+        key -- The key of the entry.
+        value -- The value.
+        ttl -- Seconds the value is valid.
+        """
+        self._data[key] = (time.time() + ttl, value)
+        if len(self._data) > self._purge_at:
+            self.purge()
+            self._purge_at = max(PURGE_SIZE, 2 * len(self._data))
+
+    def replace(self, key, value):
+        """
+        Replace the value of an entry but keep when it expires - nothing is
+        cached if the entry is not present or expired.
+
+        key -- The key of the entry.
+        value -- The value.
+        """
+        if self.get(key) is not None:
+            self._data[key] = (self._data[key][0], value)
+
+    def invalidate(self, key=None):
+        """
+        Remove an entry - or all entries if no key is given.
+
+        key -- The key of the entry (optional).
+        """
+        if key is None:
+            self._data.clear()
+        else:
+            self._data.pop(key, None)
+
+    def purge(self):
+        """
+        Remove all expired entries.
+        """
+        now = time.time()
+        for key, (expires, _) in self._data.items():
+            if expires < now:
+                self._data.pop(key, None)
@@ -22,83 +22,163 @@ Network related 'glue' :-)
 
 import logging
 
+import eventlet
+from oslo.config import cfg
+
 from nova import compute
+from nova.network import model as network_model
 
+from occi_os_api.nova_glue import cache
 from occi_os_api.nova_glue import vm
 
 # Connect to nova :-)
 
 NETWORK_API = compute.API().network_api
 
+CONF = cfg.CONF
+CONF.import_opt('default_floating_pool', 'nova.network.floating_ips')
 
 LOG = logging.getLogger(__name__)
 
+# uid -> (vm state, task state, network info of the VM).
+NW_INFO = cache.TTLCache()
+# project id -> networks of the project.
+NETWORKS = cache.TTLCache()
+
+# (project id, pool name) -> pre-allocated floating ip addresses.
+RESERVOIR = {}
+# keys of the reservoirs which are currently topped up.
+_REFILLING = set()
 
-def get_network_details(uid, context):
+
+def get_network_details(uid, context, instance=None):
     """
-    Extracts the VMs network adapter information.
+    Extracts the VMs network adapter information: one entry for every fixed
+    ip of every interface and subnet - followed by the floating ips
+    associated with it. The entry's network is None for floating ips.
 
     uid -- Id of the VM.
     context -- The os context.
+    instance -- the instance if already retrieved (optional)
     """
-    vm_instance = vm.get_vm(uid, context)
+    result = []
+    for index, vif in enumerate(get_nw_info(uid, context, instance)):
+        network = _get_network_desc(vif['network'], context)
+        for subnet in vif['network']['subnets']:
+            for fixed_ip in subnet['ips']:
+                item = {'interface': 'eth' + str(index),
+                        'mac': vif['address'],
+                        'state': 'active',
+                        'address': fixed_ip['address'],
+                        'gateway': _get_gateway(subnet),
+                        'allocation': 'static',
+                        'network': network}
+                result.append(item)
+                for floating_ip in fixed_ip['floating_ips']:
+                    public = item.copy()
+                    public['address'] = floating_ip['address']
+                    public['network'] = None
+                    result.append(public)
+    return result
 
-    result = {'public': [], 'admin': []}
-    try:
-        net_info = NETWORK_API.get_instance_nw_info(context, vm_instance)[0]
-    except IndexError:
-        LOG.warn('Unable to retrieve network information - this is because '
-                 'of OpenStack!!')
-        return result
-    gw = net_info['network']['subnets'][0]['gateway']['address']
-    mac = net_info['address']
-
-    if len(net_info['network']['subnets'][0]['ips']) == 0:
-        tmp = {'floating_ips': [], 'address': '0.0.0.0'}
-    else:
-        tmp = net_info['network']['subnets'][0]['ips'][0]
-    for item in tmp['floating_ips']:
-        result['public'].append({'interface': 'eth0',
-                                 'mac': 'aa:bb:cc:dd:ee:ff',
-                                 'state': 'active',
-                                 'address': item['address'],
-                                 'gateway': '0.0.0.0',
-                                 'allocation': 'static'})
-    result['admin'].append({'interface': 'eth0',
-                            'mac': mac,
-                            'state': 'active',
-                            'address': tmp['address'],
-                            'gateway': gw,
-                            'allocation': 'static'})
 
-    return result
+def get_networks(context):
+    """
+    List the networks of a project - including the shared ones. Cached as
+    they rarely change.
+
+    Networks which can not be listed (e.g. when using quantum) are still
+    discovered through the network info of the VMs.
+
+    context -- The os context.
+    """
+    networks = NETWORKS.get(context.project_id)
+    if networks is None:
+        try:
+            networks = [{'id': item['uuid'],
+                         'label': item['label'],
+                         'vlan': item['vlan'],
+                         'cidr': item['cidr'],
+                         'gateway': item['gateway'],
+                         'shared': item['project_id'] is None}
+                        for item in NETWORK_API.get_all(context)]
+        except Exception as e:
+            LOG.warn('Unable to list the networks: %s' % e)
+            networks = []
+        NETWORKS.set(context.project_id, networks,
+                     CONF.occi_network_cache_ttl)
+    return networks
 
 
-def add_floating_ip(uid, pool_name, context):
+def _get_network_desc(network, context):
+    """
+    Describe a network of the network info like get_networks does. The
+    network is only shared if it is listed as shared.
+
+    network -- The network of a VIF.
+    context -- The os context.
+    """
+    subnets = network['subnets']
+    cidr = None
+    gateway = None
+    if len(subnets) > 0:
+        cidr = subnets[0]['cidr']
+        gateway = _get_gateway(subnets[0])
+    return {'id': network['id'],
+            'label': network['label'],
+            'vlan': network.get_meta('vlan'),
+            'cidr': cidr,
+            'gateway': gateway,
+            'shared': network['id'] in [item['id'] for item
+                                        in get_networks(context)
+                                        if item['shared']]}
+
+
+def _get_gateway(subnet):
+    """
+    Return the gateway address of a subnet.
+
+    subnet -- The subnet.
+    """
+    if subnet['gateway'] is None or not subnet['gateway']['address']:
+        return '0.0.0.0'
+    return subnet['gateway']['address']
+
+
+def add_floating_ip(uid, pool_name, context, instance=None):
     """
     Adds an ip to an VM instance.
 
     uid -- id of the VM.
     pool_name -- name of the pool
     context -- The os context.
+    instance -- the instance if already retrieved (optional)
     """
-    vm_instance = vm.get_vm(uid, context)
+    vm_instance = instance
+    if vm_instance is None:
+        vm_instance = vm.get_vm(uid, context)
 
     # FIXME: currently quantum driver has a notimplemented here :-(
     # fixed_ips = NETWORK_API.get_fixed_ip(uid, context)
     # NOTE(aloga): nova-network is still suported in Grizzly, so we
     # should not drop support for it.
-    tmp = NETWORK_API.get_instance_nw_info(context, vm_instance)[0]
-    fixed_ip = tmp.fixed_ips()[0]['address']
+    nw_info = get_nw_info(uid, context, vm_instance)
+    if len(nw_info) == 0 or len(nw_info[0].fixed_ips()) == 0:
+        raise AttributeError('The VM has no fixed ip to associate a '
+                             'floating ip with.')
+    fixed_ip = nw_info[0].fixed_ips()[0]
 
-    float_address = NETWORK_API.allocate_floating_ip(context, pool_name)
+    float_address = _take_floating_ip(pool_name, context)
 
     try:
-        address = fixed_ip
+        address = fixed_ip['address']
         NETWORK_API.associate_floating_ip(context, vm_instance,
                                           float_address, address)
     except Exception as e:
+        _return_floating_ip(float_address, context)
         raise AttributeError(e.message)
+    fixed_ip.add_floating_ip(network_model.IP(address=float_address,
+                                              type='floating'))
     return float_address
 
 
@@ -114,6 +194,185 @@ def remove_floating_ip(uid, address, context):
 
     try:
         NETWORK_API.disassociate_floating_ip(context, vm_instance, address)
-        NETWORK_API.release_floating_ip(context, address)
     except Exception as e:
         raise AttributeError(e.message)
+
+    cached = NW_INFO.get(uid)
+    if cached is not None:
+        for vif in cached[2]:
+            for fixed_ip in vif.fixed_ips():
+                fixed_ip['floating_ips'] = [
+                    item for item in fixed_ip['floating_ips']
+                    if item['address'] != address]
+
+    try:
+        _return_floating_ip(address, context)
+    except Exception as e:
+        # the address is no longer used by the VM either way.
+        LOG.error('Unable to return floating ip %s: %s' % (address, e))
+
+
+def get_nw_info(uid, context, instance=None):
+    """
+    Return the network info of a VM - cached as it rarely changes other
+    than through the floating ips managed here. The cached info is dropped
+    once the state of the VM changes; an empty info is not cached.
+
+    uid -- Id of the VM.
+    context -- The os context.
+    instance -- the instance if already retrieved (optional)
+    """
+    cached = NW_INFO.get(uid)
+    if cached is not None and (instance is None or
+                               cached[:2] == _get_state(instance)):
+        return cached[2]
+
+    if instance is None:
+        instance = vm.get_vm(uid, context)
+    nw_info = NETWORK_API.get_instance_nw_info(context, instance)
+    _cache_nw_info(instance, nw_info)
+    return nw_info
+
+
+def set_nw_info(instances):
+    """
+    Cache the network info nova keeps with the instances of a listing - so
+    it does not need to be fetched for every VM.
+
+    instances -- The instances.
+    """
+    for instance in instances:
+        info_cache = instance.get('info_cache')
+        cached = NW_INFO.get(instance['uuid'])
+        if (cached is not None and cached[:2] == _get_state(instance)) or \
+                not info_cache or not info_cache['network_info']:
+            continue
+        _cache_nw_info(instance, network_model.NetworkInfo.hydrate(
+            info_cache['network_info']))
+
+
+def _cache_nw_info(instance, nw_info):
+    """
+    Cache the network info of a VM together with the state of the VM.
+
+    instance -- The instance.
+    nw_info -- The network info.
+    """
+    if len(nw_info) == 0:
+        NW_INFO.invalidate(instance['uuid'])
+    else:
+        NW_INFO.set(instance['uuid'], _get_state(instance) + (nw_info, ),
+                    CONF.occi_nw_info_cache_ttl)
+
+
+def _get_state(instance):
+    """
+    Return the (vm state, task state) tuple of an instance.
+
+    instance -- The instance.
+    """
+    return instance.get('vm_state'), instance.get('task_state')
+
+
+def _take_floating_ip(pool_name, context):
+    """
+    Return a floating ip - from the reservoir if possible.
+
+    pool_name -- name of the pool
+    context -- The os context.
+    """
+    if CONF.occi_floating_ip_reservoir_high <= 0:
+        return NETWORK_API.allocate_floating_ip(context, pool_name)
+
+    pool_name = _get_pool_name(pool_name)
+    key = (context.project_id, pool_name)
+    addresses = _get_reservoir(key, pool_name, context)
+    if len(addresses) > 0:
+        address = addresses.pop()
+    else:
+        address = NETWORK_API.allocate_floating_ip(context, pool_name)
+
+    if len(addresses) < CONF.occi_floating_ip_reservoir_low and \
+            key not in _REFILLING:
+        _REFILLING.add(key)
+        eventlet.spawn_n(_refill, key, pool_name, context)
+    return address
+
+
+def _return_floating_ip(address, context):
+    """
+    Put a floating ip which is no longer used back into the reservoir - or
+    release it if the reservoir is full.
+
+    address -- The ip address.
+    context -- The os context.
+    """
+    if CONF.occi_floating_ip_reservoir_high <= 0:
+        NETWORK_API.release_floating_ip(context, address)
+        return
+
+    pool_name = _get_pool_name(NETWORK_API.get_floating_ip_by_address(
+        context, address)['pool'])
+    addresses = _get_reservoir((context.project_id, pool_name), pool_name,
+                               context)
+    if len(addresses) < CONF.occi_floating_ip_reservoir_high:
+        addresses.append(address)
+    else:
+        NETWORK_API.release_floating_ip(context, address)
+
+
+def _get_reservoir(key, pool_name, context):
+    """
+    Return the reservoir of a pool of a project. On first use it is seeded
+    with the floating ips the project allocated but did not associate - so
+    the ones pre-allocated before a restart are not leaked.
+
+    key -- The key of the reservoir.
+    pool_name -- name of the pool
+    context -- The os context.
+    """
+    if key in RESERVOIR:
+        return RESERVOIR[key]
+
+    addresses = RESERVOIR[key] = []
+    try:
+        floating_ips = NETWORK_API.get_floating_ips_by_project(context)
+    except Exception as e:
+        LOG.warn('Unable to list the floating ips of project %s: %s' %
+                 (context.project_id, e))
+        return addresses
+    unused = [item['address'] for item in floating_ips
+              if item['fixed_ip_id'] is None and
+              _get_pool_name(item['pool']) == pool_name]
+    addresses.extend(unused[:CONF.occi_floating_ip_reservoir_high])
+    return addresses
+
+
+def _get_pool_name(pool_name):
+    """
+    Return the name of the pool - nova uses the default pool if none is
+    given so the reservoir of both is the same.
+
+    pool_name -- name of the pool (or None)
+    """
+    return pool_name or CONF.default_floating_pool
+
+
+def _refill(key, pool_name, context):
+    """
+    Top up a reservoir to the high watermark.
+
+    key -- The key of the reservoir.
+    pool_name -- name of the pool
+    context -- The os context.
+    """
+    addresses = RESERVOIR[key]
+    try:
+        while len(addresses) < CONF.occi_floating_ip_reservoir_high:
+            addresses.append(NETWORK_API.allocate_floating_ip(context,
+                                                              pool_name))
+    except Exception as e:
+        LOG.warn('Unable to top up the floating ips of pool %s: %s' %
+                 (pool_name, e))
+    finally:
+        _REFILLING.discard(key)
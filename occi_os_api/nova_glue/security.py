@@ -20,10 +20,21 @@
 Security related 'glue'
 """
 
+from oslo.config import cfg
+
 from nova import compute
 
+from occi_os_api.nova_glue import cache
+
 SEC_API = compute.API().security_group_api
 
+CONF = cfg.CONF
+
+# project id -> security groups of the project and their rules - indexed
+# by id and name. Kept up to date with the changes done through this
+# service.
+GROUPS = cache.TTLCache()
+
 # TODO: exception handling
 
 
@@ -35,7 +46,10 @@ def create_group(name, description, context):
     description -- Description.
     context -- The os context.
     """
-    SEC_API.create_security_group(context, name, description)
+    group = SEC_API.create_security_group(context, name, description)
+    entry = GROUPS.get(context.project_id)
+    if entry is not None:
+        _add_group(entry, group, [])
 
 
 def remove_group(group, context):
@@ -46,39 +60,201 @@ def remove_group(group, context):
     context -- The os context.
     """
     SEC_API.destroy(context, group)
+    entry = GROUPS.get(context.project_id)
+    if entry is not None and str(group['id']) in entry['by_id']:
+        group = entry['by_id'].pop(str(group['id']))
+        entry['by_name'].pop(group['name'], None)
+        entry['groups'].remove(group)
+        for rule in entry['rules'].pop(group['id'], {}).values():
+            entry['rules_by_id'].pop(str(rule['id']), None)
 
 
-def retrieve_group_by_name(name, context):
+def retrieve_group(term, context):
     """
     Retrieve the security group associated with the security mixin.
 
-    mixin_term -- The term of the mixin representing the group.
+    term -- The term of the mixin representing the group (name or id).
     context -- The os context.
     """
-    return SEC_API.list(context, names=[name], project=context.project_id)[0]
+    return _retrieve(context, 'by_id', 'by_name', [term], 'security group')[0]
 
 
 def retrieve_groups_by_project(context):
     """
-    Retrieve list of security groups by project.
+    Retrieve list of security groups by project - cached for a short time.
+
+    context -- The os context.
+    """
+    return _get_entry(context)['groups']
+
+
+def resolve_group_names(terms, context):
+    """
+    Resolve the terms of security group mixins to the names of the groups.
+
+    terms -- The terms of the mixins (name or id of the group).
+    context -- The os context.
+    """
+    groups = _retrieve(context, 'by_id', 'by_name', terms, 'security group')
+    return [item['name'] for item in groups]
+
+
+def retrieve_rule(uid, context):
+    """
+    Retrieve a rule.
+
+    uid -- Id of the rule (entity.attributes['occi.core.id'])
+    context -- The os context.
+    """
+    return _retrieve(context, 'rules_by_id', 'rules_by_id', [uid],
+                     'security rule')[0]
+
+
+def retrieve_rules_by_project(context):
+    """
+    Retrieve list of security rules by project - cached like the groups.
+
+    context -- The os context.
+    """
+    return _get_entry(context)['rules_by_id'].values()
+
+
+def _retrieve(context, id_index, name_index, terms, what):
+    """
+    Look up items in the indices of the project. The groups are listed at
+    most once more if an item is not known yet.
 
     context -- The os context.
+    id_index -- The index holding the items by id.
+    name_index -- The index holding the items by name.
+    terms -- The ids or names of the items.
+    what -- What is looked up (for the error message).
     """
-    return SEC_API.list(context, project=context.project_id)
+    def lookup(entry):
+        """
+        Return the items - None for the unknown ones.
+        """
+        return [entry[id_index].get(str(term),
+                                    entry[name_index].get(term))
+                for term in terms]
+
+    result = lookup(_get_entry(context))
+    if None in result:
+        GROUPS.invalidate(context.project_id)
+        result = lookup(_get_entry(context))
+    if None in result:
+        missing = [str(terms[i]) for i in range(len(terms))
+                   if result[i] is None]
+        raise AttributeError('Unknown %s(s): %s' % (what,
+                                                    ', '.join(missing)))
+    return result
 
 
-def create_rule(name, iden, rule, context):
+def _get_entry(context):
     """
-    Create a security rule.
+    Return the cache entry of the project - listing the groups if needed.
+
+    context -- The os context.
+    """
+    entry = GROUPS.get(context.project_id)
+    if entry is None:
+        entry = {'groups': [], 'by_id': {}, 'by_name': {}, 'rules': {},
+                 'rules_by_id': {}}
+        for group in SEC_API.list(context, project=context.project_id):
+            _add_group(entry, group, group['rules'])
+        GROUPS.set(context.project_id, entry,
+                   CONF.occi_security_group_cache_ttl)
+    return entry
+
+
+def _add_group(entry, group, rules):
+    """
+    Add a group and it's rules to the cache entry of a project.
+
+    entry -- The cache entry.
+    group -- The security group.
+    rules -- The rules of the group.
+    """
+    entry['groups'].append(group)
+    entry['by_id'][str(group['id'])] = group
+    entry['by_name'][group['name']] = group
+    entry['rules'][group['id']] = {}
+    _add_rules(entry, group['id'], rules)
+
+
+def _add_rules(entry, group_id, rules):
+    """
+    Add rules to the cache entry of a project.
+
+    entry -- The cache entry.
+    group_id -- Id of the security group.
+    rules -- The rules.
+    """
+    index = entry['rules'].setdefault(group_id, {})
+    for rule in rules:
+        index[rule_key(rule)] = rule
+        entry['rules_by_id'][str(rule['id'])] = rule
+
+
+def rule_exists(group, rule, context):
+    """
+    Indicates whether the rule is already defined in the group.
+
+    group -- The security group.
+    rule -- The values of the rule.
+    context -- The os context.
+    """
+    index = _get_entry(context)['rules'].get(group['id'])
+    if index is None:
+        # not a group of the project.
+        index = dict([(rule_key(item), item) for item in group['rules']])
+    return rule_key(rule) in index
+
+
+def rule_key(rule):
+    """
+    Return the normalized (group_id, cidr, from_port, to_port, protocol)
+    tuple identifying a rule.
 
     rule -- The rule.
+    """
+    def _int(value):
+        """
+        Ports as integers - None if not set.
+        """
+        if value is None or str(value).strip() == '':
+            return None
+        return int(value)
+
+    cidr = rule.get('cidr')
+    protocol = rule.get('protocol')
+    return (rule.get('group_id') or None,
+            cidr.strip() if cidr else None,
+            _int(rule.get('from_port')),
+            _int(rule.get('to_port')),
+            protocol.strip().lower() if protocol else None)
+
+
+def create_rules(name, iden, rules, context):
+    """
+    Create a set of security rules in a group with one call.
+
+    Returns the created rules - in the order they were given.
+
+    name -- Name of the group.
+    iden -- Id of the group.
+    rules -- The rules.
     context -- The os context.
     """
-    # TODO: needs work!
     try:
-        return SEC_API.add_rules(context, iden, name, rule)[0]
+        result = SEC_API.add_rules(context, iden, name, rules)
     except Exception as e:
+        GROUPS.invalidate(context.project_id)
         raise AttributeError(e.message)
+    entry = GROUPS.get(context.project_id)
+    if entry is not None:
+        _add_rules(entry, iden, result)
+    return result
 
 
 def remove_rule(rule, context):
@@ -89,15 +265,10 @@ def remove_rule(rule, context):
     context -- The os context.
     """
     group_id = rule['parent_group_id']
-    security_group = SEC_API.get(context, None, group_id)
+    security_group = _retrieve(context, 'by_id', 'by_id', [group_id],
+                               'security group')[0]
     SEC_API.remove_rules(context, security_group, (rule['id'], ))
-
-
-def retrieve_rule(uid, context):
-    """
-    Retrieve a rule.
-
-    uid -- Id of the rule (entity.attributes['occi.core.id'])
-    context -- The os context.
-    """
-    return SEC_API.get_rule(context, uid)
+    entry = GROUPS.get(context.project_id)
+    if entry is not None:
+        entry['rules'].get(group_id, {}).pop(rule_key(rule), None)
+        entry['rules_by_id'].pop(str(rule['id']), None)
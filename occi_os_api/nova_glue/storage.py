@@ -20,12 +20,27 @@
 Storage related glue :-)
 """
 
+import functools
+
+from oslo.config import cfg
+
 from nova import compute
+from nova.openstack.common import log
 
 from occi import exceptions
 
+from occi_os_api.nova_glue import cache
+from occi_os_api.nova_glue import waiter
+
 VOLUME_API = compute.API().volume_api
 
+CONF = cfg.CONF
+
+LOG = log.getLogger(__name__)
+
+# project id -> volumes of the project.
+VOLUMES = cache.TTLCache()
+
 
 def create_storage(size, name, context):
     """
@@ -46,12 +61,29 @@ def create_storage(size, name, context):
     size = int(float(size))
 
     try:
-        return VOLUME_API.create(context,
-                                 size,
-                                 name,
-                                 name)
+        volume = VOLUME_API.create(context,
+                                   size,
+                                   name,
+                                   name)
     except Exception as e:
         raise AttributeError(e.message)
+    _cache_volume(volume, context)
+    return volume
+
+
+def wait_for_storage(uid, context, callback):
+    """
+    Wait in the background until a volume is no longer being created.
+
+    uid -- Id of the volume.
+    context -- The os context.
+    callback -- Called with the latest representation of the volume (or
+                None if it is gone or the creation took too long).
+    """
+    return waiter.wait(list_storage_volumes, str(uid), context,
+                       lambda item: item['status'] != 'creating',
+                       lambda item, error: callback(item),
+                       CONF.occi_volume_create_timeout)
 
 
 def delete_storage_instance(uid, context):
@@ -65,21 +97,44 @@ def delete_storage_instance(uid, context):
         VOLUME_API.delete(context, uid)
     except Exception as e:
         raise AttributeError(e.message)
+    _uncache_volume(uid, context)
 
 
-def snapshot_storage_instance(uid, name, description, context):
+def snapshot_storage_instance(uid, name, description, context, wait=False):
     """
     Snapshots an storage instance.
 
     uid -- Id of the volume.
     context -- The os context.
+    wait -- wait until the snapshot is done.
     """
     try:
         instance = get_storage(uid, context)
-        VOLUME_API.create_snapshot(context, instance, name, description)
+        snapshot = VOLUME_API.create_snapshot(context, instance, name,
+                                              description)
     except Exception as e:
         raise AttributeError(e.message)
 
+    done = waiter.wait(get_storage_snapshots, str(snapshot['id']), context,
+                       lambda item: item['status'] in ['available', 'error'],
+                       functools.partial(_snapshot_done, uid),
+                       CONF.occi_snapshot_timeout)
+    if wait:
+        error = done.wait()
+        if error is not None:
+            raise AttributeError('Snapshot of %s failed: %s' % (uid, error))
+
+
+def _snapshot_done(uid, snapshot, error):
+    """
+    Report the outcome of a snapshot - returns None if it succeeded.
+    """
+    if error is None and snapshot['status'] != 'available':
+        error = snapshot['status']
+    if error is not None:
+        LOG.error('Snapshot of volume %s failed: %s' % (uid, error))
+    return error
+
 
 def get_storage(uid, context):
     """
@@ -97,6 +152,72 @@ def get_storage(uid, context):
 
 def get_storage_volumes(context):
     """
-    Retrieve all storage entities from user.
+    Retrieve all storage entities from user - cached for a short time.
+    """
+    volumes = VOLUMES.get(context.project_id)
+    if volumes is None:
+        volumes = list_storage_volumes(context)
+    return volumes
+
+
+def list_storage_volumes(context):
+    """
+    List all storage entities from user - bypassing (and refreshing) the
+    cache.
+    """
+    volumes = VOLUME_API.get_all(context)
+    VOLUMES.set(context.project_id, volumes, CONF.occi_volume_cache_ttl)
+    return volumes
+
+
+def refresh_storage(uid, context):
+    """
+    Update a volume in the cached listing - e.g. after it got attached.
+
+    uid -- Id of the volume.
+    context -- The os context.
+    """
+    try:
+        _cache_volume(VOLUME_API.get(context, uid), context)
+    except Exception:
+        invalidate_volumes(context.project_id)
+
+
+def invalidate_volumes(project_id):
+    """
+    Forget the cached volumes of a project - e.g. when notified about
+    changes.
+
+    project_id -- Id of the project.
+    """
+    VOLUMES.invalidate(project_id)
+
+
+def _cache_volume(volume, context):
+    """
+    Add or replace a volume in the cached listing (if there is one) - the
+    listing still expires when it would have.
+    """
+    volumes = VOLUMES.get(context.project_id)
+    if volumes is not None:
+        volumes = [item for item in volumes if item['id'] != volume['id']]
+        volumes.append(volume)
+        VOLUMES.replace(context.project_id, volumes)
+
+
+def _uncache_volume(uid, context):
+    """
+    Remove a volume from the cached listing (if there is one) - the
+    listing still expires when it would have.
+    """
+    volumes = VOLUMES.get(context.project_id)
+    if volumes is not None:
+        volumes = [item for item in volumes if item['id'] != uid]
+        VOLUMES.replace(context.project_id, volumes)
+
+
+def get_storage_snapshots(context):
+    """
+    Retrieve all snapshots of storage entities from user.
     """
-    return VOLUME_API.get_all(context)
+    return VOLUME_API.get_all_snapshots(context)
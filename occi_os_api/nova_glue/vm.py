@@ -22,6 +22,10 @@ VM related 'glue' :-)
 
 #pylint: disable=R0914,W0142,R0912,R0915
 
+import functools
+
+from oslo.config import cfg
+
 from nova import compute
 from nova import utils
 from nova.compute import task_states
@@ -34,16 +38,44 @@ from occi.extensions import infrastructure
 
 from occi_os_api.extensions import os_mixins
 from occi_os_api.extensions import os_addon
+from occi_os_api.nova_glue import cache
+from occi_os_api.nova_glue import security
+from occi_os_api.nova_glue import waiter
 
 COMPUTE_API = compute.API()
 
+CONF = cfg.CONF
+CONF.import_opt('console_token_ttl', 'nova.consoleauth.manager')
+
 LOG = log.getLogger(__name__)
 
+# uid -> status of resizes which still need to be confirmed.
+RESIZE_PENDING = 'resize_pending'
+RESIZE_CONFIRMING = 'resize_confirming'
+RESIZE_FAILED = 'resize_failed'
+RESIZE_TASKS = {}
+# uid -> True for VMs whose last resize failed - reported for a while.
+RESIZE_FAILURES = cache.TTLCache()
+
+# uid -> (vm_state, task_state, console) of recently issued VNC consoles.
+CONSOLES = cache.TTLCache()
+
+# states of images (and so snapshots) which will not change anymore.
+IMAGE_FINAL_STATES = ['active', 'killed', 'deleted']
+
+# the flavors - shared by all users - and a version which changes whenever
+# the set of flavors changes.
+FLAVORS = cache.TTLCache()
+FLAVOR_VERSION = {'version': 0, 'fingerprint': None}
+
 
 def create_vm(entity, context):
     """
     Create a VM for an given OCCI entity.
 
+    Returns the list of created instances - more than one if the
+    org.openstack.compute.count attribute asks for it.
+
     entity -- the OCCI resource entity.
     context -- the os context.
     """
@@ -61,6 +93,14 @@ def create_vm(entity, context):
     metadata = {}
     injected_files = []
     min_count = max_count = 1
+    if 'org.openstack.compute.count' in entity.attributes:
+        try:
+            min_count = max_count = \
+                int(entity.attributes['org.openstack.compute.count'])
+        except ValueError:
+            raise AttributeError('Count needs to be an integer.')
+        if min_count < 1:
+            raise AttributeError('Count needs to be at least 1.')
     requested_networks = None
     sg_names = []
     availability_zone = None
@@ -88,15 +128,15 @@ def create_vm(entity, context):
         # Look for security group. If the group is non-existant, the
         # call to create will fail.
         if os_addon.SEC_GROUP in mixin.related:
-            secgroup = COMPUTE_API.security_group_api.get(context,
-                                                          name=mixin.term)
-            sg_names.append(secgroup["name"])
+            sg_names.append(mixin.term)
 
     if not os_template:
         raise AttributeError('Please provide a valid OS Template.')
 
+    if sg_names:
+        sg_names = security.resolve_group_names(sg_names, context)
     if resource_template:
-        inst_type = flavors.get_flavor_by_flavor_id(resource_template.res_id)
+        inst_type = get_flavor(resource_template.res_id)
     else:
         inst_type = None
     # make the call
@@ -129,8 +169,7 @@ def create_vm(entity, context):
     except Exception as e:
         raise AttributeError(e.message)
 
-    # return first instance
-    return instances[0]
+    return instances
 
 
 def rebuild_vm(uid, image_href, context):
@@ -152,7 +191,7 @@ def rebuild_vm(uid, image_href, context):
         raise AttributeError(e.message)
 
 
-def resize_vm(uid, flavor_id, context):
+def resize_vm(uid, flavor_id, context, wait=False):
     """
     Resizes a VM up or down
 
@@ -162,28 +201,97 @@ def resize_vm(uid, flavor_id, context):
     uid -- id of the instance
     flavor_id -- image reference.
     context -- the os context
+    wait -- wait for the confirmation instead of doing it in the background.
     """
     instance = get_vm(uid, context)
     kwargs = {}
     try:
-        flavor = flavors.get_flavor_by_flavor_id(flavor_id)
+        flavor = get_flavor(flavor_id)
         COMPUTE_API.resize(context, instance, flavor_id=flavor['flavorid'],
                            **kwargs)
-        ready = False
-        i = 0
-        # XXX are 15 secs enough to resize?
-        while not ready and i < 15:
-            i += 1
-            state = get_vm(uid, context)['vm_state']
-            if state == 'resized':
-                ready = True
-            import time
-            time.sleep(1)
-        instance = get_vm(uid, context)
-        COMPUTE_API.confirm_resize(context, instance)
     except Exception as e:
         raise AttributeError(str(e))
 
+    # confirmation is done in the background once nova is done.
+    RESIZE_FAILURES.invalidate(uid)
+    RESIZE_TASKS[uid] = RESIZE_PENDING
+    done = waiter.wait(get_vms, uid, context, _is_resized,
+                       functools.partial(_confirm_resize, uid, context),
+                       CONF.occi_resize_confirm_timeout, id_attr='uuid')
+    if wait:
+        done.wait()
+        if RESIZE_FAILURES.get(uid):
+            raise AttributeError('Resize could not be confirmed.')
+
+
+def _is_resized(instance):
+    """
+    Tell if nova is done with resizing an instance.
+    """
+    return instance['vm_state'] in [vm_states.RESIZED, vm_states.ERROR]
+
+
+def _confirm_resize(uid, context, instance, error):
+    """
+    Confirm the resize of a VM once nova is done with it.
+
+    uid -- id of the instance
+    context -- the os context
+    instance -- the instance as listed by the waiter.
+    error -- why the wait ended without the VM being resized (or None).
+    """
+    if error == waiter.GONE:
+        # VM is gone - nothing to confirm.
+        RESIZE_TASKS.pop(uid, None)
+    elif error == waiter.TIMEOUT:
+        LOG.error('Resize of %s did not finish in time - will not '
+                  'confirm it.' % uid)
+        _resize_failed(uid)
+    elif error is not None:
+        LOG.error('Resize of %s could not be followed - will not confirm '
+                  'it.' % uid)
+        _resize_failed(uid)
+    elif instance['vm_state'] == vm_states.ERROR:
+        LOG.error('Resize of %s failed.' % uid)
+        _resize_failed(uid)
+    else:
+        RESIZE_TASKS[uid] = RESIZE_CONFIRMING
+        try:
+            COMPUTE_API.confirm_resize(context, instance)
+        except Exception as e:
+            LOG.error('Unable to confirm resize of %s: %s' % (uid, e))
+            _resize_failed(uid)
+        else:
+            RESIZE_TASKS.pop(uid, None)
+
+
+def _resize_failed(uid):
+    """
+    Record that the resize of a VM failed - it is reported as long as
+    finished tasks are kept.
+
+    uid -- id of the instance
+    """
+    RESIZE_TASKS.pop(uid, None)
+    RESIZE_FAILURES.set(uid, True, CONF.occi_task_keep)
+
+
+def get_vm_task(uid, instance):
+    """
+    Return the task an VM is currently busy with (or None).
+
+    Pending resize confirmations done by this service are reported before
+    the task state of nova.
+
+    uid -- id of the instance
+    instance -- the instance as retrieved from nova.
+    """
+    if uid in RESIZE_TASKS:
+        return RESIZE_TASKS[uid]
+    if RESIZE_FAILURES.get(uid):
+        return RESIZE_FAILED
+    return instance['task_state']
+
 
 def delete_vm(uid, context):
     """
@@ -199,14 +307,16 @@ def delete_vm(uid, context):
         raise exceptions.HTTPError(500, str(error))
 
 
-def suspend_vm(uid, context):
+def suspend_vm(uid, context, instance=None):
     """
     Suspends a VM. Use the start action to unsuspend a VM.
 
     uid -- id of the instance
     context -- the os context
+    instance -- the instance if already retrieved (optional)
     """
-    instance = get_vm(uid, context)
+    if instance is None:
+        instance = get_vm(uid, context)
 
     try:
         COMPUTE_API.pause(context, instance)
@@ -214,25 +324,46 @@ def suspend_vm(uid, context):
         raise exceptions.HTTPError(500, str(error))
 
 
-def snapshot_vm(uid, image_name, context):
+def snapshot_vm(uid, image_name, context, wait=False):
     """
     Snapshots a VM. Use the start action to unsuspend a VM.
 
     uid -- id of the instance
     image_name -- name of the new image
     context -- the os context
+    wait -- wait until the image is uploaded.
     """
     instance = get_vm(uid, context)
     try:
-        COMPUTE_API.snapshot(context,
-                             instance,
-                             image_name)
+        image = COMPUTE_API.snapshot(context,
+                                     instance,
+                                     image_name)
 
     except Exception as e:
         raise AttributeError(e.message)
 
+    done = waiter.wait(retrieve_images, str(image['id']), context,
+                       lambda item: item['status'] in IMAGE_FINAL_STATES,
+                       functools.partial(_snapshot_done, uid),
+                       CONF.occi_snapshot_timeout)
+    if wait:
+        error = done.wait()
+        if error is not None:
+            raise AttributeError('Snapshot of %s failed: %s' % (uid, error))
+
+
+def _snapshot_done(uid, image, error):
+    """
+    Report the outcome of a snapshot - returns None if it succeeded.
+    """
+    if error is None and image['status'] != 'active':
+        error = image['status']
+    if error is not None:
+        LOG.error('Snapshot of %s failed: %s' % (uid, error))
+    return error
 
-def start_vm(uid, context):
+
+def start_vm(uid, context, instance=None):
     """
     Starts a vm that is in the stopped state. Note, currently we do not
     use the nova start and stop, rather the resume/suspend methods. The
@@ -241,8 +372,10 @@ def start_vm(uid, context):
     uid -- id of the instance
     state -- the state the VM is in (str)
     context -- the os context
+    instance -- the instance if already retrieved (optional)
     """
-    instance = get_vm(uid, context)
+    if instance is None:
+        instance = get_vm(uid, context)
     try:
         if instance['vm_state'] in [vm_states.PAUSED]:
             COMPUTE_API.unpause(context, instance)
@@ -260,7 +393,7 @@ def start_vm(uid, context):
         raise AttributeError(e.message)
 
 
-def stop_vm(uid, context):
+def stop_vm(uid, context, instance=None):
     """
     Stops a VM. Rather than use stop, suspend is used.
     OCCI -> graceful, acpioff, poweroff
@@ -268,8 +401,10 @@ def stop_vm(uid, context):
 
     uid -- id of the instance
     context -- the os context
+    instance -- the instance if already retrieved (optional)
     """
-    instance = get_vm(uid, context)
+    if instance is None:
+        instance = get_vm(uid, context)
 
     try:
         COMPUTE_API.suspend(context, instance)
@@ -277,7 +412,7 @@ def stop_vm(uid, context):
         raise AttributeError(e.message)
 
 
-def restart_vm(uid, method, context):
+def restart_vm(uid, method, context, instance=None):
     """
     Restarts a VM.
       OS types == SOFT, HARD
@@ -289,8 +424,10 @@ def restart_vm(uid, method, context):
     uid -- id of the instance
     method -- how the machine should be restarted.
     context -- the os context
+    instance -- the instance if already retrieved (optional)
     """
-    instance = get_vm(uid, context)
+    if instance is None:
+        instance = get_vm(uid, context)
 
     if method in ('graceful', 'warm'):
         reboot_type = 'SOFT'
@@ -304,7 +441,8 @@ def restart_vm(uid, method, context):
         raise AttributeError(e.message)
 
 
-def attach_volume(instance_id, volume_id, mount_point, context):
+def attach_volume(instance_id, volume_id, mount_point, context,
+                  instance=None):
     """
     Attaches a storage volume.
 
@@ -312,8 +450,10 @@ def attach_volume(instance_id, volume_id, mount_point, context):
     volume_id -- Id of the storage volume.
     mount_point -- Where to mount.
     context -- The os security context.
+    instance -- the instance if already retrieved (optional)
     """
-    instance = get_vm(instance_id, context)
+    if instance is None:
+        instance = get_vm(instance_id, context)
     try:
         COMPUTE_API.attach_volume(
             context,
@@ -324,16 +464,18 @@ def attach_volume(instance_id, volume_id, mount_point, context):
         raise AttributeError(e.message)
 
 
-def detach_volume(instance_id, volume, context):
+def detach_volume(instance_id, volume, context, instance=None):
     """
     Detach a storage volume.
 
     volume -- Volume description.
     instance_id -- Id of the VM.
     context -- the os context.
+    instance -- the instance if already retrieved (optional)
     """
     try:
-        instance = get_vm(instance_id, context)
+        if instance is None:
+            instance = get_vm(instance_id, context)
         COMPUTE_API.detach_volume(context, instance, volume)
     except Exception as e:
         raise AttributeError(e)
@@ -354,20 +496,38 @@ def set_password_for_vm(uid, password, context):
         raise AttributeError(e.message)
 
 
-def get_vnc(uid, context):
+def get_vnc(uid, context, instance=None):
     """
     Retrieve VNC console or None if unavailable.
 
+    Consoles are only requested for active VMs and are cached until the
+    token expires or the state of the VM changes.
+
     uid -- id of the instance
     context -- the os context
+    instance -- the instance if already retrieved (optional)
     """
     console = None
-    instance = get_vm(uid, context)
+    if instance is None:
+        instance = get_vm(uid, context)
+    if instance['vm_state'] != vm_states.ACTIVE:
+        CONSOLES.invalidate(uid)
+        return None
+
+    cached = CONSOLES.get(uid)
+    if cached is not None and cached[:2] == (instance['vm_state'],
+                                             instance['task_state']):
+        return cached[2]
+
     try:
         console = COMPUTE_API.get_vnc_console(context, instance, 'novnc')
     except Exception:
         LOG.warn('Console info is not available atm!')
     finally:
+        if console is not None:
+            ttl = min(CONF.occi_console_cache_ttl, CONF.console_token_ttl)
+            CONSOLES.set(uid, (instance['vm_state'], instance['task_state'],
+                               console), ttl)
         return console
 
 
@@ -390,49 +550,95 @@ def get_vms(context):
     Retrieve all VMs in a given context.
     """
     opts = {'deleted': False}
-    tmp = COMPUTE_API.get_all(context, search_opts=opts)
+    tmp = COMPUTE_API.get_all(context, search_opts=opts, want_objects=True)
     return tmp
 
 
-def get_vm_state(uid, context):
+def _build_state_table():
     """
-    See nova/compute/vm_states.py nova/compute/task_states.py
+    Precompute the (vm_state, task_state) -> (occi state, actions) table.
 
     Mapping assumptions:
     - active == VM can service requests from network. These requests
             can be from users or VMs
     - inactive == the oppose! :-)
     - suspended == machine in a frozen state e.g. via suspend or pause
+    """
+    vm_state_map = {
+        vm_states.ACTIVE: ('active', (infrastructure.STOP,
+                                      infrastructure.SUSPEND,
+                                      infrastructure.RESTART)),
+        vm_states.PAUSED: ('inactive', (infrastructure.START, )),
+        vm_states.SUSPENDED: ('inactive', (infrastructure.START, )),
+        vm_states.STOPPED: ('inactive', (infrastructure.START, ))}
+    # while an image is taken no actions are allowed.
+    blocking_tasks = (task_states.IMAGE_SNAPSHOT,
+                      task_states.IMAGE_PENDING_UPLOAD,
+                      task_states.IMAGE_UPLOADING)
+
+    all_vm_states = _get_constants(vm_states)
+    all_task_states = _get_constants(task_states) + [None]
+
+    table = {}
+    for vm_state in all_vm_states:
+        for task_state in all_task_states:
+            if task_state in blocking_tasks:
+                table[(vm_state, task_state)] = ('inactive', ())
+            else:
+                table[(vm_state, task_state)] = \
+                    vm_state_map.get(vm_state, ('inactive', ()))
+    return table
+
+
+def _get_constants(module):
+    """
+    Return the state constants defined in one of nova's state modules.
+    """
+    return [getattr(module, item) for item in dir(module)
+            if item.isupper() and isinstance(getattr(module, item), str)]
+
+
+# (vm_state, task_state) -> (occi state, actions).
+STATE_TABLE = _build_state_table()
+
+
+def get_vm_state(uid, context):
+    """
+    See nova/compute/vm_states.py nova/compute/task_states.py
 
     uid -- Id of the VM.
     context -- the os context.
     """
-    instance = get_vm(uid, context)
-    state = 'inactive'
-    actions = []
-
-    if instance['vm_state'] in [vm_states.ACTIVE]:
-        state = 'active'
-        actions.append(infrastructure.STOP)
-        actions.append(infrastructure.SUSPEND)
-        actions.append(infrastructure.RESTART)
-    elif instance['vm_state'] in [vm_states.BUILDING]:
-        state = 'inactive'
-    elif instance['vm_state'] in [vm_states.PAUSED, vm_states.SUSPENDED,
-                                  vm_states.STOPPED]:
-        state = 'inactive'
-        actions.append(infrastructure.START)
-    elif instance['vm_state'] in [vm_states.RESCUED,
-                                  vm_states.ERROR,
-                                  vm_states.DELETED]:
-        state = 'inactive'
-
-    # Some task states require a state
-    if instance['vm_state'] in [task_states.IMAGE_SNAPSHOT]:
-        state = 'inactive'
-        actions = []
-
-    return state, actions
+    return get_instance_state(uid, get_vm(uid, context))
+
+
+def get_instance_state(uid, instance):
+    """
+    Map the state of an already retrieved instance - see get_vm_state.
+
+    uid -- Id of the VM.
+    instance -- the instance as retrieved from nova.
+    """
+    # while waiting for the confirmation of a resize no actions are allowed.
+    if RESIZE_TASKS.get(uid) in [RESIZE_PENDING, RESIZE_CONFIRMING]:
+        return 'inactive', []
+
+    state, actions = STATE_TABLE.get((instance['vm_state'],
+                                      instance.get('task_state')),
+                                     ('inactive', ()))
+    return state, list(actions)
+
+
+def get_instances_states(instances):
+    """
+    Map the states of a list of instances (e.g. from get_vms) at once.
+
+    Returns a dict of uid -> (occi state, actions).
+
+    instances -- the instances as retrieved from nova.
+    """
+    return dict([(item['uuid'], get_instance_state(item['uuid'], item))
+                 for item in instances])
 
 # Image management
 
@@ -456,6 +662,60 @@ def retrieve_images(context):
 
 def retrieve_flavors():
     """
-    Retrieve list of flavors.
+    Retrieve list of flavors - cached for all users.
+    """
+    return _get_flavors()[0]
+
+
+def _get_flavors():
+    """
+    Return the flavors and the flavors indexed by flavor id.
+    """
+    cached = FLAVORS.get('all')
+    if cached is None:
+        all_flavors = flavors.get_all_flavors()
+        by_id = dict([(item['flavorid'], item)
+                      for item in all_flavors.values()])
+        cached = (all_flavors, by_id)
+        FLAVORS.set('all', cached, CONF.occi_flavor_cache_ttl)
+
+        fingerprint = sorted([(item['flavorid'], item['name'])
+                              for item in all_flavors.values()])
+        if fingerprint != FLAVOR_VERSION['fingerprint']:
+            FLAVOR_VERSION['fingerprint'] = fingerprint
+            FLAVOR_VERSION['version'] += 1
+    return cached
+
+
+def get_flavor_version():
+    """
+    Return the version of the flavors - changes when flavors got added or
+    removed.
+    """
+    _get_flavors()
+    return FLAVOR_VERSION['version']
+
+
+def get_flavor(flavor_id):
+    """
+    Retrieve a flavor by it's flavor id.
+
+    flavor_id -- The flavor id.
+    """
+    flavor = _get_flavors()[1].get(flavor_id)
+    if flavor is None:
+        # not (yet) known - ask nova.
+        flavor = flavors.get_flavor_by_flavor_id(flavor_id)
+    return flavor
+
+
+def get_instance_flavor_id(instance):
+    """
+    Return the flavor id of the flavor an instance runs with (or None).
+
+    instance -- The instance.
     """
-    return flavors.get_all_flavors()
+    for item in _get_flavors()[0].values():
+        if item['id'] == instance['instance_type_id']:
+            return item['flavorid']
+    return None
@@ -0,0 +1,194 @@
+# coding=utf-8
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#
+#    Copyright (c) 2012, Intel Performance Learning Solutions Ltd.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Waits for resources in nova to reach a certain state.
+
+All waits for the same kind of resource of one project are served by one
+green thread which periodically lists the resources - instead of polling
+every resource on it's own.
+"""
+
+#pylint: disable=W0703,R0913
+
+import time
+
+import eventlet
+from eventlet import event
+from oslo.config import cfg
+
+from nova.openstack.common import log
+
+CONF = cfg.CONF
+
+LOG = log.getLogger(__name__)
+
+# reasons why a wait ended without the resource reaching the state.
+GONE = 'gone'
+TIMEOUT = 'timeout'
+FAILED = 'failed'
+
+# number of listings in a row a resource which was never seen needs to be
+# missing from before it is reported as gone - new resources (e.g. images
+# of snapshots) are not always listed right away.
+_MISSING_LISTINGS = 3
+
+# (lister, id attribute, project id) -> group of waits served by one poller.
+_GROUPS = {}
+
+
+class _Wait(object):
+    """
+    A single wait for a resource.
+    """
+
+    def __init__(self, uid, check, callback, deadline):
+        self.uid = uid
+        self.check = check
+        self.callback = callback
+        self.deadline = deadline
+        self.done = event.Event()
+        # if the resource was listed yet & in how many listings it was not.
+        self.seen = False
+        self.missing = 0
+
+
+def wait(lister, uid, context, check, callback=None, timeout=None,
+         id_attr='id'):
+    """
+    Wait until a resource reaches a state.
+
+    Returns an event which is sent the result of the callback - or the
+    error (GONE, TIMEOUT or FAILED) if no callback is given - once the wait
+    is over.
+
+    lister -- Function listing all resources of a kind: lister(context).
+    uid -- Id of the resource.
+    context -- The os context.
+    check -- Function telling if the resource is in the desired (or a final)
+             state: check(resource).
+    callback -- Called as callback(resource, error) when the wait is over.
+                error is None, GONE, TIMEOUT or FAILED (optional).
+    timeout -- Seconds to wait at most (optional).
+    id_attr -- Name of the attribute holding the id of the resources.
+    """
+    deadline = None
+    if timeout is not None:
+        deadline = time.time() + timeout
+    item = _Wait(uid, check, callback, deadline)
+
+    key = (lister, id_attr, context.project_id)
+    if key not in _GROUPS:
+        _GROUPS[key] = {'waits': [], 'interval': CONF.occi_poll_interval,
+                        'context': context}
+        _GROUPS[key]['waits'].append(item)
+        eventlet.spawn_n(_poll, key, lister, id_attr)
+    else:
+        _GROUPS[key]['waits'].append(item)
+        # new work - check soon again with the newest context.
+        _GROUPS[key]['interval'] = CONF.occi_poll_interval
+        _GROUPS[key]['context'] = context
+    return item.done
+
+
+def _poll(key, lister, id_attr):
+    """
+    List the resources and finish the waits which are over - until no
+    waits are left. Backs off while nothing changes.
+
+    The listing is done with the context of the newest wait - if it fails
+    all waits of the group are over.
+
+    key -- The key of the group.
+    lister -- The lister.
+    id_attr -- Name of the attribute holding the id of the resources.
+    """
+    group = _GROUPS[key]
+    try:
+        while len(group['waits']) > 0:
+            eventlet.sleep(group['interval'])
+            context = group['context']
+            try:
+                resources = dict([(str(item[id_attr]), item)
+                                  for item in lister(context)])
+            except Exception as error:
+                if group['context'] is not context:
+                    # a newer context arrived meanwhile - retry with it.
+                    continue
+                LOG.error('Unable to list resources: %s' % error)
+                for item in list(group['waits']):
+                    group['waits'].remove(item)
+                    _finish(item, None, FAILED)
+                break
+
+            now = time.time()
+            finished = 0
+            for item in list(group['waits']):
+                outcome = _check(item, resources, now)
+                if outcome is None:
+                    continue
+                group['waits'].remove(item)
+                _finish(item, outcome[0], outcome[1])
+                finished += 1
+
+            if finished == 0:
+                group['interval'] = min(group['interval'] * 2,
+                                        CONF.occi_poll_max_interval)
+    finally:
+        _GROUPS.pop(key, None)
+
+
+def _check(item, resources, now):
+    """
+    Tell if a wait is over - returns a (resource, error) tuple or None.
+
+    item -- The wait.
+    resources -- The listed resources by id.
+    now -- The current time.
+    """
+    if item.uid in resources:
+        item.seen = True
+        item.missing = 0
+        try:
+            if item.check(resources[item.uid]):
+                return resources[item.uid], None
+        except Exception as err:
+            LOG.error('Check for %s failed: %s' % (item.uid, err))
+    else:
+        item.missing += 1
+        if item.seen or item.missing >= _MISSING_LISTINGS:
+            return None, GONE
+    if item.deadline is not None and item.deadline <= now:
+        return None, TIMEOUT
+    return None
+
+
+def _finish(item, resource, error):
+    """
+    Run the callback of a wait and send the result to the waiting ones.
+    """
+    result = error
+    if item.callback is not None:
+        try:
+            result = item.callback(resource, error)
+        except Exception as err:
+            LOG.error('Callback for %s failed: %s' % (item.uid, err))
+    try:
+        item.done.send(result)
+    except Exception as err:
+        LOG.error('Unable to finish the wait for %s: %s' % (item.uid, err))
@@ -24,23 +24,38 @@ OCCI registry
 #E1121:# positional args.
 #pylint: disable=R0201,E1002,R0914,R0912,E1121
 
+import copy
 import uuid
 
 from oslo.config import cfg
 
+from occi_os_api import versions
+from occi_os_api.backends import compute
 from occi_os_api.backends import openstack
+from occi_os_api.backends import storage as storage_backend
+from occi_os_api.backends import task
 from occi_os_api.extensions import os_addon
+from occi_os_api.extensions import os_mixins
 
+from occi_os_api.nova_glue import cache
 from occi_os_api.nova_glue import vm
 from occi_os_api.nova_glue import storage
 from occi_os_api.nova_glue import net
+from occi_os_api.nova_glue import security
 
 from occi import registry as occi_registry
 from occi import core_model
 from occi.extensions import infrastructure
+from occi.protocol import rendering as occi_rendering
 
 CONF = cfg.CONF
 
+# volume states in which the volume is (still) linked to it's instance.
+LINKED_STATES = ('attaching', 'in-use', 'detaching')
+
+# (identifier, mime type) -> (version, rendering) of an entity.
+RENDERINGS = cache.TTLCache()
+
 
 class OCCIRegistry(occi_registry.NonePersistentRegistry):
     """
@@ -53,15 +68,19 @@ class OCCIRegistry(occi_registry.NonePersistentRegistry):
     def __init__(self):
         super(OCCIRegistry, self).__init__()
         self.cache = {}
-        self.adm_net = core_model.Resource('/network/admin',
-                                           infrastructure.NETWORK,
-                                           [infrastructure.IPNETWORK])
         self.pub_net = core_model.Resource('/network/public',
                                            infrastructure.NETWORK,
                                            [infrastructure.IPNETWORK])
 
         self._setup_network()
 
+    def set_renderer(self, mime_type, renderer):
+        """
+        Keep the representations of the entities rendered.
+        """
+        super(OCCIRegistry, self).set_renderer(
+            mime_type, CachingRendering(renderer, self))
+
     def set_hostname(self, hostname):
         if CONF.occi_custom_location_hostname:
             hostname = CONF.occi_custom_location_hostname
@@ -109,21 +128,41 @@ class OCCIRegistry(occi_registry.NonePersistentRegistry):
         """
         Just here to prevent the super class from filling up an unused dict.
         """
+        # new or changed - a new link also changes it's source.
+        versions.touch(resource)
         if (key, extras['nova_ctx'].user_id) not in self.cache and \
                 core_model.Link.kind in resource.kind.related:
             # don't need to cache twice, only adding links :-)
             self.cache[(key, extras['nova_ctx'].user_id)] = resource
         elif (key, extras['nova_ctx'].user_id) not in self.cache and \
                 resource.kind == os_addon.SEC_RULE:
-            # don't need to cache twice, only adding links :-)
+            # rules are listed per user.
+            resource.extras = self.get_extras(extras)
+            self.cache[(key, extras['nova_ctx'].user_id)] = resource
+        elif resource.kind in [infrastructure.COMPUTE,
+                               infrastructure.STORAGE] and \
+                (resource.identifier,
+                 extras['nova_ctx'].user_id) not in self.cache:
+            # newly created VMs & volumes - the backend has set the
+            # identifier to the one in OpenStack. Links & mixins are patched
+            # on next update.
+            resource.extras = self.get_extras(extras)
+            self.cache[(resource.identifier,
+                        extras['nova_ctx'].user_id)] = resource
+        elif (key, extras['nova_ctx'].user_id) not in self.cache and \
+                resource.kind == os_addon.TASK:
+            # tasks only live in the cache.
+            resource.extras = self.get_extras(extras)
             self.cache[(key, extras['nova_ctx'].user_id)] = resource
 
     def delete_resource(self, key, extras):
         """
         Just here to prevent the super class from messing up.
         """
-        if (key, extras['nova_ctx'].user_id) in self.cache:
-            self.cache.pop((key, extras['nova_ctx'].user_id))
+        entity = self.cache.pop((key, extras['nova_ctx'].user_id), None)
+        if entity is not None:
+            # the source of a link lost it.
+            versions.touch(entity)
 
     # the following routines actually retrieve the info form OpenStack. Note
     # that a cache is used. The cache is stable - so delete resources
@@ -136,10 +175,38 @@ class OCCIRegistry(occi_registry.NonePersistentRegistry):
         context = extras['nova_ctx']
         iden = key[key.rfind('/') + 1:]
 
+        if key.startswith(os_addon.TASK.location):
+            # tasks only live in the cache - those done for a while are gone.
+            task.prune(self)
+            if (key, context.user_id) not in self.cache:
+                raise KeyError
+
+        if (key, context.user_id) in self.cache and \
+                self.cache[(key, context.user_id)].kind not in \
+                [infrastructure.COMPUTE, infrastructure.STORAGE]:
+            # links, rules, tasks and networks - no need to ask OS.
+            return self.cache[(key, context.user_id)]
+
+        if key.startswith(os_addon.SEC_RULE.location):
+            # rules - from the security groups of the project.
+            for entity in self._setup_rules(extras):
+                if entity.identifier == key:
+                    return entity
+            raise KeyError
+
+        if key.startswith(infrastructure.NETWORK.location):
+            # networks - discovered through the network API.
+            for entity in self._setup_networks(extras):
+                if entity.identifier == key:
+                    return entity
+            raise KeyError
+
         vms = vm.get_vms(context)
         vm_res_ids = [item['uuid'] for item in vms]
+        compute.set_instances(vms, extras)
         stors = storage.get_storage_volumes(context)
         stor_res_ids = [item['id'] for item in stors]
+        storage_backend.set_volumes(stors, extras)
 
         if (key, context.user_id) in self.cache:
             # I have seen it - need to update or delete if gone in OS!
@@ -162,10 +229,12 @@ class OCCIRegistry(occi_registry.NonePersistentRegistry):
             elif iden in vm_res_ids:
                 # it also exists in OS -> update it (take links, mixins
                 # from cached one)
-                result = self._update_occi_compute(cached_item, extras)
+                result = self._update_occi_compute(cached_item, extras,
+                                                   stors)
             elif iden in stor_res_ids:
                 # it also exists in OS -> update it!
-                result = self._update_occi_storage(cached_item, extras)
+                result = self._update_occi_storage(cached_item, extras,
+                                                   stors)
             else:
                 # return cached item (links)
                 return cached_item
@@ -207,17 +276,21 @@ class OCCIRegistry(occi_registry.NonePersistentRegistry):
         """
         Retrieve a set of resources.
         """
-
-        # TODO: add security rules!
-
         context = extras['nova_ctx']
         result = []
 
+        task.prune(self)
+        self._setup_networks(extras)
+        # rules are complete after this - and handled like tasks below.
+        self._setup_rules(extras)
+
         vms = vm.get_vms(context)
         vm_res_ids = [item['uuid'] for item in vms]
+        compute.set_instances(vms, extras)
 
         stors = storage.get_storage_volumes(context)
         stor_res_ids = [item['id'] for item in stors]
+        storage_backend.set_volumes(stors, extras)
 
         for item in self.cache.values():
             if item.extras is not None and item.extras['user_id'] != \
@@ -228,18 +301,22 @@ class OCCIRegistry(occi_registry.NonePersistentRegistry):
             if item.extras is None:
                 # add to result set
                 result.append(item)
+            elif item.kind in [os_addon.TASK, infrastructure.NETWORK,
+                               os_addon.SEC_RULE]:
+                # tasks, private networks and rules of this user
+                result.append(item)
             elif item_id in vm_res_ids and item.kind == \
                     infrastructure.COMPUTE:
                 # check & update (take links, mixins from cache)
                 # add compute and it's links to result
-                self._update_occi_compute(item, extras)
+                self._update_occi_compute(item, extras, stors)
                 result.append(item)
                 result.extend(item.links)
             elif item_id in stor_res_ids and item.kind == \
                     infrastructure.STORAGE:
                 # check & update (take links, mixins from cache)
                 # add compute and it's links to result
-                self._update_occi_storage(item, extras)
+                self._update_occi_storage(item, extras, stors)
                 result.append(item)
             elif item_id not in vm_res_ids and item.kind == \
                     infrastructure.COMPUTE:
@@ -274,12 +351,88 @@ class OCCIRegistry(occi_registry.NonePersistentRegistry):
 
     # Not part of parent
 
-    def _update_occi_compute(self, entity, extras):
+    def _update_occi_compute(self, entity, extras, stors=None):
         """
         Update an occi compute resource instance.
+
+        Only what changed in OpenStack is patched: the os and resource
+        template mixins, the network links and the storage links. Links
+        which are still valid keep their identifiers.
+
+        entity -- The cached compute resource.
+        extras -- The extras of the request.
+        stors -- Listing of the volumes (optional - fetched if not given).
         """
-        # TODO: implement update of mixins and links (remove old mixins and
-        # links)!
+        context = extras['nova_ctx']
+        identifier = entity.attributes['occi.core.id']
+
+        instance = compute.get_instance(identifier, extras)
+
+        # 1. os and res templates
+        res_tmp = self._get_resource_template(instance, extras)
+        if res_tmp is not None:
+            # unknown flavors keep the mixin the entity already has.
+            self._patch_template(entity, os_mixins.ResourceTemplate,
+                                 res_tmp)
+
+        os_tmp = None
+        for mixin in entity.mixins:
+            if isinstance(mixin, os_mixins.OsTemplate) and \
+                    mixin.os_id == instance['image_ref']:
+                # unchanged - no need to ask glance.
+                os_tmp = mixin
+                break
+        if os_tmp is None:
+            os_tmp = self._get_os_template(instance, extras)
+        self._patch_template(entity, os_mixins.OsTemplate, os_tmp)
+
+        # 2. network links
+        current = [(self._get_network(item['network'], extras), item)
+                   for item in net.get_network_details(identifier, context,
+                                                       instance)]
+
+        known = {}
+        for link in entity.links:
+            if link.kind == infrastructure.NETWORKINTERFACE:
+                known[(link.target.identifier,
+                       link.attributes['occi.networkinterface.address'])] = \
+                    link
+        for target, item in current:
+            link = known.pop((target.identifier, item['address']), None)
+            if link is None:
+                self._construct_network_link(item, entity, target, extras)
+            else:
+                self._set_network_link_attributes(link, item)
+        for link in known.values():
+            # gone in OS (e.g. floating ip got released).
+            self._remove_link(link, extras)
+
+        # 3. storage links
+        if stors is None:
+            stors = storage.get_storage_volumes(context)
+        status = dict([(item['id'], item['status']) for item in stors])
+        attached = [item['id'] for item in stors
+                    if item['status'] in LINKED_STATES and
+                    item['instance_uuid'] == identifier]
+
+        linked = []
+        for link in entity.links[:]:
+            if link.kind != infrastructure.STORAGELINK:
+                continue
+            vol_id = link.target.attributes['occi.core.id']
+            if status.get(vol_id, 'available') == 'available':
+                # detached (or gone) in OS.
+                self._remove_link(link, extras)
+            else:
+                linked.append(vol_id)
+        for vol_id in attached:
+            key = (infrastructure.STORAGE.location + vol_id, context.user_id)
+            if vol_id not in linked and key in self.cache:
+                # storage resources not yet seen will create the link while
+                # being constructed.
+                self._construct_storage_link(entity, self.cache[key],
+                                             extras)
+
         return entity
 
     def _construct_occi_compute(self, identifier, extras):
@@ -293,7 +446,7 @@ class OCCIRegistry(occi_registry.NonePersistentRegistry):
         result = []
         context = extras['nova_ctx']
 
-        instance = vm.get_vm(identifier, context)
+        instance = compute.get_instance(identifier, extras)
 
         # 1. get identifier
         iden = infrastructure.COMPUTE.location + identifier
@@ -302,26 +455,18 @@ class OCCIRegistry(occi_registry.NonePersistentRegistry):
         result.append(entity)
 
         # 2. os and res templates
-        flavor_id = int(instance['instance_type_id'])
-        res_tmp = self.get_category('/' + str(flavor_id) + '/', extras)
+        res_tmp = self._get_resource_template(instance, extras)
         if res_tmp:
             entity.mixins.append(res_tmp)
 
-        os_id = instance['image_ref']
-        image_id = vm.retrieve_image(os_id, context)['id']
-        image_tmp = self.get_category('/' + image_id + '/', extras)
+        image_tmp = self._get_os_template(instance, extras)
         if image_tmp:
             entity.mixins.append(image_tmp)
 
         # 3. network links & get links from cache!
-        net_links = net.get_network_details(identifier, context)
-        for item in net_links['public']:
-            link = self._construct_network_link(item, entity, self.pub_net,
-                                                extras)
-            result.append(link)
-        for item in net_links['admin']:
-            link = self._construct_network_link(item, entity, self.adm_net,
-                                                extras)
+        for item in net.get_network_details(identifier, context, instance):
+            target = self._get_network(item['network'], extras)
+            link = self._construct_network_link(item, entity, target, extras)
             result.append(link)
 
         # core.id and cache it!
@@ -331,10 +476,37 @@ class OCCIRegistry(occi_registry.NonePersistentRegistry):
 
         return result
 
-    def _update_occi_storage(self, entity, extras):
+    def _update_occi_storage(self, entity, extras, stors=None):
         """
         Update a storage resource instance.
+
+        Adds the storage link if the volume got attached to a known compute
+        resource. Links of detached volumes are removed while updating the
+        compute resource they originate from.
+
+        entity -- The cached storage resource.
+        extras -- The extras of the request.
+        stors -- Listing of the volumes (optional - fetched if not given).
         """
+        context = extras['nova_ctx']
+        identifier = entity.attributes['occi.core.id']
+
+        if stors is None:
+            stor = storage.get_storage(identifier, context)
+        else:
+            stor = [item for item in stors if item['id'] == identifier][0]
+
+        if stor['status'] in LINKED_STATES and stor['instance_uuid']:
+            key = (infrastructure.COMPUTE.location +
+                   str(stor['instance_uuid']), context.user_id)
+            if key in self.cache:
+                source = self.cache[key]
+                for link in source.links:
+                    if link.target is entity:
+                        break
+                else:
+                    self._construct_storage_link(source, entity, extras)
+
         return entity
 
     def _construct_occi_storage(self, identifier, extras):
@@ -355,17 +527,11 @@ class OCCIRegistry(occi_registry.NonePersistentRegistry):
         result.append(entity)
 
         # create links on VM resources
-        if stor['status'] == 'in-use':
+        if stor['status'] in LINKED_STATES and stor['instance_uuid']:
             source = self.get_resource(infrastructure.COMPUTE.location +
                                        str(stor['instance_uuid']), extras)
-            link = core_model.Link(infrastructure.STORAGELINK.location +
-                                   str(uuid.uuid4()),
-                                   infrastructure.STORAGELINK, [], source,
-                                   entity)
-            link.extras = self.get_extras(extras)
-            source.links.append(link)
+            link = self._construct_storage_link(source, entity, extras)
             result.append(link)
-            self.cache[(link.identifier, context.user_id)] = link
 
         # core.id and cache it!
         entity.attributes['occi.core.id'] = identifier
@@ -376,31 +542,124 @@ class OCCIRegistry(occi_registry.NonePersistentRegistry):
 
     def _setup_network(self):
         """
-        Add a public and an admin network interface.
+        Add the public network - floating ips are handed out from it.
         """
-        # TODO: read from openstack!
         self.pub_net.attributes = {'occi.network.vlan': 'external',
                                    'occi.network.label': 'default',
                                    'occi.network.state': 'active',
-                                   'occi.networkinterface.address': '192'
-                                                                    '.168'
-                                                                    '.0.0/24',
-                                   'occi.networkinterface.gateway': '192.168'
-                                                                    '.0.1',
-                                   'occi.networkinterface.allocation':
-                                   'static'}
-        self.adm_net.attributes = {'occi.network.vlan': 'admin',
-                                   'occi.network.label': 'default',
-                                   'occi.network.state': 'active',
-                                   'occi.networkinterface.address': '10.0.0'
-                                                                    '.0/24',
-                                   'occi.networkinterface.gateway': '10.0.0'
-                                                                    '.1',
                                    'occi.networkinterface.allocation':
-                                   'static'}
-        self.cache[(self.adm_net.identifier, None)] = self.adm_net
+                                   'dynamic'}
         self.cache[(self.pub_net.identifier, None)] = self.pub_net
 
+    def _setup_networks(self, extras):
+        """
+        Make sure the networks listed by the network API are known and
+        return them - together with the public network.
+
+        extras -- The extras of the request.
+        """
+        result = [self.pub_net]
+        for item in net.get_networks(extras['nova_ctx']):
+            result.append(self._get_network(item, extras))
+        return result
+
+    def _get_network(self, net_desc, extras):
+        """
+        Return the network resource for a network description - created
+        and added to the cache if not known yet. Shared networks are cached
+        for all users.
+
+        net_desc -- The network description (None for the public network).
+        extras -- The extras of the request.
+        """
+        if net_desc is None:
+            return self.pub_net
+
+        iden = infrastructure.NETWORK.location + net_desc['id']
+        user_id = None
+        if not net_desc['shared']:
+            user_id = extras['nova_ctx'].user_id
+        if (iden, user_id) in self.cache:
+            entity = self.cache[(iden, user_id)]
+        else:
+            entity = core_model.Resource(iden, infrastructure.NETWORK,
+                                         [infrastructure.IPNETWORK])
+            if user_id is not None:
+                entity.extras = self.get_extras(extras)
+            self.cache[(iden, user_id)] = entity
+
+        attributes = {'occi.core.id': net_desc['id'],
+                      'occi.network.vlan': net_desc['vlan'],
+                      'occi.network.label': net_desc['label'],
+                      'occi.network.state': 'active',
+                      'occi.networkinterface.address': net_desc['cidr'],
+                      'occi.networkinterface.gateway': net_desc['gateway'],
+                      'occi.networkinterface.allocation': 'static'}
+        # nova returns e.g. the vlan as int - pyssf renders strings only.
+        versions.set_attributes(entity, dict([(key, str(value)) for key, value
+                                              in attributes.items()
+                                              if value is not None]))
+        return entity
+
+    def _setup_rules(self, extras):
+        """
+        Make sure all security rules of the project are known and return
+        them. Rules which are gone in OS are removed from the cache.
+
+        extras -- The extras of the request.
+        """
+        context = extras['nova_ctx']
+        rules = dict([(str(item['id']), item) for item
+                      in security.retrieve_rules_by_project(context)])
+
+        result = []
+        for item in self.cache.values():
+            if item.kind != os_addon.SEC_RULE or item.extras is None or \
+                    item.extras['user_id'] != context.user_id:
+                continue
+            if item.attributes.get('occi.core.id') in rules:
+                rules.pop(item.attributes['occi.core.id'])
+                result.append(item)
+            else:
+                # deleted in OS.
+                self.cache.pop((item.identifier, context.user_id))
+
+        mixins = {}
+        for category in self.get_categories(extras):
+            if isinstance(category, core_model.Mixin) and \
+                    os_addon.SEC_GROUP in category.related:
+                mixins[category.term] = category
+        for rule in rules.values():
+            result.append(self._construct_sec_rule(rule, mixins, extras))
+        return result
+
+    def _construct_sec_rule(self, rule, mixins, extras):
+        """
+        Construct a security rule resource and add it to the cache.
+
+        rule -- The rule.
+        mixins -- The security group mixins by term.
+        extras -- The extras of the request.
+        """
+        context = extras['nova_ctx']
+        group = security.retrieve_group(rule['parent_group_id'], context)
+        mixin = mixins.get(group['name'], mixins.get(str(group['id'])))
+
+        entity = core_model.Resource(os_addon.SEC_RULE.location +
+                                     str(rule['id']), os_addon.SEC_RULE,
+                                     [mixin] if mixin else [])
+        attributes = {'occi.core.id': str(rule['id']),
+                      'occi.network.security.protocol': rule['protocol'],
+                      'occi.network.security.from': rule['from_port'],
+                      'occi.network.security.to': rule['to_port'],
+                      'occi.network.security.range': rule['cidr']}
+        entity.attributes.update(dict([(key, str(value)) for key, value
+                                       in attributes.items()
+                                       if value is not None]))
+        entity.extras = self.get_extras(extras)
+        self.cache[(entity.identifier, context.user_id)] = entity
+        return entity
+
     def _construct_network_link(self, net_desc, source, target, extras):
         """
         Construct a network link and add to cache!
@@ -410,15 +669,134 @@ class OCCIRegistry(occi_registry.NonePersistentRegistry):
                                infrastructure.NETWORKINTERFACE,
                                [infrastructure.IPNETWORKINTERFACE], source,
                                target)
-        link.attributes = {
+        self._set_network_link_attributes(link, net_desc)
+        link.extras = self.get_extras(extras)
+        source.links.append(link)
+        versions.touch(link)
+        self.cache[(link.identifier, extras['nova_ctx'].user_id)] = link
+        return link
+
+    def _set_network_link_attributes(self, link, net_desc):
+        """
+        Set the attributes of a network link from the network description.
+        """
+        versions.set_attributes(link, {
             'occi.networkinterface.interface': net_desc['interface'],
             'occi.networkinterface.mac': net_desc['mac'],
             'occi.networkinterface.state': net_desc['state'],
             'occi.networkinterface.address': net_desc['address'],
             'occi.networkinterface.gateway': net_desc['gateway'],
             'occi.networkinterface.allocation': net_desc['allocation']
-        }
+        })
+
+    def _construct_storage_link(self, source, target, extras):
+        """
+        Construct a storage link and add to cache!
+        """
+        link = core_model.Link(infrastructure.STORAGELINK.location +
+                               str(uuid.uuid4()),
+                               infrastructure.STORAGELINK, [], source,
+                               target)
         link.extras = self.get_extras(extras)
         source.links.append(link)
+        versions.touch(link)
         self.cache[(link.identifier, extras['nova_ctx'].user_id)] = link
         return link
+
+    def _remove_link(self, link, extras):
+        """
+        Remove a link from it's source and from the cache.
+        """
+        if link in link.source.links:
+            link.source.links.remove(link)
+            versions.touch(link.source)
+        self.cache.pop((link.identifier, extras['nova_ctx'].user_id), None)
+
+    def _get_resource_template(self, instance, extras):
+        """
+        Return the resource template mixin for an instance (or None).
+        """
+        flavor_id = vm.get_instance_flavor_id(instance)
+        if flavor_id is None:
+            return None
+        for category in self.get_categories(extras):
+            if isinstance(category, os_mixins.ResourceTemplate) and \
+                    str(category.res_id) == str(flavor_id):
+                return category
+        return None
+
+    def _get_os_template(self, instance, extras):
+        """
+        Return the os template mixin for an instance (or None).
+        """
+        os_id = instance['image_ref']
+        image_id = vm.retrieve_image(os_id, extras['nova_ctx'])['id']
+        return self.get_category('/' + image_id + '/', extras)
+
+    def _patch_template(self, entity, template_type, template):
+        """
+        Make sure the given template is the only mixin of that template
+        type on the entity.
+        """
+        for mixin in entity.mixins[:]:
+            if isinstance(mixin, template_type) and mixin != template:
+                entity.mixins.remove(mixin)
+                versions.touch(entity)
+        if template and template not in entity.mixins:
+            entity.mixins.append(template)
+            versions.touch(entity)
+
+
+class CachingRendering(occi_rendering.Rendering):
+    """
+    Wraps a rendering and keeps the representations of the entities it
+    rendered. A representation is reused as long as the version of the
+    entity is unchanged.
+    """
+
+    def __init__(self, rendering, registry):
+        super(CachingRendering, self).__init__(registry)
+        self.rendering = rendering
+        self.mime_type = rendering.mime_type
+
+    def __getattr__(self, name):
+        return getattr(self.rendering, name)
+
+    def to_entity(self, headers, body, def_kind, extras):
+        return self.rendering.to_entity(headers, body, def_kind, extras)
+
+    def from_entity(self, entity):
+        """
+        Return the (possibly cached) representation of an entity.
+
+        entity -- The entity.
+        """
+        key = (entity.identifier, self.mime_type)
+        version = (self.registry.get_hostname(),
+                   versions.get_version(entity))
+        cached = RENDERINGS.get(key)
+        if cached is None or cached[0] != version:
+            cached = (version, self.rendering.from_entity(entity))
+            RENDERINGS.set(key, cached, CONF.occi_render_cache_ttl)
+        headers, body = cached[1]
+        # the handlers add their own headers.
+        return copy.copy(headers), body
+
+    def to_entities(self, headers, body, extras):
+        return self.rendering.to_entities(headers, body, extras)
+
+    def from_entities(self, entities, key):
+        return self.rendering.from_entities(entities, key)
+
+    def from_categories(self, categories):
+        return self.rendering.from_categories(categories)
+
+    def to_action(self, headers, body, extras):
+        return self.rendering.to_action(headers, body, extras)
+
+    def to_mixins(self, headers, body, extras):
+        return self.rendering.to_mixins(headers, body, extras)
+
+    def get_filters(self, headers, body, extras):
+        return self.rendering.get_filters(headers, body, extras)
+
@@ -0,0 +1,82 @@
+# coding=utf-8
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#
+#    Copyright (c) 2012, Intel Performance Learning Solutions Ltd.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Versions of the entities. The registry and the backends touch an entity
+whenever they change it - representations are reused as long as the
+version is unchanged.
+"""
+
+import itertools
+
+# versions are never reused - a new entity never matches an old one.
+_VERSION = itertools.count(1)
+
+
+def get_version(entity):
+    """
+    Return the version of an entity.
+
+    entity -- The entity.
+    """
+    if getattr(entity, 'version', None) is None:
+        touch(entity)
+    return entity.version
+
+
+def touch(entity):
+    """
+    Give an entity a new version. A link also changes the representation
+    of it's source.
+
+    entity -- The entity which changed.
+    """
+    entity.version = next(_VERSION)
+    source = getattr(entity, 'source', None)
+    if source is not None:
+        touch(source)
+
+
+def set_attributes(entity, attributes):
+    """
+    Set the attributes of an entity - it's only touched if a value
+    changed.
+
+    entity -- The entity.
+    attributes -- The attributes to set.
+    """
+    changed = False
+    for key, value in attributes.items():
+        if key not in entity.attributes or entity.attributes[key] != value:
+            entity.attributes[key] = value
+            changed = True
+    if changed:
+        touch(entity)
+
+
+def set_actions(entity, actions):
+    """
+    Set the applicable actions of an entity - it's only touched if they
+    changed.
+
+    entity -- The entity.
+    actions -- The actions.
+    """
+    if entity.actions != actions:
+        entity.actions = actions
+        touch(entity)
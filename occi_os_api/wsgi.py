@@ -20,27 +20,36 @@
 OCCI WSGI app :-)
 """
 
-# W0613:unused args,R0903:too few pub methods
-# pylint: disable=W0613,R0903
+# W0613:unused args,R0903:too few pub methods,W0212:protected access (pyssf)
+# pylint: disable=W0613,R0903,W0212
+
+import hashlib
+import itertools
 
 from oslo.config import cfg
 
 from nova import wsgi
 from nova.openstack.common import log
 
+from occi_os_api import handlers
 from occi_os_api import registry
+from occi_os_api import versions
 from occi_os_api.backends import compute
 from occi_os_api.backends import openstack
 from occi_os_api.backends import network
 from occi_os_api.backends import storage
+from occi_os_api.backends import task
 from occi_os_api.extensions import os_mixins
 from occi_os_api.extensions import os_addon
+from occi_os_api.nova_glue import cache
 from occi_os_api.nova_glue import vm
 from occi_os_api.nova_glue import security
 
+from occi import VERSION
 from occi import backend
 from occi import core_model
 from occi import wsgi as occi_wsgi
+from occi.exceptions import HTTPError
 from occi.extensions import infrastructure
 
 from urllib import quote
@@ -54,7 +63,84 @@ OCCI_OPTS = [
                help="Port OCCI interface will listen on."),
     cfg.StrOpt("occi_custom_location_hostname",
                default=None,
-               help="Override OCCI location hostname with custom value")
+               help="Override OCCI location hostname with custom value"),
+    cfg.IntOpt("occi_resize_confirm_timeout",
+               default=600,
+               help="Seconds to wait for a resize to finish before giving up "
+                    "on confirming it."),
+    cfg.IntOpt("occi_snapshot_timeout",
+               default=3600,
+               help="Seconds to wait for a snapshot to finish."),
+    cfg.IntOpt("occi_volume_create_timeout",
+               default=300,
+               help="Seconds to wait for a volume to be created."),
+    cfg.IntOpt("occi_volume_cache_ttl",
+               default=10,
+               help="Seconds the volumes of a project are cached."),
+    cfg.IntOpt("occi_nw_info_cache_ttl",
+               default=60,
+               help="Seconds the network info of a VM is cached - changes "
+                    "done through this service are applied right away."),
+    cfg.IntOpt("occi_network_cache_ttl",
+               default=300,
+               help="Seconds the networks of a project are cached."),
+    cfg.IntOpt("occi_floating_ip_reservoir_low",
+               default=2,
+               help="Number of pre-allocated floating ips per project and "
+                    "pool below which the reservoir is topped up."),
+    cfg.IntOpt("occi_floating_ip_reservoir_high",
+               default=0,
+               help="Number of pre-allocated floating ips per project and "
+                    "pool the reservoir is topped up to - these count "
+                    "against the quota. 0 disables the reservoir. On "
+                    "first use it takes up the floating ips the project "
+                    "allocated but did not associate."),
+    cfg.IntOpt("occi_idempotency_keys",
+               default=10000,
+               help="Number of idempotency keys of create requests which "
+                    "are remembered."),
+    cfg.IntOpt("occi_idempotency_key_ttl",
+               default=86400,
+               help="Seconds an idempotency key of a create request is "
+                    "remembered."),
+    cfg.IntOpt("occi_poll_interval",
+               default=1,
+               help="Initial seconds between two checks if long running "
+                    "operations are finished."),
+    cfg.IntOpt("occi_poll_max_interval",
+               default=30,
+               help="Maximum seconds between two checks if long running "
+                    "operations are finished."),
+    cfg.IntOpt("occi_task_pool_size",
+               default=64,
+               help="Number of long running tasks which are run "
+                    "concurrently."),
+    cfg.IntOpt("occi_task_keep",
+               default=3600,
+               help="Seconds a finished task can still be retrieved."),
+    cfg.IntOpt("occi_bulk_pool_size",
+               default=16,
+               help="Number of nova calls a bulk request does concurrently."),
+    cfg.IntOpt("occi_render_cache_ttl",
+               default=300,
+               help="Seconds the rendered representation of an entity is "
+                    "kept - it is only used while the entity is "
+                    "unchanged."),
+    cfg.IntOpt("occi_console_cache_ttl",
+               default=300,
+               help="Seconds a VNC console URL is cached - never longer "
+                    "than the console token is valid."),
+    cfg.IntOpt("occi_flavor_cache_ttl",
+               default=60,
+               help="Seconds the list of flavors is cached."),
+    cfg.IntOpt("occi_security_group_cache_ttl",
+               default=30,
+               help="Seconds the security groups of a project are cached."),
+    cfg.IntOpt("occi_query_cache_ttl",
+               default=3600,
+               help="Seconds the rendered query interface of a user is "
+                    "kept - it is only used while the catalogs are "
+                    "unchanged.")
 ]
 
 CONF = cfg.CONF
@@ -62,6 +148,19 @@ CONF.register_opts(OCCI_OPTS)
 
 MIXIN_BACKEND = backend.MixinBackend()
 
+# status codes used by the backends which pyssf does not know.
+occi_wsgi.RETURN_CODES.setdefault(409, '409 Conflict')
+
+# paths of the query interface.
+QUERY_PATHS = ['/-/', '/.well-known/org/ogf/occi/-/']
+
+# (user id, project id, host, accept header) -> (etag, status, headers,
+# body) of the query interface.
+QUERIES = cache.TTLCache()
+
+# source of the versions of the user defined mixins.
+_MIXIN_VERSION = itertools.count(1)
+
 
 class OCCIApplication(occi_wsgi.Application, wsgi.Application):
     """
@@ -75,6 +174,10 @@ class OCCIApplication(occi_wsgi.Application, wsgi.Application):
         """
         super(OCCIApplication, self).__init__(registry=registry.OCCIRegistry())
         self._register_backends()
+        # version of the flavors the resource templates are registered for.
+        self._flavor_version = None
+        # user id -> version of the user's mixins.
+        self._mixin_versions = cache.TTLCache()
 
     def _register_backends(self):
         """
@@ -133,6 +236,7 @@ class OCCIApplication(occi_wsgi.Application, wsgi.Application):
                               openstack.OsComputeBackend())
         self.register_backend(os_addon.OS_NET_LINK,
                               openstack.OsNetLinkBackend())
+        self.register_backend(os_addon.TASK, task.TaskBackend())
 
     def __call__(self, environ, response):
         """
@@ -149,19 +253,198 @@ class OCCIApplication(occi_wsgi.Application, wsgi.Application):
         extras = {'nova_ctx': environ['nova.context']}
 
         # register/refresh openstack images
-        self._refresh_os_mixins(extras)
+        images = self._refresh_os_mixins(extras)
         # register/refresh openstack instance types (flavours)
-        self._refresh_resource_mixins(extras)
+        flavors = self._refresh_resource_mixins(extras)
         # register/refresh the openstack security groups as Mixins
-        self._refresh_security_mixins(extras)
+        groups = self._refresh_security_mixins(extras)
+
+        user_id = extras['nova_ctx'].user_id
+        # user defined mixins are added or removed.
+        mixins_changed = environ['PATH_INFO'] in QUERY_PATHS and \
+            environ['REQUEST_METHOD'] in ['POST', 'PUT', 'DELETE']
+        if environ['PATH_INFO'] in QUERY_PATHS and \
+                environ['REQUEST_METHOD'] == 'GET' and \
+                'HTTP_CATEGORY' not in environ and \
+                not int(environ.get('CONTENT_LENGTH') or 0):
+            catalog = (images, flavors, groups,
+                       self._get_mixin_version(user_id))
+            return self._call_query(environ, response, catalog,
+                                    nova_ctx=extras['nova_ctx'],
+                                    registry=self.registry)
+
+        handler = self._get_bulk_handler(environ)
+        if handler is not None:
+            return self._call_handler(handler, environ, response,
+                                      nova_ctx=extras['nova_ctx'],
+                                      registry=self.registry)
+
+        # backends add the tasks they started for long running operations
+        # and additional resources they created.
+        tasks = []
+        created = []
+        result = {}
+
+        def occi_response(status, headers):
+            """
+            Answer with 202 Accepted & the location of the task if the
+            request started a long running task. Add the locations of all
+            resources if more than one got created.
+            """
+            result['status'] = status
+            if len(tasks) > 0 and status.startswith('200'):
+                status = '202 Accepted'
+                headers.append(('Location', self.registry.get_hostname() +
+                                tasks[0].identifier))
+            if len(created) > 0 and status.startswith('201'):
+                locations = [value for key, value in headers
+                             if key == 'Location']
+                locations.extend([self.registry.get_hostname() +
+                                  item.identifier for item in created])
+                headers.append(('X-OCCI-Location', ', '.join(locations)))
+            return response(status, headers)
+
+        # lets clients retry creates without creating things twice.
+        idempotency_key = environ.get('HTTP_IDEMPOTENCY_KEY')
+
+        body = self._call_occi(environ, occi_response,
+                               nova_ctx=extras['nova_ctx'],
+                               registry=self.registry, tasks=tasks,
+                               created=created,
+                               idempotency_key=idempotency_key)
+        if mixins_changed and result.get('status', '').startswith('2'):
+            self._get_mixin_version(user_id, changed=True)
+        if environ['REQUEST_METHOD'] in ['POST', 'PUT', 'DELETE'] and \
+                environ['PATH_INFO'].endswith('/') and \
+                result.get('status', '').startswith('2'):
+            # pyssf adds and removes the mixins of collections itself.
+            for key, entity in self.registry.cache.items():
+                if key[1] == user_id:
+                    versions.touch(entity)
+        return body
+
+    def _get_mixin_version(self, user_id, changed=False):
+        """
+        Return the version of the user defined mixins of a user - a new one
+        if they changed. Versions are never reused so a version which
+        expired does not match an ETag handed out earlier.
 
-        return self._call_occi(environ, response, nova_ctx=extras['nova_ctx'],
-                               registry=self.registry)
+        user_id -- The id of the user.
+        changed -- Whether the mixins of the user changed.
+        """
+        version = self._mixin_versions.get(user_id)
+        if version is None or changed:
+            version = next(_MIXIN_VERSION)
+            self._mixin_versions.set(user_id, version,
+                                     CONF.occi_query_cache_ttl)
+        return version
+
+    def _get_bulk_handler(self, environ):
+        """
+        Return the handler for bulk requests which are not left to pyssf
+        (or None).
+        """
+        method = environ['REQUEST_METHOD']
+        path = environ['PATH_INFO']
+        query = environ.get('QUERY_STRING') or ''
+        if method == 'POST' and path == infrastructure.COMPUTE.location \
+                and query.startswith('action='):
+            return handlers.ComputeActionHandler
+        if method in ['POST', 'DELETE'] and \
+                path == infrastructure.STORAGE.location and query == 'bulk':
+            return handlers.StorageBulkHandler
+        if method in ['POST', 'DELETE'] and \
+                path == infrastructure.STORAGELINK.location and \
+                query == 'bulk':
+            return handlers.StorageLinkBulkHandler
+        if method == 'POST' and \
+                path == infrastructure.NETWORKINTERFACE.location and \
+                query == 'bulk':
+            return handlers.NetworkLinkBulkHandler
+        if method == 'POST' and path == os_addon.SEC_RULE.location and \
+                query == 'bulk':
+            return handlers.SecurityRuleBulkHandler
+        return None
+
+    def _call_handler(self, handler_class, environ, response, **kwargs):
+        """
+        Let one of our own handlers deal with the request. Works like
+        _call_occi of pyssf.
+
+        handler_class -- The handler to use.
+        environ -- The WSGI environ.
+        response -- The WSGI response.
+        kwargs -- Forwarded to the handler as extras.
+        """
+        heads, body, query = _parse_request(environ, self.registry)
+        handler = handler_class(self.registry, heads, body, query,
+                                kwargs.copy())
+        try:
+            status, headers, body = handler.handle(environ['REQUEST_METHOD'],
+                                                   environ['PATH_INFO'])
+        except HTTPError as err:
+            status = err.code
+            headers = {'Content-Type': 'text/plain'}
+            body = err.message
+            LOG.error(body)
+
+        headers['Server'] = VERSION
+        headers['Content-length'] = str(len(body))
+        response(occi_wsgi.RETURN_CODES[status],
+                 [(str(k), str(v)) for k, v in headers.items()])
+        return [str(body), ]
+
+    def _call_query(self, environ, response, catalog, **kwargs):
+        """
+        Answer a GET on the query interface - from the representation kept
+        for the user as long as the catalogs did not change. The ETag is
+        derived from the catalogs so conditional requests are answered
+        without rendering.
+
+        environ -- The WSGI environ.
+        response -- The WSGI response.
+        catalog -- Fingerprint of the images, flavors, security groups and
+                   user defined mixins.
+        kwargs -- Forwarded to pyssf as extras.
+        """
+        context = kwargs['nova_ctx']
+        key = (context.user_id, context.project_id,
+               environ.get('HTTP_HOST'), environ.get('HTTP_ACCEPT'))
+        etag = '"%s"' % hashlib.md5(repr((key, catalog))).hexdigest()
+
+        match = [item.strip() for item in
+                 environ.get('HTTP_IF_NONE_MATCH', '').split(',')]
+        if etag in match or '*' in match:
+            response('304 Not Modified', [('ETag', etag),
+                                          ('Server', VERSION)])
+            return []
+
+        cached = QUERIES.get(key)
+        if cached is None or cached[0] != etag:
+            result = {}
+
+            def query_response(status, headers):
+                """
+                Keep the status and headers of the rendered query interface.
+                """
+                result['status'] = status
+                result['headers'] = headers
+
+            body = ''.join(self._call_occi(environ, query_response,
+                                           **kwargs))
+            cached = (etag, result['status'], result['headers'], body)
+            if result['status'].startswith('200'):
+                QUERIES.set(key, cached, CONF.occi_query_cache_ttl)
+
+        response(cached[1], list(cached[2]) + [('ETag', etag)])
+        return [cached[3], ]
 
     def _refresh_os_mixins(self, extras):
         """
         Register images as OsTemplate mixins from
         information retrieved from glance (shared and user-specific).
+
+        Returns a fingerprint of the images.
         """
         template_schema = 'http://schemas.openstack.org/template/os#'
         images = vm.retrieve_images(extras['nova_ctx'])
@@ -201,11 +484,20 @@ class OCCIApplication(occi_wsgi.Application, wsgi.Application):
                 LOG.debug(msg)
                 self.register_backend(os_template, MIXIN_BACKEND)
 
+        return tuple(sorted([(item['id'], item['name'],
+                              item['container_format'], item['disk_format'])
+                             for item in images]))
+
     def _refresh_resource_mixins(self, extras):
         """
         Register the flavors as ResourceTemplates to which the user has access.
+
+        Returns the version of the flavors.
         """
         template_schema = 'http://schemas.openstack.org/template/resource#'
+        version = vm.get_flavor_version()
+        if version == self._flavor_version:
+            return version
         os_flavours = vm.retrieve_flavors()
 
         # delete those which are delete through different API.
@@ -233,10 +525,14 @@ class OCCIApplication(occi_wsgi.Application, wsgi.Application):
                       str(resource_template)
                 LOG.debug(msg)
                 self.register_backend(resource_template, MIXIN_BACKEND)
+        self._flavor_version = version
+        return version
 
     def _refresh_security_mixins(self, extras):
         """
         Registers security groups as security mixins
+
+        Returns a fingerprint of the security groups.
         """
         # ensures that preexisting openstack security groups are
         # added and only once.
@@ -266,6 +562,25 @@ class OCCIApplication(occi_wsgi.Application, wsgi.Application):
                 except AttributeError:
                     self.register_backend(sec_mix, MIXIN_BACKEND)
 
+        return tuple(sorted([(str(group['id']), group['name'])
+                             for group in groups]))
+
+
+def _parse_request(environ, occi_registry):
+    """
+    Return the headers, body and query of a request the way pyssf parses
+    them for it's handlers - and set the hostname of the service. All use
+    of the private helpers of pyssf is kept here.
+
+    environ -- The WSGI environ.
+    occi_registry -- The OCCI registry.
+    """
+    heads = occi_wsgi._parse_headers(environ)
+    body = occi_wsgi._parse_body(environ)
+    query = occi_wsgi._parse_query(environ)
+    occi_wsgi._set_hostname(environ, occi_registry)
+    return heads, body, query
+
 
 def occify_terms(term_name):
     '''
@@ -27,12 +27,20 @@ import unittest
 from nova.compute import vm_states
 
 from occi import core_model
+from occi import exceptions
 from occi.extensions import infrastructure
 
+# registers the configuration options.
+from occi_os_api import wsgi
 from occi_os_api import nova_glue
+from occi_os_api import registry
 from occi_os_api.backends import compute
+from occi_os_api.backends import openstack
+from occi_os_api.extensions import os_addon
 from occi_os_api.extensions import os_mixins
 
+import fakes
+
 
 class TestComputeBackend(unittest.TestCase):
     """
@@ -138,12 +146,12 @@ class TestComputeBackend(unittest.TestCase):
 
         self.mox.StubOutWithMock(nova_glue.vm, 'create_vm')
         nova_glue.vm.create_vm(mox.IsA(object), mox.IsA(object)).AndReturn(
-            {
+            [{
                 'uuid': 'foo',
                 'hostname': 'Server foo',
                 'vcpus': 1,
                 'memory_mb': 256
-            })
+            }])
 #        self.mox.StubOutWithMock(nova_glue.storage, 'get_image_architecture')
 #        nova_glue.storage.get_image_architecture(mox.IsA(object),
 #                                                 mox.IsA(object)).\
@@ -168,6 +176,74 @@ class TestComputeBackend(unittest.TestCase):
 
         self.mox.VerifyAll()
 
+    def test_create_multiple_for_sanity(self):
+        """
+        Simulate a create call for multiple VMs!
+        """
+        res = core_model.Resource('/foo/bar', infrastructure.COMPUTE,
+                                  [self.os_template])
+        res.attributes = {'org.openstack.compute.count': '2'}
+        reg = registry.OCCIRegistry()
+        extras = {'nova_ctx': fakes.Context(), 'registry': reg, 'created': []}
+
+        self.mox.StubOutWithMock(nova_glue.vm, 'create_vm')
+        nova_glue.vm.create_vm(mox.IsA(object), mox.IsA(object)).AndReturn(
+            [{'uuid': 'foo', 'hostname': 'foo', 'vcpus': 1,
+              'memory_mb': 256},
+             {'uuid': 'bar', 'hostname': 'bar', 'vcpus': 1,
+              'memory_mb': 256}])
+        self.mox.ReplayAll()
+
+        self.backend.create(res, extras)
+
+        self.assertEqual('/compute/foo', res.identifier)
+        self.assertEqual(1, len(extras['created']))
+        other = extras['created'][0]
+        self.assertEqual('/compute/bar', other.identifier)
+        self.assertEqual('bar', other.attributes['occi.core.id'])
+        self.assertEqual('bar', other.attributes['occi.compute.hostname'])
+        self.assertNotIn('org.openstack.compute.count', other.attributes)
+        self.assertListEqual(res.mixins, other.mixins)
+        self.assertIn(('/compute/bar', 'foo'), reg.cache)
+
+        self.mox.VerifyAll()
+
+    def test_create_idempotent_for_sanity(self):
+        """
+        A retried create returns the VM of the original request.
+        """
+        reg = registry.OCCIRegistry()
+        extras = {'nova_ctx': fakes.Context(), 'registry': reg, 'created': [],
+                  'idempotency_key': 'abc'}
+
+        self.mox.StubOutWithMock(nova_glue.vm, 'create_vm')
+        nova_glue.vm.create_vm(mox.IsA(object), mox.IsA(object)).AndReturn(
+            [{'uuid': 'foo', 'hostname': 'foo', 'vcpus': 1,
+              'memory_mb': 256}])
+        self.mox.ReplayAll()
+
+        res = core_model.Resource('/foo/bar', infrastructure.COMPUTE,
+                                  [self.os_template])
+        self.backend.create(res, extras)
+        reg.add_resource(res.identifier, res, extras)
+
+        retry = core_model.Resource('/foo/baz', infrastructure.COMPUTE,
+                                    [self.os_template])
+        self.backend.create(retry, extras)
+
+        self.assertEqual('/compute/foo', retry.identifier)
+        reg.add_resource(retry.identifier, retry, extras)
+        self.assertIs(res, reg.cache[('/compute/foo', 'foo')])
+
+        # the VM of the original request is gone.
+        reg.cache.pop(('/compute/foo', 'foo'))
+        retry = core_model.Resource('/foo/baz', infrastructure.COMPUTE,
+                                    [self.os_template])
+        self.assertRaises(exceptions.HTTPError, self.backend.create, retry,
+                          extras)
+
+        self.mox.VerifyAll()
+
     def test_retrieve_for_sanity(self):
         """
         Simulate a retrieve call!
@@ -176,15 +252,11 @@ class TestComputeBackend(unittest.TestCase):
                                   [self.os_template])
         res.attributes = {'occi.core.id': 'bar'}
 
-        self.mox.StubOutWithMock(nova_glue.vm, 'get_vm_state')
-        nova_glue.vm.get_vm_state(mox.IsA(object),
-                                  mox.IsA(object)).\
-            AndReturn(('active', [infrastructure.STOP,
-                                  infrastructure.SUSPEND,
-                                  infrastructure.RESTART]))
+        # VM is only retrieved once.
         self.mox.StubOutWithMock(nova_glue.vm, 'get_vm')
         nova_glue.vm.get_vm(mox.IsA(object), mox.IsA(object)).AndReturn(
             {
+                'vm_state': vm_states.ACTIVE,
                 'hostname': 'bar',
                 'vcpus': 1,
                 'memory_mb': 256
@@ -214,6 +286,42 @@ class TestComputeBackend(unittest.TestCase):
 
         self.mox.VerifyAll()
 
+    def test_retrieve_pipeline_for_sanity(self):
+        """
+        Kind and mixin backend share one snapshot - in any order.
+        """
+        res = core_model.Resource('/foo/bar', infrastructure.COMPUTE,
+                                  [self.os_template, os_addon.OS_VM])
+        res.attributes = {'occi.core.id': 'bar'}
+
+        self.mox.StubOutWithMock(nova_glue.vm, 'get_vm')
+        nova_glue.vm.get_vm(mox.IsA(object), mox.IsA(object)).AndReturn(
+            {
+                'vm_state': vm_states.ACTIVE,
+                'task_state': None,
+                'hostname': 'bar',
+                'vcpus': 1,
+                'memory_mb': 256
+            })
+        self.mox.StubOutWithMock(nova_glue.vm, 'get_vnc')
+        nova_glue.vm.get_vnc(mox.IsA(object), mox.IsA(object),
+                             mox.IsA(dict)).AndReturn({'url': 'http://vnc'})
+        self.mox.ReplayAll()
+
+        openstack.OsComputeBackend().retrieve(res, self.sec_obj)
+        self.backend.retrieve(res, self.sec_obj)
+
+        self.assertEqual('http://vnc',
+                         res.attributes['org.openstack.compute.console.vnc'])
+        self.assertEqual(vm_states.ACTIVE,
+                         res.attributes['org.openstack.compute.state'])
+        self.assertListEqual([infrastructure.STOP, infrastructure.SUSPEND,
+                              infrastructure.RESTART,
+                              os_addon.OS_CREATE_IMAGE, os_addon.OS_CHG_PWD],
+                             res.actions)
+
+        self.mox.VerifyAll()
+
     def test_update_for_sanity(self):
         """
         Simulate a update call!
@@ -242,7 +350,7 @@ class TestComputeBackend(unittest.TestCase):
 
         self.mox.StubOutWithMock(nova_glue.vm, 'resize_vm')
         nova_glue.vm.resize_vm(mox.IsA(object), mox.IsA(object),
-                               mox.IsA(object))
+                               mox.IsA(object), False)
         self.mox.ReplayAll()
         self.backend.update(res1, res2, self.sec_obj)
 
@@ -280,7 +388,8 @@ class TestComputeBackend(unittest.TestCase):
 
         # start
         self.mox.StubOutWithMock(nova_glue.vm, 'start_vm')
-        nova_glue.vm.start_vm(mox.IsA(object), mox.IsA(object))
+        nova_glue.vm.start_vm(mox.IsA(object), mox.IsA(object),
+                              instance=mox.IsA(dict))
         self.mox.StubOutWithMock(nova_glue.vm, 'get_vm')
         nova_glue.vm.get_vm(mox.IsA(object), mox.IsA(object)).AndReturn(
             {
@@ -293,7 +402,8 @@ class TestComputeBackend(unittest.TestCase):
         # stop
         self.mox.UnsetStubs()
         self.mox.StubOutWithMock(nova_glue.vm, 'stop_vm')
-        nova_glue.vm.stop_vm(mox.IsA(object), mox.IsA(object))
+        nova_glue.vm.stop_vm(mox.IsA(object), mox.IsA(object),
+                             instance=mox.IsA(dict))
         self.mox.StubOutWithMock(nova_glue.vm, 'get_vm')
         nova_glue.vm.get_vm(mox.IsA(object), mox.IsA(object)).AndReturn(
             {
@@ -307,7 +417,7 @@ class TestComputeBackend(unittest.TestCase):
         self.mox.UnsetStubs()
         self.mox.StubOutWithMock(nova_glue.vm, 'restart_vm')
         nova_glue.vm.restart_vm(mox.IsA(object), mox.IsA(str),
-                                mox.IsA(object))
+                                mox.IsA(object), instance=mox.IsA(dict))
         self.mox.StubOutWithMock(nova_glue.vm, 'get_vm')
         nova_glue.vm.get_vm(mox.IsA(object), mox.IsA(object)).AndReturn(
             {
@@ -321,7 +431,8 @@ class TestComputeBackend(unittest.TestCase):
         # suspend
         self.mox.UnsetStubs()
         self.mox.StubOutWithMock(nova_glue.vm, 'suspend_vm')
-        nova_glue.vm.suspend_vm(mox.IsA(object), mox.IsA(object))
+        nova_glue.vm.suspend_vm(mox.IsA(object), mox.IsA(object),
+                                instance=mox.IsA(dict))
         self.mox.StubOutWithMock(nova_glue.vm, 'get_vm')
         nova_glue.vm.get_vm(mox.IsA(object), mox.IsA(object)).AndReturn(
             {
@@ -50,6 +50,18 @@ class TestNetworkInterfaceBackend(unittest.TestCase):
         """
         self.mox.UnsetStubs()
 
+    def _net_desc(self, address, network):
+        """
+        Return a network description as given by the net glue.
+        """
+        return {'interface': 'eth0',
+                'mac': 'aa:bb:cc:dd:ee:00',
+                'state': 'active',
+                'address': address,
+                'gateway': '192.168.0.1',
+                'allocation': 'static',
+                'network': network}
+
     # Test for failure
 
     def test_create_for_failure(self):
@@ -106,6 +118,11 @@ class TestNetworkInterfaceBackend(unittest.TestCase):
         self.mox.StubOutWithMock(nova_glue.net, 'add_floating_ip')
         nova_glue.net.add_floating_ip(mox.IsA(str), mox.IsA(str),
                                       mox.IsA(object)).AndReturn('10.0.0.1')
+        self.mox.StubOutWithMock(nova_glue.net, 'get_network_details')
+        nova_glue.net.get_network_details(mox.IsA(str),
+                                          mox.IsA(object)).AndReturn(
+            [self._net_desc('192.168.0.2', {'id': '1'}),
+             self._net_desc('10.0.0.1', None)])
 
         self.mox.ReplayAll()
         self.backend.create(link, self.sec_obj)
@@ -117,6 +134,8 @@ class TestNetworkInterfaceBackend(unittest.TestCase):
         self.assertIn('occi.networkinterface.address', link.attributes)
         self.assertIn('occi.networkinterface.gateway', link.attributes)
         self.assertIn('occi.networkinterface.allocation', link.attributes)
+        self.assertEqual('aa:bb:cc:dd:ee:00',
+                         link.attributes['occi.networkinterface.mac'])
 
         # self.assertIn(infrastructure.IPNETWORKINTERFACE, link.mixins)
         # self.assertIn(infrastructure.NETWORKINTERFACE, link.mixins)
@@ -129,6 +148,10 @@ class TestNetworkInterfaceBackend(unittest.TestCase):
 
         nova_glue.net.add_floating_ip(mox.IsA(str), mox.IsA(None),
                                       mox.IsA(object)).AndReturn('10.0.0.2')
+        self.mox.StubOutWithMock(nova_glue.net, 'get_network_details')
+        nova_glue.net.get_network_details(mox.IsA(str),
+                                          mox.IsA(object)).AndReturn(
+            [self._net_desc('10.0.0.2', None)])
 
         self.mox.ReplayAll()
         self.backend.create(link, self.sec_obj)
@@ -70,11 +70,7 @@ class TestStorageBackend(unittest.TestCase):
         nova_glue.storage.create_storage(mox.IsA(object),
                                          mox.IsA(object),
                                          mox.IsA(object)).\
-            AndReturn({'id': '1'})
-        self.mox.StubOutWithMock(nova_glue.storage, 'get_storage')
-        nova_glue.storage.get_storage(mox.IsA(object),
-                                      mox.IsA(object)).\
-            AndReturn({'status': 'error'})
+            AndReturn({'id': '1', 'status': 'error'})
 
         self.mox.ReplayAll()
 
@@ -107,21 +103,19 @@ class TestStorageBackend(unittest.TestCase):
         nova_glue.storage.create_storage(mox.IsA(object),
                                          mox.IsA(object),
                                          mox.IsA(object)).\
-            AndReturn({'id': '1'})
-        self.mox.StubOutWithMock(nova_glue.storage, 'get_storage')
-        nova_glue.storage.get_storage(mox.IsA(object),
-                                      mox.IsA(object)).\
-            AndReturn({'status': 'available'})
+            AndReturn({'id': '1', 'status': 'creating'})
+        self.mox.StubOutWithMock(nova_glue.storage, 'wait_for_storage')
+        nova_glue.storage.wait_for_storage('1', mox.IsA(object),
+                                           mox.IsA(object))
 
         self.mox.ReplayAll()
 
         self.backend.create(res, self.sec_obj)
 
-        # verify all attrs.
-        self.assertEqual(res.attributes['occi.storage.state'], 'active')
-        self.assertListEqual([infrastructure.OFFLINE, infrastructure.BACKUP,
-                              infrastructure.SNAPSHOT, infrastructure.RESIZE],
-                             res.actions)
+        # verify all attrs - volume is created in the background.
+        self.assertEqual(res.identifier, '/storage/1')
+        self.assertEqual(res.attributes['occi.storage.state'], 'creating')
+        self.assertListEqual([], res.actions)
 
         self.mox.VerifyAll()
 
@@ -168,6 +162,25 @@ class TestStorageBackend(unittest.TestCase):
         self.assertTrue(len(res.actions) == 1)
         self.mox.VerifyAll()
 
+    def test_retrieve_from_listing_for_sanity(self):
+        """
+        Test if the volumes listed by the registry are used.
+        """
+        res = mox.MockObject(core_model.Resource)
+        res.attributes = {'occi.core.id': '1'}
+
+        self.mox.StubOutWithMock(nova_glue.storage, 'get_storage')
+        self.mox.ReplayAll()
+
+        storage.set_volumes([{'id': '1', 'status': 'available',
+                              'size': '1', 'display_name': 'foobar'}],
+                            self.sec_obj)
+        self.backend.retrieve(res, self.sec_obj)
+
+        self.assertEqual(res.attributes['occi.storage.state'], 'online')
+
+        self.mox.VerifyAll()
+
     def test_update_for_sanity(self):
         """
         Test updating.
@@ -220,7 +233,7 @@ class TestStorageBackend(unittest.TestCase):
         nova_glue.storage.snapshot_storage_instance(mox.IsA(object),
                                                     mox.IsA(object),
                                                     mox.IsA(object),
-                                                    mox.IsA(object))
+                                                    mox.IsA(object), True)
         self.mox.ReplayAll()
         self.backend.action(res, infrastructure.SNAPSHOT, {}, self.sec_obj)
         self.mox.VerifyAll()
@@ -268,6 +281,8 @@ class TestStorageLinkBackend(unittest.TestCase):
         nova_glue.vm.attach_volume(mox.IsA(object), mox.IsA(object),
                                    mox.IsA(object), mox.IsA(object)).\
             AndReturn({})
+        self.mox.StubOutWithMock(nova_glue.storage, 'refresh_storage')
+        nova_glue.storage.refresh_storage('bar', mox.IsA(object))
 
         self.mox.ReplayAll()
 
@@ -300,6 +315,8 @@ class TestStorageLinkBackend(unittest.TestCase):
         self.mox.StubOutWithMock(nova_glue.vm, 'detach_volume')
         nova_glue.vm.detach_volume(mox.IsA(object), mox.IsA(object),
                                    mox.IsA(object))
+        self.mox.StubOutWithMock(nova_glue.storage, 'refresh_storage')
+        nova_glue.storage.refresh_storage('bar', mox.IsA(object))
 
         self.mox.ReplayAll()
 
@@ -0,0 +1,144 @@
+# coding=utf-8
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""
+Unittest for the task backend.
+"""
+
+#pylint: disable=W0102,C0103,R0904,R0903,W0612
+
+import eventlet
+import unittest
+
+from oslo.config import cfg
+
+from occi import core_model
+from occi.extensions import infrastructure
+
+# registers the configuration options.
+from occi_os_api import wsgi
+from occi_os_api import registry
+from occi_os_api.backends import task
+
+import fakes
+
+CONF = cfg.CONF
+
+
+def failing_operation():
+    """
+    Operation which fails.
+    """
+    raise AttributeError('Something went wrong.')
+
+
+class TestTaskBackend(unittest.TestCase):
+    """
+    Tests the task backend.
+    """
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        self.backend = task.TaskBackend()
+        self.registry = registry.OCCIRegistry()
+        self.extras = {'nova_ctx': fakes.Context(), 'registry': self.registry,
+                       'tasks': []}
+        self.target = core_model.Resource('/compute/bar',
+                                          infrastructure.COMPUTE, [])
+        self.calls = []
+
+    def operation(self, *args):
+        """
+        Operation which records it's calls.
+        """
+        self.calls.append(args)
+
+    # Test for failure
+
+    def test_submit_for_failure(self):
+        """
+        Test if errors are reported through the task.
+        """
+        tsk = task.submit(self.target, 'foo', self.extras, failing_operation)
+        eventlet.sleep(0)
+
+        self.assertEqual(task.FAILED,
+                         tsk.attributes['org.openstack.task.state'])
+        self.assertEqual('Something went wrong.',
+                         tsk.attributes['org.openstack.task.error'])
+
+    def test_delete_for_failure(self):
+        """
+        Running tasks cannot be removed.
+        """
+        tsk = task.submit(self.target, 'foo', self.extras, self.operation)
+
+        self.assertRaises(AttributeError, self.backend.delete, tsk,
+                          self.extras)
+        self.assertRaises(AttributeError, self.backend.create, tsk,
+                          self.extras)
+
+    def test_retrieve_for_failure(self):
+        """
+        Tasks which are done for a while are gone - also when they are only
+        retrieved.
+        """
+        CONF.set_override('occi_task_keep', -1)
+        try:
+            tsk = task.submit(self.target, 'foo', self.extras, self.operation)
+            eventlet.sleep(0)
+
+            self.assertRaises(KeyError, self.registry.get_resource,
+                              tsk.identifier, self.extras)
+        finally:
+            CONF.clear_override('occi_task_keep')
+
+    # Test for sanity
+
+    def test_submit_for_sanity(self):
+        """
+        Test if operations are run in the background.
+        """
+        tsk = task.submit(self.target, 'foo', self.extras, self.operation,
+                          'bar')
+
+        self.assertListEqual([tsk], self.extras['tasks'])
+        self.assertEqual(tsk, self.registry.get_resource(tsk.identifier,
+                                                         self.extras))
+        self.assertEqual('/compute/bar',
+                         tsk.attributes['org.openstack.task.target'])
+        self.assertEqual(task.QUEUED,
+                         tsk.attributes['org.openstack.task.state'])
+        self.assertListEqual([], self.calls)
+
+        eventlet.sleep(0)
+
+        self.assertListEqual([('bar', )], self.calls)
+        self.assertEqual(task.DONE, tsk.attributes['org.openstack.task.state'])
+
+        self.backend.delete(tsk, self.extras)
+
+    def test_submit_without_registry_for_sanity(self):
+        """
+        Without a registry operations are run right away.
+        """
+        tsk = task.submit(self.target, 'foo', {'nova_ctx': None},
+                          self.operation, 'bar')
+
+        self.assertIsNone(tsk)
+        self.assertFalse(task.is_tracked({'nova_ctx': None}))
+        self.assertListEqual([('bar', )], self.calls)
@@ -0,0 +1,614 @@
+# coding=utf-8
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""
+Unittest for the bulk request handlers.
+"""
+
+#pylint: disable=W0102,C0103,R0904,R0903,W0612
+
+import mox
+import unittest
+
+from nova.compute import vm_states
+
+from occi import backend
+from occi import core_model
+from occi import exceptions
+from occi.extensions import infrastructure
+from occi.protocol import occi_rendering
+
+# registers the configuration options.
+from occi_os_api import wsgi
+from occi_os_api import handlers
+from occi_os_api import nova_glue
+from occi_os_api import registry
+from occi_os_api.backends import compute
+from occi_os_api.backends import network
+from occi_os_api.backends import openstack
+from occi_os_api.backends import storage
+from occi_os_api.extensions import os_addon
+
+import fakes
+
+STOP = 'stop; scheme="http://schemas.ogf.org/occi/infrastructure/compute/' \
+       'action#"; class="action"'
+CHG_PWD = 'chg_pwd; scheme="http://schemas.openstack.org/instance/action#"; ' \
+          'class="action"'
+STORAGE = 'storage; scheme="http://schemas.ogf.org/occi/infrastructure#"; ' \
+          'class="kind"'
+
+
+class TestComputeActionHandler(unittest.TestCase):
+    """
+    Tests the bulk action handler for compute resources.
+    """
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        self.registry = registry.OCCIRegistry()
+        self.registry.set_renderer('text/occi',
+                                   occi_rendering.TextOcciRendering(
+                                       self.registry))
+        backend = compute.ComputeBackend()
+        for category in [infrastructure.COMPUTE, infrastructure.START,
+                         infrastructure.STOP, infrastructure.RESTART,
+                         infrastructure.SUSPEND]:
+            self.registry.set_backend(category, backend, None)
+        self.registry.set_backend(os_addon.OS_CHG_PWD,
+                                  openstack.OsComputeBackend(), None)
+        self.extras = {'nova_ctx': fakes.Context(), 'registry': self.registry}
+        self.mox = mox.Mox()
+
+    def tearDown(self):
+        """
+        Cleanup mocks.
+        """
+        self.mox.UnsetStubs()
+
+    def _get_handler(self, headers):
+        """
+        Return a handler for the given headers.
+        """
+        headers['Content-Type'] = 'text/occi'
+        headers['Accept'] = 'text/occi'
+        return handlers.ComputeActionHandler(self.registry, headers, '',
+                                             ('action', 'stop'), self.extras)
+
+    # Test for failure
+
+    def test_post_for_failure(self):
+        """
+        Only compute resources can be addressed.
+        """
+        handler = self._get_handler({'Category': STOP,
+                                     'X-OCCI-Location': '/storage/1'})
+
+        self.assertRaises(exceptions.HTTPError, handler.post, '/compute/')
+
+    # Test for sanity
+
+    def test_post_for_sanity(self):
+        """
+        Test if the VMs are looked up once and outcomes are reported.
+        """
+        self.mox.StubOutWithMock(nova_glue.vm, 'get_vms')
+        nova_glue.vm.get_vms(mox.IsA(object)).AndReturn(
+            [{'uuid': 'a', 'vm_state': vm_states.ACTIVE},
+             {'uuid': 'b', 'vm_state': vm_states.STOPPED}])
+        self.mox.StubOutWithMock(nova_glue.vm, 'stop_vm')
+        nova_glue.vm.stop_vm('a', mox.IsA(object), instance=mox.IsA(dict))
+        self.mox.ReplayAll()
+
+        handler = self._get_handler({'Category': STOP,
+                                     'X-OCCI-Location': '/compute/a, '
+                                                        '/compute/b, '
+                                                        '/compute/c'})
+        status, _, body = handler.post('/compute/')
+
+        self.assertEqual(200, status)
+        lines = body.split('\n')
+        self.assertIn('/compute/a: OK', lines)
+        self.assertIn('/compute/b: This action is currently not applicable.',
+                      lines)
+        self.assertIn('/compute/c: Resource not found.', lines)
+
+        self.mox.VerifyAll()
+
+    def test_post_with_mixin_for_sanity(self):
+        """
+        Test if VMs are filtered by mixin - VMs not yet in the registry are
+        fetched through it.
+        """
+        group = core_model.Mixin('http://example.com/security#', 'web', [],
+                                 location='/web/')
+        self.registry.set_backend(group, backend.MixinBackend(), None)
+        entity = core_model.Resource('/compute/b', infrastructure.COMPUTE,
+                                     [])
+        self.registry.cache[('/compute/b', 'foo')] = entity
+
+        self.mox.StubOutWithMock(nova_glue.vm, 'get_vms')
+        nova_glue.vm.get_vms(mox.IsA(object)).AndReturn(
+            [{'uuid': 'a', 'vm_state': vm_states.ACTIVE},
+             {'uuid': 'b', 'vm_state': vm_states.ACTIVE}])
+        self.mox.StubOutWithMock(self.registry, 'get_resource')
+        self.registry.get_resource('/compute/a', self.extras).AndReturn(
+            core_model.Resource('/compute/a', infrastructure.COMPUTE,
+                                [group]))
+        self.mox.StubOutWithMock(nova_glue.vm, 'stop_vm')
+        nova_glue.vm.stop_vm('a', mox.IsA(object), instance=mox.IsA(dict))
+        self.mox.ReplayAll()
+
+        handler = self._get_handler({'Category': STOP + ', web; '
+                                     'scheme="http://example.com/security#"; '
+                                     'class="mixin"'})
+        status, _, body = handler.post('/compute/')
+
+        self.assertEqual(200, status)
+        self.assertEqual('/compute/a: OK', body)
+
+        self.mox.VerifyAll()
+
+    def test_post_os_action_for_sanity(self):
+        """
+        Test if the OpenStack actions can be run on a collection too.
+        """
+        self.mox.StubOutWithMock(nova_glue.vm, 'get_vms')
+        nova_glue.vm.get_vms(mox.IsA(object)).AndReturn(
+            [{'uuid': 'a', 'vm_state': vm_states.ACTIVE},
+             {'uuid': 'b', 'vm_state': vm_states.STOPPED}])
+        self.mox.StubOutWithMock(nova_glue.vm, 'set_password_for_vm')
+        nova_glue.vm.set_password_for_vm('a', 'secret', mox.IsA(object))
+        self.mox.ReplayAll()
+
+        handler = self._get_handler({'Category': CHG_PWD,
+                                     'X-OCCI-Attribute':
+                                     'org.openstack.credentials.admin_pwd='
+                                     '"secret"'})
+        status, _, body = handler.post('/compute/')
+
+        self.assertEqual(200, status)
+        lines = body.split('\n')
+        self.assertIn('/compute/a: OK', lines)
+        self.assertIn('/compute/b: This action is currently not applicable.',
+                      lines)
+
+        self.mox.VerifyAll()
+
+
+class TestStorageBulkHandler(unittest.TestCase):
+    """
+    Tests the bulk handler for storage resources.
+    """
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        self.registry = registry.OCCIRegistry()
+        self.registry.set_renderer('text/occi',
+                                   occi_rendering.TextOcciRendering(
+                                       self.registry))
+        self.registry.set_backend(infrastructure.STORAGE,
+                                  storage.StorageBackend(), None)
+        self.extras = {'nova_ctx': fakes.Context(), 'registry': self.registry}
+        self.mox = mox.Mox()
+
+    def tearDown(self):
+        """
+        Cleanup mocks.
+        """
+        self.mox.UnsetStubs()
+
+    def _get_handler(self, headers):
+        """
+        Return a handler for the given headers.
+        """
+        headers['Content-Type'] = 'text/occi'
+        headers['Accept'] = 'text/occi'
+        return handlers.StorageBulkHandler(self.registry, headers, '',
+                                           ('bulk', ''), self.extras)
+
+    # Test for failure
+
+    def test_post_for_failure(self):
+        """
+        Test if titles and sizes need to match.
+        """
+        handler = self._get_handler({'Category': STORAGE,
+                                     'X-OCCI-Attribute':
+                                     'occi.storage.size="1", '
+                                     'occi.storage.size="2", '
+                                     'occi.core.title="a"'})
+
+        self.assertRaises(exceptions.HTTPError, handler.post, '/storage/')
+
+    # Test for sanity
+
+    def test_post_for_sanity(self):
+        """
+        Test if volumes are created and registered.
+        """
+        self.mox.StubOutWithMock(nova_glue.storage, 'create_storage')
+        nova_glue.storage.create_storage('1', 'a', mox.IsA(object)).\
+            InAnyOrder().AndReturn({'id': '1', 'status': 'available'})
+        nova_glue.storage.create_storage('2', 'scratch, b',
+                                         mox.IsA(object)).\
+            InAnyOrder().AndRaise(AttributeError('Quota exceeded.'))
+        self.mox.ReplayAll()
+
+        handler = self._get_handler({'Category': STORAGE,
+                                     'X-OCCI-Attribute':
+                                     'occi.storage.size="1", '
+                                     'occi.core.title="a", '
+                                     'occi.storage.size="2", '
+                                     'occi.core.title="scratch, b"'})
+        status, _, body = handler.post('/storage/')
+
+        self.assertEqual(200, status)
+        lines = body.split('\n')
+        self.assertIn('/storage/1: OK', lines)
+        self.assertIn('scratch, b: Quota exceeded.', lines)
+        self.assertIn(('/storage/1', 'foo'), self.registry.cache)
+
+        self.mox.VerifyAll()
+
+    def test_delete_for_sanity(self):
+        """
+        Test if volumes are deleted concurrently.
+        """
+        self.mox.StubOutWithMock(nova_glue.storage, 'get_storage_volumes')
+        nova_glue.storage.get_storage_volumes(mox.IsA(object)).AndReturn(
+            [{'id': '1'}, {'id': '2'}])
+        self.mox.StubOutWithMock(nova_glue.storage, 'delete_storage_instance')
+        nova_glue.storage.delete_storage_instance(
+            '1', mox.IsA(object)).InAnyOrder()
+        nova_glue.storage.delete_storage_instance(
+            '2', mox.IsA(object)).InAnyOrder()
+        self.mox.ReplayAll()
+
+        handler = self._get_handler({'X-OCCI-Location': '/storage/1, '
+                                                        '/storage/2, '
+                                                        '/storage/3'})
+        status, _, body = handler.delete('/storage/')
+
+        self.assertEqual(200, status)
+        lines = body.split('\n')
+        self.assertIn('/storage/1: OK', lines)
+        self.assertIn('/storage/2: OK', lines)
+        self.assertIn('/storage/3: Resource not found.', lines)
+
+        self.mox.VerifyAll()
+
+
+class TestStorageLinkBulkHandler(unittest.TestCase):
+    """
+    Tests the bulk handler for storage links.
+    """
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        self.registry = registry.OCCIRegistry()
+        self.registry.set_renderer('text/occi',
+                                   occi_rendering.TextOcciRendering(
+                                       self.registry))
+        self.registry.set_backend(infrastructure.STORAGELINK,
+                                  storage.StorageLinkBackend(), None)
+        self.extras = {'nova_ctx': fakes.Context(), 'registry': self.registry}
+        self.mox = mox.Mox()
+
+    def tearDown(self):
+        """
+        Cleanup mocks.
+        """
+        self.mox.UnsetStubs()
+
+    def _get_handler(self, headers):
+        """
+        Return a handler for the given headers.
+        """
+        headers['Content-Type'] = 'text/occi'
+        headers['Accept'] = 'text/occi'
+        return handlers.StorageLinkBulkHandler(self.registry, headers, '',
+                                               ('bulk', ''), self.extras)
+
+    # Test for failure
+
+    def test_post_for_failure(self):
+        """
+        Test if every target needs a device id.
+        """
+        handler = self._get_handler({'X-OCCI-Attribute':
+                                     'occi.core.source="/compute/a", '
+                                     'occi.core.target="/storage/1", '
+                                     'occi.core.target="/storage/2", '
+                                     'occi.storagelink.deviceid="/dev/vdb"'})
+
+        self.assertRaises(exceptions.HTTPError, handler.post,
+                          '/link/storage/')
+
+    # Test for sanity
+
+    def test_post_for_sanity(self):
+        """
+        Test if volumes are attached and links added to known resources.
+        """
+        vm_a = core_model.Resource('/compute/a', infrastructure.COMPUTE, [])
+        vol_1 = core_model.Resource('/storage/1', infrastructure.STORAGE, [])
+        self.registry.cache[('/compute/a', 'foo')] = vm_a
+        self.registry.cache[('/storage/1', 'foo')] = vol_1
+
+        self.mox.StubOutWithMock(nova_glue.vm, 'get_vms')
+        nova_glue.vm.get_vms(mox.IsA(object)).AndReturn(
+            [{'uuid': 'a', 'host': 'h1'}, {'uuid': 'b', 'host': 'h2'}])
+        self.mox.StubOutWithMock(nova_glue.storage, 'get_storage_volumes')
+        nova_glue.storage.get_storage_volumes(mox.IsA(object)).AndReturn(
+            [{'id': '1'}, {'id': '2'}])
+        self.mox.StubOutWithMock(nova_glue.vm, 'attach_volume')
+        nova_glue.vm.attach_volume('a', '1', '/dev/vdb', mox.IsA(object),
+                                   instance=mox.IsA(dict)).InAnyOrder()
+        nova_glue.vm.attach_volume('b', '2', '/dev/vdc', mox.IsA(object),
+                                   instance=mox.IsA(dict)).InAnyOrder()
+        self.mox.StubOutWithMock(nova_glue.storage, 'invalidate_volumes')
+        nova_glue.storage.invalidate_volumes('bar')
+        self.mox.ReplayAll()
+
+        handler = self._get_handler({'X-OCCI-Attribute':
+                                     'occi.core.source="/compute/a", '
+                                     'occi.core.target="/storage/1", '
+                                     'occi.storagelink.deviceid="/dev/vdb", '
+                                     'occi.core.source="/compute/b", '
+                                     'occi.core.target="/storage/2", '
+                                     'occi.storagelink.deviceid="/dev/vdc", '
+                                     'occi.core.source="/compute/c", '
+                                     'occi.core.target="/storage/1", '
+                                     'occi.storagelink.deviceid="/dev/vdd"'})
+        status, _, body = handler.post('/link/storage/')
+
+        self.assertEqual(200, status)
+        lines = body.split('\n')
+        self.assertEqual(1, len(vm_a.links))
+        self.assertIn(vm_a.links[0].identifier + ': OK', lines)
+        self.assertEqual('/dev/vdb',
+                         vm_a.links[0].attributes['occi.storagelink.deviceid'])
+        self.assertIn('/storage/2: OK', lines)
+        self.assertIn('/compute/c: Resource not found.', lines)
+
+        self.mox.VerifyAll()
+
+
+class TestNetworkLinkBulkHandler(unittest.TestCase):
+    """
+    Tests the bulk handler for network links.
+    """
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        self.registry = registry.OCCIRegistry()
+        self.registry.set_renderer('text/occi',
+                                   occi_rendering.TextOcciRendering(
+                                       self.registry))
+        self.registry.set_backend(infrastructure.NETWORKINTERFACE,
+                                  network.NetworkInterfaceBackend(), None)
+        self.extras = {'nova_ctx': fakes.Context(), 'registry': self.registry}
+        self.mox = mox.Mox()
+
+    def tearDown(self):
+        """
+        Cleanup mocks.
+        """
+        self.mox.UnsetStubs()
+
+    def _get_handler(self, headers):
+        """
+        Return a handler for the given headers.
+        """
+        headers['Content-Type'] = 'text/occi'
+        headers['Accept'] = 'text/occi'
+        return handlers.NetworkLinkBulkHandler(self.registry, headers, '',
+                                               ('bulk', ''), self.extras)
+
+    # Test for failure
+
+    def test_post_for_failure(self):
+        """
+        Test if only links to the public network can be created.
+        """
+        handler = self._get_handler({'X-OCCI-Attribute':
+                                     'occi.core.source="/compute/a", '
+                                     'occi.core.target="/network/1"'})
+
+        self.assertRaises(exceptions.HTTPError, handler.post,
+                          '/link/networkinterface/')
+
+    # Test for sanity
+
+    def test_post_for_sanity(self):
+        """
+        Test if floating ips are added and links added to known resources.
+        """
+        vm_a = core_model.Resource('/compute/a', infrastructure.COMPUTE, [])
+        self.registry.cache[('/compute/a', 'foo')] = vm_a
+
+        listing = [{'uuid': 'a'}, {'uuid': 'b'}]
+        self.mox.StubOutWithMock(nova_glue.vm, 'get_vms')
+        nova_glue.vm.get_vms(mox.IsA(object)).AndReturn(listing)
+        self.mox.StubOutWithMock(nova_glue.net, 'set_nw_info')
+        nova_glue.net.set_nw_info(listing)
+        self.mox.StubOutWithMock(nova_glue.net, 'add_floating_ip')
+        nova_glue.net.add_floating_ip(
+            'a', 'nova', mox.IsA(object),
+            instance=listing[0]).InAnyOrder().AndReturn('1.2.3.4')
+        nova_glue.net.add_floating_ip(
+            'b', 'nova', mox.IsA(object),
+            instance=listing[1]).InAnyOrder().AndReturn('1.2.3.5')
+        self.mox.StubOutWithMock(nova_glue.net, 'get_network_details')
+        nova_glue.net.get_network_details('a', mox.IsA(object),
+                                          listing[0]).AndReturn(
+            [{'interface': 'eth0', 'mac': 'aa:bb:cc:dd:ee:ff',
+              'state': 'active', 'address': '1.2.3.4',
+              'gateway': '10.0.0.1', 'allocation': 'static',
+              'network': None}])
+        self.mox.ReplayAll()
+
+        handler = self._get_handler({'X-OCCI-Attribute':
+                                     'occi.core.source="/compute/a", '
+                                     'occi.core.source="/compute/b", '
+                                     'occi.core.source="/compute/c", '
+                                     'occi.core.target="/network/public", '
+                                     'org.openstack.network.floating.pool='
+                                     '"nova"'})
+        status, _, body = handler.post('/link/networkinterface/')
+
+        self.assertEqual(200, status)
+        lines = body.split('\n')
+        self.assertEqual(1, len(vm_a.links))
+        self.assertIs(self.registry.pub_net, vm_a.links[0].target)
+        self.assertIn(vm_a.links[0].identifier + ': OK', lines)
+        self.assertIn('/compute/b: OK', lines)
+        self.assertIn('/compute/c: Resource not found.', lines)
+
+        self.mox.VerifyAll()
+
+
+class TestSecurityRuleBulkHandler(unittest.TestCase):
+    """
+    Tests the bulk handler for security rules.
+    """
+
+    group = core_model.Mixin('http://schemas.openstack.org/infrastructure/'
+                             'security/group#', 'web', [os_addon.SEC_GROUP],
+                             location='/web/')
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        self.registry = registry.OCCIRegistry()
+        self.registry.set_renderer('text/occi',
+                                   occi_rendering.TextOcciRendering(
+                                       self.registry))
+        self.registry.set_backend(os_addon.SEC_RULE,
+                                  openstack.SecurityRuleBackend(), None)
+        self.registry.set_backend(self.group, backend.MixinBackend(), None)
+        self.extras = {'nova_ctx': fakes.Context(), 'registry': self.registry}
+        self.mox = mox.Mox()
+
+    def tearDown(self):
+        """
+        Cleanup mocks.
+        """
+        self.mox.UnsetStubs()
+
+    def _get_handler(self, attributes):
+        """
+        Return a handler for the given attributes.
+        """
+        headers = {'Content-Type': 'text/occi',
+                   'Accept': 'text/occi',
+                   'Category': 'web; scheme="http://schemas.openstack.org/'
+                               'infrastructure/security/group#"; '
+                               'class="mixin"',
+                   'X-OCCI-Attribute': attributes}
+        return handlers.SecurityRuleBulkHandler(self.registry, headers, '',
+                                                ('bulk', ''), self.extras)
+
+    # Test for failure
+
+    def test_post_for_failure(self):
+        """
+        Test if all attributes are needed per rule.
+        """
+        handler = self._get_handler('occi.network.security.protocol="tcp", '
+                                    'occi.network.security.from="22", '
+                                    'occi.network.security.to="22", '
+                                    'occi.network.security.range='
+                                    '"0.0.0.0/0", '
+                                    'occi.network.security.protocol="tcp", '
+                                    'occi.network.security.from="80", '
+                                    'occi.network.security.range='
+                                    '"0.0.0.0/0"')
+
+        self.assertRaises(exceptions.HTTPError, handler.post,
+                          '/network/security/rule/')
+
+    def test_create_many_for_failure(self):
+        """
+        Test if at least one rule is needed.
+        """
+        self.assertRaises(AttributeError,
+                          openstack.SecurityRuleBackend().create_many, [],
+                          self.extras)
+
+    def test_make_sec_rule_for_failure(self):
+        """
+        Test if ports which are no numbers are rejected.
+        """
+        entity = core_model.Resource('', os_addon.SEC_RULE, [self.group])
+        entity.attributes = {'occi.network.security.protocol': 'tcp',
+                             'occi.network.security.from': 'ssh',
+                             'occi.network.security.to': '22',
+                             'occi.network.security.range': '0.0.0.0/0'}
+
+        self.assertRaises(AttributeError, openstack.make_sec_rule, entity, 1)
+
+    # Test for sanity
+
+    def test_post_for_sanity(self):
+        """
+        Test if all new rules are created with one call.
+        """
+        group = {'id': 1, 'name': 'web servers', 'rules': []}
+        self.mox.StubOutWithMock(nova_glue.security, 'retrieve_group')
+        nova_glue.security.retrieve_group('web',
+                                          mox.IsA(object)).AndReturn(group)
+        self.mox.StubOutWithMock(nova_glue.security, 'rule_exists')
+        nova_glue.security.rule_exists(group, mox.IsA(dict),
+                                       mox.IsA(object)).AndReturn(False)
+        nova_glue.security.rule_exists(group, mox.IsA(dict),
+                                       mox.IsA(object)).AndReturn(True)
+        self.mox.StubOutWithMock(nova_glue.security, 'create_rules')
+        nova_glue.security.create_rules(
+            'web servers', 1, mox.Func(lambda rules: len(rules) == 1),
+            mox.IsA(object)).AndReturn([{'id': 5}])
+        self.mox.ReplayAll()
+
+        # the last rule is given twice.
+        handler = self._get_handler(', '.join(
+            ['occi.network.security.protocol="tcp", '
+             'occi.network.security.from="%s", '
+             'occi.network.security.to="%s", '
+             'occi.network.security.range="0.0.0.0/0"' % (port, port)
+             for port in ['22', '80', '22']]))
+        status, _, body = handler.post('/network/security/rule/')
+
+        self.assertEqual(200, status)
+        lines = body.split('\n')
+        self.assertEqual(3, len(lines))
+        self.assertTrue(lines[0].endswith(': OK'))
+        self.assertIn('tcp 80 80 0.0.0.0/0: This rule already exists in '
+                      'group.', lines)
+        rules = [item for item in self.registry.cache.values()
+                 if item.kind == os_addon.SEC_RULE]
+        self.assertEqual(1, len(rules))
+        self.assertEqual('5', rules[0].attributes['occi.core.id'])
+
+        self.mox.VerifyAll()
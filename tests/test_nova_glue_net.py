@@ -0,0 +1,293 @@
+# coding=utf-8
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""
+Unittest for the network glue.
+"""
+
+#pylint: disable=W0102,C0103,R0904,R0903,W0612,W0212
+
+import eventlet
+import mox
+import unittest
+
+from oslo.config import cfg
+
+from nova.network import model as network_model
+
+# registers the configuration options.
+from occi_os_api import wsgi
+from occi_os_api.nova_glue import net
+
+import fakes
+
+CONF = cfg.CONF
+
+
+class TestNetworkInfo(unittest.TestCase):
+    """
+    Tests the cached network info.
+    """
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        net.NW_INFO.invalidate()
+        net.NETWORKS.invalidate()
+        self.context = fakes.Context()
+        fixed = network_model.FixedIP(
+            address='10.0.0.2',
+            floating_ips=[network_model.IP(address='1.2.3.4',
+                                           type='floating')])
+        subnet = network_model.Subnet(
+            cidr='10.0.0.0/24', ips=[fixed],
+            gateway=network_model.IP(address='10.0.0.1', type='gateway'))
+        self.nw_info = network_model.NetworkInfo([network_model.VIF(
+            address='aa:bb:cc:dd:ee:ff',
+            network=network_model.Network(id='1', label='private',
+                                          subnets=[subnet]))])
+        self.mox = mox.Mox()
+
+    def tearDown(self):
+        """
+        Cleanup mocks.
+        """
+        self.mox.UnsetStubs()
+        net.NW_INFO.invalidate()
+        net.NETWORKS.invalidate()
+
+    # Test for failure
+
+    def test_add_floating_ip_for_failure(self):
+        """
+        Empty network info is not cached and no floating ip is added.
+        """
+        instance = {'uuid': 'foo'}
+        self.mox.StubOutWithMock(net.NETWORK_API, 'get_instance_nw_info')
+        net.NETWORK_API.get_instance_nw_info(
+            self.context, instance).AndReturn(network_model.NetworkInfo([]))
+        self.mox.ReplayAll()
+
+        self.assertRaises(AttributeError, net.add_floating_ip, 'foo', None,
+                          self.context, instance=instance)
+        self.assertIsNone(net.NW_INFO.get('foo'))
+
+        self.mox.VerifyAll()
+
+    # Test for sanity
+
+    def test_get_nw_info_for_sanity(self):
+        """
+        Network info is fetched again once the state of the VM changes.
+        """
+        instance = {'uuid': 'foo', 'vm_state': 'active', 'task_state': None}
+        self.mox.StubOutWithMock(net.NETWORK_API, 'get_instance_nw_info')
+        net.NETWORK_API.get_instance_nw_info(self.context,
+                                             instance).AndReturn(self.nw_info)
+        net.NETWORK_API.get_instance_nw_info(self.context,
+                                             instance).AndReturn(self.nw_info)
+        self.mox.ReplayAll()
+
+        self.assertIs(self.nw_info, net.get_nw_info('foo', self.context,
+                                                    instance))
+        self.assertIs(self.nw_info, net.get_nw_info('foo', self.context,
+                                                    instance))
+        instance['vm_state'] = 'stopped'
+        self.assertIs(self.nw_info, net.get_nw_info('foo', self.context,
+                                                    instance))
+
+        self.mox.VerifyAll()
+
+    def test_get_network_details_for_sanity(self):
+        """
+        Network info is fetched once and updated by floating ip changes.
+        """
+        instance = {'uuid': 'foo'}
+        self.mox.StubOutWithMock(net.NETWORK_API, 'get_instance_nw_info')
+        net.NETWORK_API.get_instance_nw_info(self.context,
+                                             instance).AndReturn(self.nw_info)
+        self.mox.StubOutWithMock(net.vm, 'get_vm')
+        net.vm.get_vm('foo', self.context).AndReturn(instance)
+        self.mox.StubOutWithMock(net.NETWORK_API, 'disassociate_floating_ip')
+        net.NETWORK_API.disassociate_floating_ip(self.context, instance,
+                                                 '1.2.3.4')
+        self.mox.StubOutWithMock(net.NETWORK_API, 'release_floating_ip')
+        net.NETWORK_API.release_floating_ip(self.context, '1.2.3.4')
+        self.mox.StubOutWithMock(net.NETWORK_API, 'get_all')
+        net.NETWORK_API.get_all(self.context).AndRaise(
+            NotImplementedError())
+        self.mox.ReplayAll()
+
+        result = net.get_network_details('foo', self.context, instance)
+        self.assertListEqual(['10.0.0.2', '1.2.3.4'],
+                             [item['address'] for item in result])
+        self.assertEqual('10.0.0.0/24', result[0]['network']['cidr'])
+        self.assertEqual('10.0.0.1', result[0]['network']['gateway'])
+        # networks which can not be listed are not shared.
+        self.assertFalse(result[0]['network']['shared'])
+        self.assertIsNone(result[1]['network'])
+        self.assertEqual('aa:bb:cc:dd:ee:ff', result[1]['mac'])
+
+        net.remove_floating_ip('foo', '1.2.3.4', self.context)
+
+        result = net.get_network_details('foo', self.context, instance)
+        self.assertListEqual(['10.0.0.2'],
+                             [item['address'] for item in result])
+
+        self.mox.VerifyAll()
+
+    def test_get_networks_for_sanity(self):
+        """
+        Networks are listed once per project.
+        """
+        self.mox.StubOutWithMock(net.NETWORK_API, 'get_all')
+        net.NETWORK_API.get_all(self.context).AndReturn(
+            [{'uuid': '1', 'label': 'private', 'vlan': 100,
+              'cidr': '10.0.0.0/24', 'gateway': '10.0.0.1',
+              'project_id': 'bar'},
+             {'uuid': '2', 'label': 'shared', 'vlan': None,
+              'cidr': '10.1.0.0/24', 'gateway': '10.1.0.1',
+              'project_id': None}])
+        self.mox.ReplayAll()
+
+        result = net.get_networks(self.context)
+        self.assertListEqual([False, True],
+                             [item['shared'] for item in result])
+        self.assertIs(result, net.get_networks(self.context))
+
+        self.mox.VerifyAll()
+
+
+class TestFloatingIpReservoir(unittest.TestCase):
+    """
+    Tests the reservoir of floating ips.
+    """
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        CONF.set_override('occi_floating_ip_reservoir_low', 1)
+        CONF.set_override('occi_floating_ip_reservoir_high', 2)
+        net.RESERVOIR.clear()
+        self.context = fakes.Context()
+        self.mox = mox.Mox()
+
+    def tearDown(self):
+        """
+        Cleanup mocks & configuration.
+        """
+        self.mox.UnsetStubs()
+        net.RESERVOIR.clear()
+        CONF.clear_override('occi_floating_ip_reservoir_low')
+        CONF.clear_override('occi_floating_ip_reservoir_high')
+
+    # Test for sanity
+
+    def test_reservoir_for_sanity(self):
+        """
+        Test if the reservoir is topped up and addresses are reused.
+        """
+        self.mox.StubOutWithMock(net.NETWORK_API,
+                                 'get_floating_ips_by_project')
+        net.NETWORK_API.get_floating_ips_by_project(
+            self.context).AndReturn([])
+        self.mox.StubOutWithMock(net.NETWORK_API, 'allocate_floating_ip')
+        net.NETWORK_API.allocate_floating_ip(self.context,
+                                             'pub').AndReturn('10.0.0.1')
+        net.NETWORK_API.allocate_floating_ip(self.context,
+                                             'pub').AndReturn('10.0.0.2')
+        net.NETWORK_API.allocate_floating_ip(self.context,
+                                             'pub').AndReturn('10.0.0.3')
+        self.mox.StubOutWithMock(net.NETWORK_API,
+                                 'get_floating_ip_by_address')
+        net.NETWORK_API.get_floating_ip_by_address(
+            self.context, '10.0.0.1').AndReturn({'pool': 'pub'})
+        self.mox.StubOutWithMock(net.NETWORK_API, 'release_floating_ip')
+        net.NETWORK_API.release_floating_ip(self.context, '10.0.0.1')
+        self.mox.ReplayAll()
+
+        self.assertEqual('10.0.0.1', net._take_floating_ip('pub',
+                                                           self.context))
+        eventlet.sleep(0)
+        self.assertListEqual(['10.0.0.2', '10.0.0.3'],
+                             net.RESERVOIR[('bar', 'pub')])
+
+        # reservoir is full - address is released.
+        net._return_floating_ip('10.0.0.1', self.context)
+
+        self.assertEqual('10.0.0.3', net._take_floating_ip('pub',
+                                                           self.context))
+
+        self.mox.VerifyAll()
+
+    def test_seed_reservoir_for_sanity(self):
+        """
+        Test if unassociated floating ips of the project are used first.
+        """
+        self.mox.StubOutWithMock(net.NETWORK_API,
+                                 'get_floating_ips_by_project')
+        net.NETWORK_API.get_floating_ips_by_project(self.context).AndReturn(
+            [{'address': '10.0.0.4', 'pool': 'pub', 'fixed_ip_id': None},
+             {'address': '10.0.0.5', 'pool': 'pub', 'fixed_ip_id': None},
+             {'address': '10.0.0.6', 'pool': 'pub', 'fixed_ip_id': 3},
+             {'address': '10.0.0.7', 'pool': 'other', 'fixed_ip_id': None}])
+        self.mox.StubOutWithMock(net.NETWORK_API, 'allocate_floating_ip')
+        self.mox.ReplayAll()
+
+        self.assertEqual('10.0.0.5', net._take_floating_ip('pub',
+                                                           self.context))
+        eventlet.sleep(0)
+        self.assertListEqual(['10.0.0.4'], net.RESERVOIR[('bar', 'pub')])
+
+        self.mox.VerifyAll()
+
+    def test_default_pool_for_sanity(self):
+        """
+        Test if no pool and the default pool share the reservoir.
+        """
+        CONF.set_override('default_floating_pool', 'pub')
+        self.mox.StubOutWithMock(net.NETWORK_API,
+                                 'get_floating_ips_by_project')
+        net.NETWORK_API.get_floating_ips_by_project(
+            self.context).AndReturn([])
+        self.mox.StubOutWithMock(net.NETWORK_API, 'allocate_floating_ip')
+        net.NETWORK_API.allocate_floating_ip(self.context,
+                                             'pub').AndReturn('10.0.0.1')
+        net.NETWORK_API.allocate_floating_ip(self.context,
+                                             'pub').AndReturn('10.0.0.2')
+        net.NETWORK_API.allocate_floating_ip(self.context,
+                                             'pub').AndReturn('10.0.0.3')
+        self.mox.StubOutWithMock(net.NETWORK_API,
+                                 'get_floating_ip_by_address')
+        net.NETWORK_API.get_floating_ip_by_address(
+            self.context, '10.0.0.1').AndReturn({'pool': None})
+        self.mox.StubOutWithMock(net.NETWORK_API, 'release_floating_ip')
+        net.NETWORK_API.release_floating_ip(self.context, '10.0.0.1')
+        self.mox.ReplayAll()
+
+        try:
+            self.assertEqual('10.0.0.1', net._take_floating_ip(None,
+                                                               self.context))
+            eventlet.sleep(0)
+            net._return_floating_ip('10.0.0.1', self.context)
+            self.assertListEqual(['10.0.0.2', '10.0.0.3'],
+                                 net.RESERVOIR[('bar', 'pub')])
+            self.assertEqual(1, len(net.RESERVOIR))
+        finally:
+            CONF.clear_override('default_floating_pool')
+
+        self.mox.VerifyAll()
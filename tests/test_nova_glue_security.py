@@ -0,0 +1,182 @@
+# coding=utf-8
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""
+Unittest for the security glue.
+"""
+
+#pylint: disable=W0102,C0103,R0904,R0903,W0612
+
+import mox
+import unittest
+
+# registers the configuration options.
+from occi_os_api import wsgi
+from occi_os_api.nova_glue import security
+
+import fakes
+
+
+class TestSecurityGroups(unittest.TestCase):
+    """
+    Tests the lookup of security groups.
+    """
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        security.GROUPS.invalidate()
+        self.context = fakes.Context()
+        self.mox = mox.Mox()
+
+    def tearDown(self):
+        """
+        Cleanup mocks.
+        """
+        self.mox.UnsetStubs()
+        security.GROUPS.invalidate()
+
+    # Test for failure
+
+    def test_resolve_group_names_for_failure(self):
+        """
+        Unknown groups are looked up once more before giving up.
+        """
+        self.mox.StubOutWithMock(security.SEC_API, 'list')
+        security.SEC_API.list(self.context, project='bar').AndReturn([])
+        security.SEC_API.list(self.context, project='bar').AndReturn([])
+        self.mox.ReplayAll()
+
+        self.assertRaises(AttributeError, security.resolve_group_names,
+                          ['default'], self.context)
+
+        self.mox.VerifyAll()
+
+    # Test for sanity
+
+    def test_retrieve_group_for_sanity(self):
+        """
+        Groups are looked up by id or name and created or removed groups are
+        written through to the cache.
+        """
+        default = {'id': 1, 'name': 'default', 'rules': []}
+        web = {'id': 2, 'name': 'web'}
+        self.mox.StubOutWithMock(security.SEC_API, 'list')
+        security.SEC_API.list(self.context, project='bar').AndReturn(
+            [default])
+        self.mox.StubOutWithMock(security.SEC_API, 'create_security_group')
+        security.SEC_API.create_security_group(self.context, 'web',
+                                               'Web').AndReturn(web)
+        self.mox.StubOutWithMock(security.SEC_API, 'destroy')
+        security.SEC_API.destroy(self.context, default)
+        self.mox.ReplayAll()
+
+        self.assertIs(default, security.retrieve_group('1', self.context))
+        self.assertIs(default, security.retrieve_group('default',
+                                                       self.context))
+        security.create_group('web', 'Web', self.context)
+        security.remove_group(default, self.context)
+        self.assertIs(web, security.retrieve_group('2', self.context))
+        self.assertListEqual([web], security.retrieve_groups_by_project(
+            self.context))
+
+        self.mox.VerifyAll()
+
+    def test_resolve_group_names_for_sanity(self):
+        """
+        Groups are resolved by name or id with one listing.
+        """
+        self.mox.StubOutWithMock(security.SEC_API, 'list')
+        security.SEC_API.list(self.context, project='bar').AndReturn(
+            [{'id': 1, 'name': 'default', 'rules': []},
+             {'id': 2, 'name': 'web', 'rules': []}])
+        self.mox.ReplayAll()
+
+        self.assertListEqual(['default', 'web'],
+                             security.resolve_group_names(['default', '2'],
+                                                          self.context))
+        self.assertListEqual(['web'],
+                             security.resolve_group_names(['web'],
+                                                          self.context))
+
+        self.mox.VerifyAll()
+
+
+class TestSecurityRules(unittest.TestCase):
+    """
+    Tests the duplicate detection of security rules.
+    """
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        security.GROUPS.invalidate()
+        self.context = fakes.Context()
+        self.rule = {'id': 10, 'parent_group_id': 1, 'group_id': None,
+                     'cidr': '10.0.0.0/24', 'from_port': 22, 'to_port': 22,
+                     'protocol': 'tcp'}
+        self.group = {'id': 1, 'name': 'default', 'rules': [self.rule]}
+        self.mox = mox.Mox()
+
+    def tearDown(self):
+        """
+        Cleanup mocks.
+        """
+        self.mox.UnsetStubs()
+        security.GROUPS.invalidate()
+
+    # Test for sanity
+
+    def test_rule_exists_for_sanity(self):
+        """
+        Rules are compared normalized and the index follows created and
+        deleted rules.
+        """
+        new_rule = {'id': 11, 'parent_group_id': 1, 'group_id': None,
+                    'cidr': '0.0.0.0/0', 'from_port': 80, 'to_port': 80,
+                    'protocol': 'tcp'}
+        self.mox.StubOutWithMock(security.SEC_API, 'list')
+        security.SEC_API.list(self.context, project='bar').AndReturn(
+            [self.group])
+        # the removed rule is looked up once more.
+        security.SEC_API.list(self.context, project='bar').AndReturn(
+            [{'id': 1, 'name': 'default', 'rules': [new_rule]}])
+        self.mox.StubOutWithMock(security.SEC_API, 'add_rules')
+        security.SEC_API.add_rules(self.context, 1, 'default',
+                                   mox.IsA(list)).AndReturn([new_rule])
+        self.mox.StubOutWithMock(security.SEC_API, 'remove_rules')
+        security.SEC_API.remove_rules(self.context, self.group, (10, ))
+        self.mox.ReplayAll()
+
+        self.assertTrue(security.rule_exists(
+            self.group, {'cidr': ' 10.0.0.0/24', 'from_port': '22',
+                         'to_port': '22', 'protocol': 'TCP'}, self.context))
+        self.assertFalse(security.rule_exists(self.group, new_rule,
+                                              self.context))
+
+        security.create_rules('default', 1, [new_rule], self.context)
+        self.assertTrue(security.rule_exists(self.group, new_rule,
+                                             self.context))
+        self.assertIs(new_rule, security.retrieve_rule('11', self.context))
+
+        security.remove_rule(self.rule, self.context)
+        self.assertFalse(security.rule_exists(self.group, self.rule,
+                                              self.context))
+        self.assertRaises(AttributeError, security.retrieve_rule, '10',
+                          self.context)
+
+        self.mox.VerifyAll()
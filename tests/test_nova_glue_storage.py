@@ -0,0 +1,88 @@
+# coding=utf-8
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""
+Unittest for the storage glue.
+"""
+
+#pylint: disable=W0102,C0103,R0904,R0903,W0612
+
+import mox
+import unittest
+
+# registers the configuration options.
+from occi_os_api import wsgi
+from occi_os_api.nova_glue import storage
+
+import fakes
+
+
+class TestVolumeListing(unittest.TestCase):
+    """
+    Tests the cached volume listing.
+    """
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        storage.VOLUMES.invalidate()
+        self.context = fakes.Context()
+        self.mox = mox.Mox()
+
+    def tearDown(self):
+        """
+        Cleanup mocks.
+        """
+        self.mox.UnsetStubs()
+        storage.VOLUMES.invalidate()
+
+    # Test for sanity
+
+    def test_get_storage_volumes_for_sanity(self):
+        """
+        Volumes are listed once and changes are written through.
+        """
+        self.mox.StubOutWithMock(storage.VOLUME_API, 'get_all')
+        storage.VOLUME_API.get_all(self.context).AndReturn(
+            [{'id': '1', 'status': 'available'}])
+        self.mox.StubOutWithMock(storage.VOLUME_API, 'create')
+        storage.VOLUME_API.create(self.context, 1, 'foo', 'foo').AndReturn(
+            {'id': '2', 'status': 'creating'})
+        self.mox.StubOutWithMock(storage.VOLUME_API, 'delete')
+        storage.VOLUME_API.delete(self.context, '1')
+        self.mox.ReplayAll()
+
+        self.assertEqual(['1'], [item['id'] for item in
+                                 storage.get_storage_volumes(self.context)])
+        storage.create_storage('1', 'foo', self.context)
+        storage.delete_storage_instance('1', self.context)
+        self.assertEqual(['2'], [item['id'] for item in
+                                 storage.get_storage_volumes(self.context)])
+
+        self.mox.VerifyAll()
+
+    def test_write_through_for_sanity(self):
+        """
+        Writing through keeps the expiry of the cached listing.
+        """
+        storage.VOLUMES.set('bar', [{'id': '1'}], 10)
+        expires = storage.VOLUMES._data['bar'][0]
+
+        storage._cache_volume({'id': '2'}, self.context)
+        storage._uncache_volume('1', self.context)
+
+        self.assertEqual((expires, [{'id': '2'}]),
+                         storage.VOLUMES._data['bar'])
@@ -0,0 +1,333 @@
+# coding=utf-8
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""
+Unittest for the VM glue.
+"""
+
+#pylint: disable=W0102,C0103,R0904,R0903,W0612
+
+import eventlet
+import mox
+import unittest
+
+from oslo.config import cfg
+
+from nova.compute import flavors
+from nova.compute import task_states
+from nova.compute import vm_states
+
+from occi.extensions import infrastructure
+
+# registers the configuration options.
+from occi_os_api import wsgi
+from occi_os_api.nova_glue import vm
+
+import fakes
+
+VM_STATES = [getattr(vm_states, item) for item in dir(vm_states)
+             if isinstance(getattr(vm_states, item), str)
+             and item.isupper()]
+CONF = cfg.CONF
+
+TASK_STATES = [getattr(task_states, item) for item in dir(task_states)
+               if isinstance(getattr(task_states, item), str)
+               and item.isupper()] + [None]
+
+
+class TestVncConsole(unittest.TestCase):
+    """
+    Tests the retrieval of VNC consoles.
+    """
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        vm.CONSOLES.invalidate()
+        self.instance = {'uuid': 'bar', 'vm_state': vm_states.ACTIVE,
+                         'task_state': None}
+        self.mox = mox.Mox()
+
+    def tearDown(self):
+        """
+        Cleanup mocks.
+        """
+        self.mox.UnsetStubs()
+        vm.CONSOLES.invalidate()
+
+    # Test for failure
+
+    def test_get_vnc_for_failure(self):
+        """
+        Consoles of VMs which are not active are not requested.
+        """
+        self.mox.StubOutWithMock(vm.COMPUTE_API, 'get_vnc_console')
+        self.mox.ReplayAll()
+
+        self.instance['vm_state'] = vm_states.STOPPED
+        self.assertIsNone(vm.get_vnc('bar', None, self.instance))
+
+        self.mox.VerifyAll()
+
+    # Test for sanity
+
+    def test_get_vnc_for_sanity(self):
+        """
+        Consoles are cached until the state of the VM changes.
+        """
+        self.mox.StubOutWithMock(vm.COMPUTE_API, 'get_vnc_console')
+        vm.COMPUTE_API.get_vnc_console(None, self.instance,
+                                       'novnc').AndReturn({'url': 'a'})
+        vm.COMPUTE_API.get_vnc_console(None, self.instance,
+                                       'novnc').AndReturn({'url': 'b'})
+        self.mox.ReplayAll()
+
+        self.assertEqual({'url': 'a'}, vm.get_vnc('bar', None, self.instance))
+        self.assertEqual({'url': 'a'}, vm.get_vnc('bar', None, self.instance))
+
+        self.instance['task_state'] = task_states.REBOOTING
+        self.assertEqual({'url': 'b'}, vm.get_vnc('bar', None, self.instance))
+
+        self.mox.VerifyAll()
+
+
+class TestFlavors(unittest.TestCase):
+    """
+    Tests the lookup of flavors.
+    """
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        vm.FLAVORS.invalidate()
+        self.mox = mox.Mox()
+
+    def tearDown(self):
+        """
+        Cleanup mocks.
+        """
+        self.mox.UnsetStubs()
+        vm.FLAVORS.invalidate()
+
+    # Test for sanity
+
+    def test_get_flavor_for_sanity(self):
+        """
+        Flavors are listed once and looked up by their flavor id.
+        """
+        self.mox.StubOutWithMock(flavors, 'get_all_flavors')
+        flavors.get_all_flavors().AndReturn(
+            {'m1.tiny': {'flavorid': '1', 'name': 'm1.tiny'},
+             'm1.small': {'flavorid': '2', 'name': 'm1.small'}})
+        self.mox.StubOutWithMock(flavors, 'get_flavor_by_flavor_id')
+        flavors.get_flavor_by_flavor_id('3').AndReturn({'flavorid': '3'})
+        self.mox.ReplayAll()
+
+        version = vm.get_flavor_version()
+        self.assertEqual('m1.tiny', vm.get_flavor('1')['name'])
+        self.assertEqual('m1.small', vm.get_flavor('2')['name'])
+        self.assertEqual('3', vm.get_flavor('3')['flavorid'])
+        self.assertEqual(version, vm.get_flavor_version())
+
+        self.mox.VerifyAll()
+
+    def test_get_instance_flavor_id_for_sanity(self):
+        """
+        The flavor id of an instance is found by it's instance type id.
+        """
+        self.mox.StubOutWithMock(flavors, 'get_all_flavors')
+        flavors.get_all_flavors().AndReturn(
+            {'m1.tiny': {'id': 5, 'flavorid': '1', 'name': 'm1.tiny'},
+             'm1.small': {'id': 6, 'flavorid': '2', 'name': 'm1.small'}})
+        self.mox.ReplayAll()
+
+        self.assertEqual('2',
+                         vm.get_instance_flavor_id({'instance_type_id': 6}))
+        self.assertIsNone(vm.get_instance_flavor_id({'instance_type_id': 7}))
+
+        self.mox.VerifyAll()
+
+
+class TestResize(unittest.TestCase):
+    """
+    Tests the confirmation of resizes in the background.
+    """
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        CONF.set_override('occi_poll_interval', 0)
+        CONF.set_override('occi_poll_max_interval', 0)
+        self.context = fakes.Context()
+        self.instance = {'uuid': 'bar', 'vm_state': vm_states.ACTIVE,
+                         'task_state': None}
+        self.mox = mox.Mox()
+
+    def tearDown(self):
+        """
+        Cleanup mocks and resize tasks.
+        """
+        self.mox.UnsetStubs()
+        CONF.clear_override('occi_poll_interval')
+        CONF.clear_override('occi_poll_max_interval')
+        vm.RESIZE_TASKS.clear()
+        vm.RESIZE_FAILURES.invalidate()
+
+    def _resize(self, vm_state):
+        """
+        Resize the VM - nova ends up in the given state.
+        """
+        resized = {'uuid': 'bar', 'vm_state': vm_state, 'task_state': None}
+        self.mox.StubOutWithMock(vm, 'get_vm')
+        vm.get_vm('bar', self.context).AndReturn(self.instance)
+        self.mox.StubOutWithMock(vm, 'get_flavor')
+        vm.get_flavor('2').AndReturn({'flavorid': '2'})
+        self.mox.StubOutWithMock(vm.COMPUTE_API, 'resize')
+        vm.COMPUTE_API.resize(self.context, self.instance, flavor_id='2')
+        self.mox.StubOutWithMock(vm, 'get_vms')
+        vm.get_vms(self.context).MultipleTimes().AndReturn([resized])
+        return resized
+
+    def _settle(self):
+        """
+        Let the waiter confirm the resize in the background.
+        """
+        for _ in range(10):
+            eventlet.sleep(0)
+
+    # Test for failure
+
+    def test_resize_vm_for_failure(self):
+        """
+        A failed resize is not confirmed and reported as failed.
+        """
+        self._resize(vm_states.ERROR)
+        self.mox.StubOutWithMock(vm.COMPUTE_API, 'confirm_resize')
+        self.mox.ReplayAll()
+
+        vm.resize_vm('bar', '2', self.context)
+        self.assertEqual(vm.RESIZE_PENDING,
+                         vm.get_vm_task('bar', self.instance))
+        self._settle()
+
+        self.assertNotIn('bar', vm.RESIZE_TASKS)
+        self.assertEqual(vm.RESIZE_FAILED,
+                         vm.get_vm_task('bar', self.instance))
+
+        self.mox.VerifyAll()
+
+    # Test for sanity
+
+    def test_resize_vm_for_sanity(self):
+        """
+        A resize is confirmed once nova is done with it.
+        """
+        resized = self._resize(vm_states.RESIZED)
+        self.mox.StubOutWithMock(vm.COMPUTE_API, 'confirm_resize')
+        vm.COMPUTE_API.confirm_resize(self.context, resized)
+        self.mox.ReplayAll()
+
+        vm.resize_vm('bar', '2', self.context)
+        self._settle()
+
+        self.assertNotIn('bar', vm.RESIZE_TASKS)
+        self.assertIsNone(vm.get_vm_task('bar', self.instance))
+        self.assertEqual('active',
+                         vm.get_instance_state('bar', self.instance)[0])
+
+        self.mox.VerifyAll()
+
+
+class TestStateMapping(unittest.TestCase):
+    """
+    Tests the mapping of nova states to OCCI states and actions.
+    """
+
+    def tearDown(self):
+        """
+        Cleanup resize tasks.
+        """
+        vm.RESIZE_TASKS.clear()
+
+    # Test for failure
+
+    def test_get_instance_state_for_failure(self):
+        """
+        No actions while a resize is confirmed or for unknown states.
+        """
+        vm.RESIZE_TASKS['bar'] = vm.RESIZE_PENDING
+        self.assertEqual(('inactive', []), vm.get_instance_state(
+            'bar', {'vm_state': vm_states.ACTIVE, 'task_state': None}))
+
+        self.assertEqual(('inactive', []), vm.get_instance_state(
+            'foo', {'vm_state': 'unknown', 'task_state': None}))
+
+    # Test for sanity
+
+    def test_get_instance_state_for_sanity(self):
+        """
+        Test the state matrix.
+        """
+        running = [infrastructure.STOP, infrastructure.SUSPEND,
+                   infrastructure.RESTART]
+        rows = [
+            (vm_states.ACTIVE, None, 'active', running),
+            (vm_states.ACTIVE, task_states.REBOOTING, 'active', running),
+            (vm_states.ACTIVE, task_states.IMAGE_SNAPSHOT, 'inactive', []),
+            (vm_states.ACTIVE, task_states.IMAGE_PENDING_UPLOAD, 'inactive',
+             []),
+            (vm_states.ACTIVE, task_states.IMAGE_UPLOADING, 'inactive', []),
+            (vm_states.PAUSED, None, 'inactive', [infrastructure.START]),
+            (vm_states.SUSPENDED, None, 'inactive', [infrastructure.START]),
+            (vm_states.STOPPED, None, 'inactive', [infrastructure.START]),
+            (vm_states.STOPPED, task_states.POWERING_ON, 'inactive',
+             [infrastructure.START]),
+            (vm_states.STOPPED, task_states.IMAGE_SNAPSHOT, 'inactive', []),
+            (vm_states.BUILDING, None, 'inactive', []),
+            (vm_states.BUILDING, task_states.SPAWNING, 'inactive', []),
+            (vm_states.RESCUED, None, 'inactive', []),
+            (vm_states.RESIZED, None, 'inactive', []),
+            (vm_states.SOFT_DELETED, None, 'inactive', []),
+            (vm_states.DELETED, None, 'inactive', []),
+            (vm_states.ERROR, None, 'inactive', [])]
+
+        for vm_state, task_state, state, actions in rows:
+            instance = {'vm_state': vm_state, 'task_state': task_state}
+            self.assertEqual((state, actions),
+                             vm.get_instance_state('bar', instance))
+
+    def test_state_table_for_sanity(self):
+        """
+        Test if the table covers all states nova defines.
+        """
+        for vm_state in VM_STATES:
+            for task_state in TASK_STATES:
+                self.assertIn((vm_state, task_state), vm.STATE_TABLE)
+
+    def test_get_instances_states_for_sanity(self):
+        """
+        Test if a complete listing is mapped at once.
+        """
+        states = vm.get_instances_states(
+            [{'uuid': 'a', 'vm_state': vm_states.ACTIVE,
+              'task_state': task_states.IMAGE_SNAPSHOT},
+             {'uuid': 'b', 'vm_state': vm_states.STOPPED,
+              'task_state': None}])
+
+        self.assertEqual(('inactive', []), states['a'])
+        self.assertEqual(('inactive', [infrastructure.START]), states['b'])
@@ -0,0 +1,176 @@
+# coding=utf-8
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""
+Unittest for the waiter service.
+"""
+
+#pylint: disable=W0102,C0103,R0904,R0903,W0612
+
+import unittest
+
+from oslo.config import cfg
+
+# registers the configuration options.
+from occi_os_api import wsgi
+from occi_os_api.nova_glue import waiter
+
+import fakes
+
+CONF = cfg.CONF
+
+
+class TestWaiter(unittest.TestCase):
+    """
+    Tests the waiter service.
+    """
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        CONF.set_override('occi_poll_interval', 0)
+        CONF.set_override('occi_poll_max_interval', 0)
+        self.listings = []
+        self.resources = [{'id': '1', 'status': 'creating'},
+                          {'id': '2', 'status': 'available'}]
+
+    def tearDown(self):
+        """
+        Reset configuration.
+        """
+        CONF.clear_override('occi_poll_interval')
+        CONF.clear_override('occi_poll_max_interval')
+
+    def lister(self, context):
+        """
+        List the resources - the first one is created after two listings.
+        """
+        self.listings.append(context)
+        if len(self.listings) > 2:
+            self.resources[0]['status'] = 'available'
+        return self.resources
+
+    # Test for failure
+
+    def test_wait_for_failure(self):
+        """
+        Test waits for resources which are gone or take too long.
+        """
+        gone = waiter.wait(self.lister, '3', fakes.Context(),
+                           lambda item: item['status'] == 'available')
+        late = waiter.wait(self.lister, '1', fakes.Context(),
+                           lambda item: item['status'] == 'error',
+                           timeout=0)
+
+        self.assertEqual(waiter.GONE, gone.wait())
+        self.assertEqual(waiter.TIMEOUT, late.wait())
+        self.assertEqual(3, len(self.listings))
+
+    def test_check_for_failure(self):
+        """
+        Test if a failing check does not stop the other waits.
+        """
+        broken = waiter.wait(self.lister, '2', fakes.Context(),
+                             lambda item: item['missing'], timeout=0)
+        other = waiter.wait(self.lister, '1', fakes.Context(),
+                            lambda item: item['status'] == 'available')
+
+        self.assertEqual(waiter.TIMEOUT, broken.wait())
+        self.assertIsNone(other.wait())
+        self.assertEqual({}, waiter._GROUPS)
+
+    def test_listing_for_failure(self):
+        """
+        Test if the waits of a group are over once the listing fails.
+        """
+        def lister(context):
+            """
+            Fail like nova does for a context which is no longer valid.
+            """
+            self.listings.append(context)
+            raise Exception('Not authorized.')
+
+        first = waiter.wait(lister, '1', fakes.Context(),
+                            lambda item: item['status'] == 'available')
+        second = waiter.wait(lister, '2', fakes.Context(),
+                             lambda item: item['status'] == 'available')
+
+        self.assertEqual(waiter.FAILED, first.wait())
+        self.assertEqual(waiter.FAILED, second.wait())
+        self.assertEqual(1, len(self.listings))
+        self.assertEqual({}, waiter._GROUPS)
+
+    # Test for sanity
+
+    def test_wait_for_sanity(self):
+        """
+        Test if waits are served by shared listings and callbacks are run.
+        """
+        calls = []
+
+        def callback(item, error):
+            """
+            Record the outcome.
+            """
+            calls.append((item['id'], error))
+            return item['id']
+
+        first = waiter.wait(self.lister, '1', fakes.Context(),
+                            lambda item: item['status'] == 'available',
+                            callback)
+        second = waiter.wait(self.lister, '2', fakes.Context(),
+                             lambda item: item['status'] == 'available',
+                             callback)
+
+        self.assertEqual('1', first.wait())
+        self.assertEqual('2', second.wait())
+        self.assertListEqual([('2', None), ('1', None)], calls)
+        self.assertEqual(3, len(self.listings))
+
+    def test_wait_with_new_context_for_sanity(self):
+        """
+        Test if the listing is done with the context of the newest wait.
+        """
+        old = fakes.Context()
+        new = fakes.Context()
+        first = waiter.wait(self.lister, '1', old,
+                            lambda item: item['status'] == 'available')
+        second = waiter.wait(self.lister, '2', new,
+                             lambda item: item['status'] == 'available')
+
+        self.assertIsNone(first.wait())
+        self.assertIsNone(second.wait())
+        self.assertNotIn(old, self.listings)
+
+    def test_wait_for_new_resource_for_sanity(self):
+        """
+        Test if a resource which is not listed right away is not gone.
+        """
+        def lister(context):
+            """
+            List the resources - the second one only from the third
+            listing on.
+            """
+            self.listings.append(context)
+            if len(self.listings) < 3:
+                return self.resources[:1]
+            return self.resources
+
+        done = waiter.wait(lister, '2', fakes.Context(),
+                           lambda item: item['status'] == 'available')
+
+        self.assertIsNone(done.wait())
+        self.assertEqual(3, len(self.listings))
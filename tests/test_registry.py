@@ -0,0 +1,345 @@
+# coding=utf-8
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+"""
+Unittest for the OCCI registry.
+"""
+
+#pylint: disable=W0102,C0103,R0904,R0903
+
+import mox
+import unittest
+
+from oslo.config import cfg
+
+from occi import backend
+from occi import core_model
+from occi.extensions import infrastructure
+from occi.protocol import occi_rendering as text_rendering
+from occi.protocol import rendering as occi_rendering
+
+from occi_os_api import nova_glue
+from occi_os_api import registry
+from occi_os_api import versions
+from occi_os_api.extensions import os_addon
+from occi_os_api.extensions import os_mixins
+
+import fakes
+
+
+CONF = cfg.CONF
+CONF.import_opt('occi_render_cache_ttl', 'occi_os_api.wsgi')
+CONF.import_opt('occi_custom_location_hostname', 'occi_os_api.wsgi')
+
+
+class Rendering(occi_rendering.Rendering):
+    """
+    Fake rendering counting what it rendered.
+    """
+
+    mime_type = 'text/occi'
+
+    def __init__(self):
+        super(Rendering, self).__init__(None)
+        self.rendered = []
+
+    def from_entity(self, entity):
+        """
+        Render an entity - sets the id like pyssf does.
+        """
+        self.rendered.append(entity.identifier)
+        entity.attributes['occi.core.id'] = entity.identifier
+        return {'X-OCCI-Attribute': str(entity.attributes)}, 'OK'
+
+
+class TestRegistry(unittest.TestCase):
+    """
+    Tests the registry.
+    """
+
+    os_template = os_mixins.OsTemplate('http://example.com#', 'unix',
+                                       os_id='img1', location='/img1/')
+
+    res_template = os_mixins.ResourceTemplate('http://example.com#', 'itsy',
+                                              flavor_id='1',
+                                              location='/itsy/')
+    res_template2 = os_mixins.ResourceTemplate('http://example.com#', 'bitsy',
+                                               flavor_id='2',
+                                               location='/bitsy/')
+
+    def setUp(self):
+        """
+        Setup tests.
+        """
+        self.registry = registry.OCCIRegistry()
+        for mixin in [self.os_template, self.res_template,
+                      self.res_template2]:
+            self.registry.set_backend(mixin, backend.MixinBackend(), None)
+        self.extras = {'nova_ctx': fakes.Context()}
+        self.network = {'id': '1', 'label': 'private', 'vlan': None,
+                        'cidr': '10.0.0.0/24', 'gateway': '10.0.0.1',
+                        'shared': True}
+        self.mox = mox.Mox()
+
+    def tearDown(self):
+        """
+        Cleanup mocks.
+        """
+        self.mox.UnsetStubs()
+
+    def _net_desc(self, address, network=None):
+        """
+        Return a network description as given by the net glue.
+        """
+        return {'interface': 'eth0',
+                'mac': 'aa:bb:cc:dd:ee:ff',
+                'state': 'active',
+                'address': address,
+                'gateway': '0.0.0.0',
+                'allocation': 'static',
+                'network': network}
+
+    def test_get_network_for_sanity(self):
+        """
+        Test if shared networks are cached for all users and private ones
+        per user.
+        """
+        shared = self.registry._get_network(self.network, self.extras)
+        private = self.registry._get_network(dict(self.network, id='2',
+                                                  shared=False),
+                                             self.extras)
+
+        self.assertEqual('/network/1', shared.identifier)
+        self.assertEqual('10.0.0.0/24',
+                         shared.attributes['occi.networkinterface.address'])
+        self.assertNotIn('occi.network.vlan', shared.attributes)
+        self.assertIs(shared, self.registry.cache[('/network/1', None)])
+        self.assertIs(private, self.registry.cache[('/network/2', 'foo')])
+        self.assertIs(shared, self.registry._get_network(self.network,
+                                                         self.extras))
+        self.assertIs(self.registry.pub_net,
+                      self.registry._get_network(None, self.extras))
+
+    def test_render_network_for_sanity(self):
+        """
+        Test if a network with an int vlan can be rendered.
+        """
+        renderer = text_rendering.TextOcciRendering(self.registry)
+        entity = self.registry._get_network(dict(self.network, vlan=100),
+                                            self.extras)
+
+        self.assertEqual('100', entity.attributes['occi.network.vlan'])
+        headers, _ = renderer.from_entity(entity)
+        self.assertIn('occi.network.vlan="100"',
+                      headers['X-OCCI-Attribute'])
+
+    def test_add_resource_for_sanity(self):
+        """
+        Test if a cached compute resource is not replaced.
+        """
+        first = core_model.Resource('/compute/bar', infrastructure.COMPUTE,
+                                    [])
+        second = core_model.Resource('/compute/bar', infrastructure.COMPUTE,
+                                     [])
+        self.registry.add_resource(first.identifier, first, self.extras)
+        self.registry.add_resource(second.identifier, second, self.extras)
+
+        self.assertIs(first, self.registry.cache[('/compute/bar', 'foo')])
+        self.assertEqual({'user_id': 'foo', 'project_id': 'bar'},
+                         first.extras)
+
+    def test_render_for_sanity(self):
+        """
+        Test if representations are reused until the entity changes.
+        """
+        registry.RENDERINGS.invalidate()
+        rendering = Rendering()
+        self.registry.set_renderer('text/occi', rendering)
+        renderer = self.registry.get_renderer('text/occi')
+        entity = core_model.Resource('/compute/bar', infrastructure.COMPUTE,
+                                     [self.os_template])
+
+        self.assertIsInstance(renderer, occi_rendering.Rendering)
+        headers, body = renderer.from_entity(entity)
+        headers['Content-Type'] = 'text/occi'
+        self.assertEqual(({'X-OCCI-Attribute': str(entity.attributes)},
+                          'OK'), renderer.from_entity(entity))
+        self.assertListEqual(['/compute/bar'], rendering.rendered)
+
+        versions.set_attributes(entity, {'occi.compute.state': 'active'})
+        renderer.from_entity(entity)
+        versions.set_attributes(entity, {'occi.compute.state': 'active'})
+        renderer.from_entity(entity)
+        self.assertEqual(2, len(rendering.rendered))
+
+        # a new link changes the representation of it's source.
+        stor = core_model.Resource('/storage/1', infrastructure.STORAGE, [])
+        self.registry._construct_storage_link(entity, stor, self.extras)
+        renderer.from_entity(entity)
+        self.assertEqual(3, len(rendering.rendered))
+        registry.RENDERINGS.invalidate()
+
+    def test_setup_rules_for_sanity(self):
+        """
+        Test if all rules of the project are listed - once - and rules gone
+        in OpenStack are removed.
+        """
+        group = core_model.Mixin('http://example.com/security#', 'web',
+                                 [os_addon.SEC_GROUP])
+        self.registry.set_backend(group, backend.MixinBackend(), None)
+        known = core_model.Resource('/network/security/rule/abc',
+                                    os_addon.SEC_RULE, [group])
+        known.attributes['occi.core.id'] = '10'
+        self.registry.add_resource(known.identifier, known, self.extras)
+        gone = core_model.Resource('/network/security/rule/def',
+                                   os_addon.SEC_RULE, [group])
+        gone.attributes['occi.core.id'] = '12'
+        self.registry.add_resource(gone.identifier, gone, self.extras)
+
+        self.mox.StubOutWithMock(nova_glue.security,
+                                 'retrieve_rules_by_project')
+        nova_glue.security.retrieve_rules_by_project(
+            mox.IsA(object)).AndReturn(
+            [{'id': 10, 'parent_group_id': 1, 'protocol': 'tcp',
+              'from_port': 22, 'to_port': 22, 'cidr': '0.0.0.0/0'},
+             {'id': 11, 'parent_group_id': 1, 'protocol': 'udp',
+              'from_port': 53, 'to_port': 53, 'cidr': None}])
+        self.mox.StubOutWithMock(nova_glue.security, 'retrieve_group')
+        nova_glue.security.retrieve_group(1, mox.IsA(object)).AndReturn(
+            {'id': 1, 'name': 'web'})
+        self.mox.ReplayAll()
+
+        rules = self.registry._setup_rules(self.extras)
+
+        self.assertEqual(2, len(rules))
+        self.assertIn(known, rules)
+        self.assertNotIn(('/network/security/rule/def', 'foo'),
+                         self.registry.cache)
+        new = self.registry.cache[('/network/security/rule/11', 'foo')]
+        self.assertIn(new, rules)
+        self.assertListEqual([group], new.mixins)
+        self.assertEqual('53', new.attributes['occi.network.security.from'])
+        self.assertNotIn('occi.network.security.range', new.attributes)
+
+        self.mox.VerifyAll()
+
+    def test_update_occi_compute_for_sanity(self):
+        """
+        Test if changes in OpenStack are patched into the cached compute.
+        """
+        entity = core_model.Resource('/compute/bar', infrastructure.COMPUTE,
+                                     [self.os_template, self.res_template])
+        entity.attributes = {'occi.core.id': 'bar'}
+        adm = self.registry._construct_network_link(
+            self._net_desc('10.0.0.2', self.network), entity,
+            self.registry._get_network(self.network, self.extras),
+            self.extras)
+        pub = self.registry._construct_network_link(self._net_desc('1.2.3.4'),
+                                                    entity,
+                                                    self.registry.pub_net,
+                                                    self.extras)
+        stor = core_model.Resource('/storage/1', infrastructure.STORAGE, [])
+        stor.attributes = {'occi.core.id': '1'}
+        stor_link = self.registry._construct_storage_link(entity, stor,
+                                                          self.extras)
+
+        # resized, new floating ip and volume detached.
+        self.mox.StubOutWithMock(nova_glue.vm, 'get_vm')
+        nova_glue.vm.get_vm(mox.IsA(object), mox.IsA(object)).AndReturn(
+            {'instance_type_id': 7, 'image_ref': 'img1'})
+        self.mox.StubOutWithMock(nova_glue.vm, 'get_instance_flavor_id')
+        nova_glue.vm.get_instance_flavor_id(mox.IsA(dict)).AndReturn('2')
+        self.mox.StubOutWithMock(nova_glue.net, 'get_network_details')
+        nova_glue.net.get_network_details(mox.IsA(object),
+                                          mox.IsA(object),
+                                          mox.IsA(dict)).AndReturn(
+            [self._net_desc('10.0.0.2', self.network),
+             self._net_desc('5.6.7.8')])
+        self.mox.ReplayAll()
+
+        self.registry._update_occi_compute(entity, self.extras,
+                                           [{'id': '1',
+                                             'status': 'available',
+                                             'instance_uuid': None}])
+
+        self.assertIn(self.res_template2, entity.mixins)
+        self.assertNotIn(self.res_template, entity.mixins)
+        self.assertIn(self.os_template, entity.mixins)
+
+        # admin link kept it's identity; old floating ip & volume are gone.
+        self.assertIn(adm, entity.links)
+        self.assertNotIn(pub, entity.links)
+        self.assertNotIn(stor_link, entity.links)
+        self.assertNotIn((pub.identifier, 'foo'), self.registry.cache)
+        self.assertNotIn((stor_link.identifier, 'foo'), self.registry.cache)
+        addresses = [item.attributes['occi.networkinterface.address']
+                     for item in entity.links]
+        self.assertListEqual(['10.0.0.2', '5.6.7.8'], addresses)
+
+        self.mox.VerifyAll()
+
+    def test_update_occi_compute_for_failure(self):
+        """
+        Test that unknown flavors and volumes in transition keep what the
+        cached compute has.
+        """
+        entity = core_model.Resource('/compute/bar', infrastructure.COMPUTE,
+                                     [self.os_template, self.res_template])
+        entity.attributes = {'occi.core.id': 'bar'}
+        stor = core_model.Resource('/storage/1', infrastructure.STORAGE, [])
+        stor.attributes = {'occi.core.id': '1'}
+        stor_link = self.registry._construct_storage_link(entity, stor,
+                                                          self.extras)
+
+        self.mox.StubOutWithMock(nova_glue.vm, 'get_vm')
+        nova_glue.vm.get_vm(mox.IsA(object), mox.IsA(object)).AndReturn(
+            {'instance_type_id': 7, 'image_ref': 'img1'})
+        self.mox.StubOutWithMock(nova_glue.vm, 'get_instance_flavor_id')
+        nova_glue.vm.get_instance_flavor_id(mox.IsA(dict)).AndReturn(None)
+        self.mox.StubOutWithMock(nova_glue.net, 'get_network_details')
+        nova_glue.net.get_network_details(mox.IsA(object),
+                                          mox.IsA(object),
+                                          mox.IsA(dict)).AndReturn([])
+        self.mox.ReplayAll()
+
+        self.registry._update_occi_compute(entity, self.extras,
+                                           [{'id': '1',
+                                             'status': 'detaching',
+                                             'instance_uuid': 'bar'}])
+
+        self.assertIn(self.res_template, entity.mixins)
+        self.assertListEqual([stor_link], entity.links)
+
+        self.mox.VerifyAll()
+
+    def test_update_occi_storage_for_sanity(self):
+        """
+        Test if an attachment done in OpenStack results in a storage link.
+        """
+        compute = core_model.Resource('/compute/bar', infrastructure.COMPUTE,
+                                      [])
+        compute.attributes = {'occi.core.id': 'bar'}
+        self.registry.cache[('/compute/bar', 'foo')] = compute
+        stor = core_model.Resource('/storage/1', infrastructure.STORAGE, [])
+        stor.attributes = {'occi.core.id': '1'}
+
+        stors = [{'id': '1', 'status': 'in-use', 'instance_uuid': 'bar'}]
+        self.registry._update_occi_storage(stor, self.extras, stors)
+        self.assertEqual(1, len(compute.links))
+        self.assertEqual(stor, compute.links[0].target)
+
+        # no second link on next update.
+        self.registry._update_occi_storage(stor, self.extras, stors)
+        self.assertEqual(1, len(compute.links))